@@ -1,40 +1,614 @@
 import random
+import time
+import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from const import *
-import logging
-from move import Move
-from square import Square
+from move import Move, CAPTURE, EN_PASSANT
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from evaluation import evaluate
+from book import Book
+from tablebase import Tablebases
+
+MATE = 100000
+INFINITY = 1000000
+# scores beyond this are mates, stored relative to the node in the table
+MATE_BOUND = MATE - 1000
+ASPIRATION_WINDOW = 50
+MAX_PLY = 128
+
+# move ordering scores: hash move, then captures (and queen promotions) by
+# mvv-lva, then the two killers of the ply, then quiet moves by history
+HASH_SCORE = 1 << 40
+CAPTURE_SCORE = 1 << 30
+KILLER_SCORE = 1 << 28
+HISTORY_MAX = KILLER_SCORE - 2
+
+# middlegame positions for the thread scaling benchmark
+BENCH_FENS = [
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+    'r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4',
+]
+
+class SearchAborted(Exception):
+    """
+    Raised inside the search when the node or time budget runs out.
+    """
+
+class _SharedFlag:
+    """
+    Stop flag for helper processes: the first byte of a shared block.
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+
+    def is_set(self):
+        return self.shm.buf[0] != 0
+
+def _helper_search(table_name, hash_mb, control_name, snapshot, helper_id, generation, depth, time_limit):
+    """
+    Lazy SMP helper: the same search as the main process on the shared
+    table, with a different depth and root order so it fills the table
+    with results the main search can pick up. Returns its node count.
+    """
+    table = TranspositionTable.shared(hash_mb, table_name)
+    control = shared_memory.SharedMemory(name=control_name)
+    table.generation = generation
+    try:
+        board = pickle.loads(snapshot)
+        helper = AIPlayer(board.next_player, table=table)
+        helper.helper_id = helper_id
+        helper._search(board, depth, None, time_limit, None, _SharedFlag(control))
+        return helper.nodes
+    finally:
+        table.close()
+        control.close()
+
+class SearchResult:
+
+    def __init__(self, move, score, depth, nodes, seconds, pv):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+        self.pv = pv
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.seconds) if self.seconds > 0 else 0
+
+    def __str__(self):
+        pv = ' '.join(move.uci() for move in self.pv)
+        return f'depth {self.depth} score {self.score} nodes {self.nodes} nps {self.nps} ' \
+               f'time {self.seconds:.2f}s pv {pv}'
+
+def to_table_score(score, ply):
+    # mates are stored as distance from this node, not from the root
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+def from_table_score(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
 
 class AIPlayer:
 
-    def __init__(self, color):
+    def __init__(self, color, depth=None, nodes=None, time_limit=None, hash_mb=16, threads=1, table=None,
+                 book=None, tablebase=None):
         self.color = color  # 'black' or 'white'
+        # search budget; with none of them set the AI plays random moves
+        self.depth = depth
+        self.max_nodes = nodes
+        self.time_limit = time_limit
+        # with more than one thread, helper processes share the table through shared memory
+        self.threads = max(1, threads)
+        self.helper_id = 0
+        self._pool = None
+        self._control = None
+        if table is not None:
+            self.table = table
+        elif self.threads > 1:
+            self.table = TranspositionTable.shared(hash_mb)
+            self._control = shared_memory.SharedMemory(create=True, size=8)
+        else:
+            self.table = TranspositionTable(hash_mb)
+        # opening book (a Book or the path of one), asked before searching
+        self.book = Book(book) if isinstance(book, str) else book
+        # endgame tablebases (Tablebases or their directory), asked before searching
+        self.tablebase = Tablebases(tablebase) if isinstance(tablebase, str) else tablebase
+        self.last_result = None
+        self.nodes = 0
+        # move ordering: killers per ply and a butterfly history table per color
+        self.ordering = True
+        self.killers = [[0, 0] for ply in range(MAX_PLY)]
+        self.history = {'white': [0] * 4096, 'black': [0] * 4096}
+        # beta cutoffs, and how many of them came from the first move searched
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+        self._node_limit = None
+        self._deadline = None
+        self._stop = None
 
     def get_all_moves(self, board):
         """
         Calculate all possible moves for the AI's pieces.
         """
-        all_moves = []
-
-        for row in range(ROWS):
-            for col in range(COLS):
-                square = board.squares[row][col]
-                if square.has_piece() and square.piece.color == self.color:
-                    piece = square.piece
-                    board.calc_moves(piece, row, col, check_safety=True)  # Calculate moves
-                    all_moves.extend(piece.moves)
-        print(f"AI ({self.color}) possible moves: {len(all_moves)} moves")
-        return all_moves
+        # the board's turn_moves() cache when it's our turn, as it is in the game
+        return board.turn_moves() if board.next_player == self.color else board.legal_moves(self.color)
 
-    def get_best_move(self, possible_moves):
+    def get_best_move(self, possible_moves, board=None, on_info=None):
         """
-        Get the best move for the AI.
-        For now, we select a random move to keep it simple, but this can be
-        replaced with more advanced logic (e.g., Minimax).
+        Get the best move for the AI: a book or tablebase move, else searched
+        when the AI has a budget, given the board; a random pick otherwise.
+        on_info gets each SearchResult, as with search.
         """
         if not possible_moves:
-            print("No possible moves for AI.")
             return None
 
-        # Example: Random move selection (replace with smarter logic later)
-        
+        if board is not None:
+            result = self._known_move(board)
+            if result is not None:
+                if on_info is not None:
+                    on_info(result)
+                return result.move
+            if self.depth or self.max_nodes or self.time_limit:
+                return self.search(board, on_info=on_info).move
+
         return random.choice(possible_moves)
+
+    # search
+
+    def search(self, board, depth=None, nodes=None, time_limit=None, on_info=None, stop=None):
+        """
+        Iterative deepening negamax from board's side to move, unless
+        the opening book or the tablebases have a move for the position.
+        Stops at depth, when the node or time budget runs out, or once the
+        stop event (anything with is_set()) is set, and returns the
+        SearchResult of the deepest finished iteration.
+        on_info is called with the result of every finished iteration (or
+        the book or tablebase move); the AI prints nothing itself.
+        """
+        result = self._known_move(board)
+        if result is not None:
+            self.last_result = result
+            if on_info is not None:
+                on_info(result)
+            return result
+
+        max_depth = depth or self.depth or (64 if (nodes or self.max_nodes or time_limit or self.time_limit) else 3)
+        time_limit = time_limit or self.time_limit
+        self.table.new_search()
+
+        if self.threads == 1:
+            return self._search(board, max_depth, nodes or self.max_nodes, time_limit, on_info, stop)
+
+        # lazy smp: helpers search the same root while this process runs the main search
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.threads - 1, mp_context=multiprocessing.get_context('spawn'))
+        self._control.buf[0] = 0
+        snapshot = pickle.dumps(board)
+        helpers = [self._pool.submit(_helper_search, self.table.shm.name, self.table.size_mb, self._control.name,
+                                     snapshot, helper_id, self.table.generation, max_depth, time_limit)
+                   for helper_id in range(1, self.threads)]
+        try:
+            result = self._search(board, max_depth, nodes or self.max_nodes, time_limit, on_info, stop)
+        finally:
+            self._control.buf[0] = 1
+            helper_nodes = sum(helper.result() for helper in helpers)
+        result.nodes += helper_nodes
+        return result
+
+    def _known_move(self, board):
+        """
+        SearchResult of a book move (depth 0) or a perfect tablebase move
+        (depth = plies to mate), or None.
+        """
+        if self.book is not None:
+            move = self.book.choose(board)
+            if move is not None:
+                return SearchResult(move, 0, 0, 0, 0.0, [move])
+        if self.tablebase is not None:
+            found = self.tablebase.best_move(board)
+            if found is not None:
+                move, (result, plies) = found
+                score = 0 if result == 0 else (MATE - plies if result > 0 else -MATE + plies)
+                return SearchResult(move, score, max(plies, 1), 0, 0.0, [move])
+        return None
+
+    def close(self):
+        """
+        Shut down the helper processes and free the shared table.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        if self.tablebase is not None:
+            self.tablebase.close()
+            self.tablebase = None
+        if self._control is not None:
+            self.table.close(unlink=True)
+            self._control.close()
+            self._control.unlink()
+            self._control = None
+
+    def _search(self, board, max_depth, nodes, time_limit, on_info, stop):
+        self._node_limit = nodes
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+        self._age_history()
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+        start = time.perf_counter()
+        self._deadline = start + time_limit if time_limit else None
+        self._stop = stop
+
+        root_moves = board.turn_moves()
+        result = SearchResult(root_moves[0] if root_moves else None, 0, 0, 0, 0.0, [])
+        if len(root_moves) <= 1:
+            return result
+
+        score = 0
+        for current in range(1, max_depth + 1):
+            # odd helpers run one ply ahead of the main search
+            if self.helper_id & 1:
+                current = min(current + 1, max_depth)
+            try:
+                score, pv = self._aspiration(board, current, score)
+            except SearchAborted:
+                break
+            result = SearchResult(pv[0], score, current, self.nodes, time.perf_counter() - start, pv)
+            if on_info is not None:
+                on_info(result)
+            # a forced mate won't get any shorter by searching deeper
+            if abs(score) > MATE_BOUND:
+                break
+
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - start
+        self.last_result = result
+        return result
+
+    def _aspiration(self, board, depth, guess):
+        """
+        Root search in a narrow window around the last score, widened on failure.
+        """
+        if depth < 3:
+            return self._root(board, depth, -INFINITY, INFINITY)
+
+        delta = ASPIRATION_WINDOW
+        alpha, beta = guess - delta, guess + delta
+        while True:
+            score, pv = self._root(board, depth, alpha, beta)
+            if score <= alpha:
+                alpha = max(-INFINITY, alpha - delta)
+            elif score >= beta:
+                beta = min(INFINITY, beta + delta)
+            else:
+                return score, pv
+            delta *= 4
+
+    def _root(self, board, depth, alpha, beta):
+        entry = self.table.probe(board.zobrist)
+        # a copy: _order may reorder in place and turn_moves() is shared
+        moves = self._order(board, list(board.turn_moves()), entry[3] if entry is not None else 0, 0)
+        if self.helper_id:
+            # helpers start on different root moves than the main search
+            shift = self.helper_id % (len(moves) - 1) if len(moves) > 1 else 0
+            moves = moves[:1] + moves[1 + shift:] + moves[1:1 + shift]
+        alpha_orig = alpha
+        best_score = -INFINITY
+        best_pv = [moves[0]]
+        for index, move in enumerate(moves):
+            child_pv = []
+            undo = board.make_move(move)
+            try:
+                if index == 0:
+                    score = -self._negamax(board, depth - 1, -beta, -alpha, 1, child_pv)
+                else:
+                    score = -self._negamax(board, depth - 1, -alpha - 1, -alpha, 1, child_pv)
+                    if alpha < score < beta:
+                        score = -self._negamax(board, depth - 1, -beta, -alpha, 1, child_pv)
+            finally:
+                board.unmake_move(undo)
+
+            if score > best_score:
+                best_score = score
+                best_pv = [move] + child_pv
+                if score > alpha:
+                    alpha = score
+            if alpha >= beta:
+                break
+
+        self._store(board, depth, best_score, alpha_orig, beta, 0, best_pv[0])
+        return best_score, best_pv
+
+    def _negamax(self, board, depth, alpha, beta, ply, pv):
+        """
+        Principal variation search; fills pv with the best line found.
+        Leaves are resolved by the quiescence search.
+        """
+        if depth <= 0:
+            return self._quiesce(board, alpha, beta, ply)
+
+        self._count_node()
+
+        # a position already seen on this line or since the game's last capture or pawn move
+        # is a draw, as are bare minors
+        if board.is_repetition(2) or board.insufficient_material():
+            return 0
+        # so is the fifty-move rule, unless the move that reached it mated (as in Board.outcome)
+        if board.halfmove_clock >= 100:
+            if not board.turn_moves() and board.is_check():
+                return -MATE + ply
+            return 0
+
+        entry = self.table.probe(board.zobrist)
+        # no cutoffs at pv nodes (open window): the table keeps no line to fill pv with
+        if entry is not None and beta - alpha == 1:
+            table_score, bound, table_depth, table_move = entry
+            if table_depth >= depth:
+                table_score = from_table_score(table_score, ply)
+                if bound == EXACT or (bound == LOWER and table_score >= beta) or \
+                        (bound == UPPER and table_score <= alpha):
+                    return table_score
+
+        moves = board.legal_moves()
+        if not moves:
+            if board.attack_info(board.next_player).checkers:
+                return -MATE + ply
+            return 0
+
+        moves = self._order(board, moves, entry[3] if entry is not None else 0, ply)
+        alpha_orig = alpha
+        best_score = -INFINITY
+        best_move = moves[0]
+        for index, move in enumerate(moves):
+            child_pv = []
+            undo = board.make_move(move)
+            try:
+                if index == 0:
+                    score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1, child_pv)
+                else:
+                    score = -self._negamax(board, depth - 1, -alpha - 1, -alpha, ply + 1, child_pv)
+                    if alpha < score < beta:
+                        score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1, child_pv)
+            finally:
+                board.unmake_move(undo)
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    pv[:] = [move] + child_pv
+            if alpha >= beta:
+                self.cutoffs += 1
+                if index == 0:
+                    self.first_cutoffs += 1
+                if not move.code & CAPTURE:
+                    self._update_quiet(board.next_player, move, depth, ply)
+                break
+
+        self._store(board, depth, best_score, alpha_orig, beta, ply, best_move)
+        return best_score
+
+    def _quiesce(self, board, alpha, beta, ply):
+        """
+        Captures-only search from a leaf, so the evaluation never lands in
+        the middle of an exchange. The side to move may stand pat on the
+        static score unless it's in check; captures that lose material by
+        Board.see are skipped.
+        """
+        self._count_node()
+
+        in_check = bool(board.attack_info(board.next_player).checkers)
+        if not in_check or ply >= MAX_PLY:
+            stand_pat = evaluate(board)
+            if stand_pat >= beta or ply >= MAX_PLY:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            best_score = stand_pat
+        else:
+            best_score = -INFINITY
+
+        moves = board.legal_moves()
+        if in_check:
+            if not moves:
+                return -MATE + ply
+        else:
+            moves = [move for move in moves
+                     if (move.code & CAPTURE or move.promotion == 'queen') and board.see(move) >= 0]
+
+        for move in self._order(board, moves, 0, ply):
+            undo = board.make_move(move)
+            try:
+                score = -self._quiesce(board, -beta, -alpha, ply + 1)
+            finally:
+                board.unmake_move(undo)
+
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+            if alpha >= beta:
+                break
+        return best_score
+
+    def _count_node(self):
+        self.nodes += 1
+        if self._node_limit and self.nodes >= self._node_limit:
+            raise SearchAborted()
+        # every 128 nodes, a few ms, so a stop request is answered promptly
+        if not self.nodes & 127 and self._out_of_time():
+            raise SearchAborted()
+
+    def _out_of_time(self):
+        if self._stop is not None and self._stop.is_set():
+            return True
+        return self._deadline is not None and time.perf_counter() >= self._deadline
+
+    def _store(self, board, depth, score, alpha, beta, ply, move):
+        if score <= alpha:
+            bound = UPPER
+        elif score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(board.zobrist, depth, to_table_score(score, ply), bound, move.encode())
+
+    def first_cutoff_rate(self):
+        """
+        Share of beta cutoffs made by the first move searched: the closer
+        to 1, the better the move ordering.
+        """
+        return self.first_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def _update_quiet(self, color, move, depth, ply):
+        """
+        Remember a quiet move that caused a beta cutoff.
+        """
+        code = move.encode()
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != code:
+                killers[1] = killers[0]
+                killers[0] = code
+        history = self.history[color]
+        index = code & 0xFFF
+        history[index] += depth * depth
+        if history[index] > HISTORY_MAX:
+            self._age_history()
+
+    def _age_history(self):
+        for history in self.history.values():
+            for index, value in enumerate(history):
+                if value:
+                    history[index] = value >> 1
+
+    def _order(self, board, moves, hash_move=0, ply=0):
+        """
+        Sort moves best first: the move the table remembers, captures by
+        most valuable victim / least valuable attacker, killers, then quiet
+        moves by history.
+        """
+        if not self.ordering:
+            if hash_move:
+                for index, move in enumerate(moves):
+                    if move.encode() == hash_move:
+                        moves.insert(0, moves.pop(index))
+                        break
+            return moves
+
+        squares = board.squares
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        history = self.history[board.next_player]
+        scores = []
+        for move in moves:
+            code = move.encode()
+            if code == hash_move:
+                scores.append(HASH_SCORE)
+                continue
+            capture = move.code & CAPTURE
+            if capture or move.promotion == 'queen':
+                initial, final = move.initial, move.final
+                attacker = squares[initial.row][initial.col].piece
+                gain = 0
+                if capture:
+                    # the pawn taken en passant stands beside the target square
+                    victim = squares[initial.row if move.code & EN_PASSANT else final.row][final.col].piece
+                    gain = abs(victim.value)
+                if move.promotion == 'queen':
+                    gain += 8
+                # the king's value is huge; capped it sorts as the most valuable attacker
+                scores.append(CAPTURE_SCORE + round(gain * 100) * 1024 - min(round(abs(attacker.value) * 10), 1023))
+            elif code == killers[0]:
+                scores.append(KILLER_SCORE + 1)
+            elif code == killers[1]:
+                scores.append(KILLER_SCORE)
+            elif move.promotion:
+                scores.append(-1)  # underpromotions last
+            else:
+                scores.append(history[code & 0xFFF])
+        order = sorted(range(len(moves)), key=scores.__getitem__, reverse=True)
+        return [moves[index] for index in order]
+
+def bench_threads(counts, depth, hash_mb=16):
+    """
+    Time-to-depth over BENCH_FENS for each thread count, with the speedup
+    against the first count.
+    """
+    from board import Board
+
+    base = None
+    for threads in counts:
+        ai = AIPlayer('white', hash_mb=hash_mb, threads=threads)
+        seconds = nodes = 0
+        try:
+            for fen in BENCH_FENS:
+                ai.table.clear()
+                result = ai.search(Board.from_fen(fen), depth=depth)
+                seconds += result.seconds
+                nodes += result.nodes
+        finally:
+            ai.close()
+        base = base or seconds
+        print(f'threads {threads:>2}  depth {depth}  {seconds:>8.2f}s  nodes {nodes:>10}  '
+              f'nps {round(nodes / seconds) if seconds else 0:>8}  speedup {base / seconds if seconds else 0:.2f}x')
+
+def main(argv=None):
+    """
+    Headless search, e.g. python -m ai --fen "<fen>" --depth 5
+    """
+    import argparse
+    from board import Board, START_FEN
+
+    parser = argparse.ArgumentParser(prog='ai', description='Search a position without the GUI.')
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--depth', type=int, help='maximum depth')
+    parser.add_argument('--nodes', type=int, help='node budget')
+    parser.add_argument('--time', type=float, help='time budget in seconds')
+    parser.add_argument('--hash', type=int, default=16, metavar='MB', help='transposition table size')
+    parser.add_argument('--book', help='opening book to play from before searching')
+    parser.add_argument('--tablebase', metavar='DIR', help='endgame tablebases to play perfect endings from')
+    parser.add_argument('--no-ordering', action='store_true',
+                        help='only search the hash move first, to compare node counts')
+    parser.add_argument('--threads', type=int, default=1, help='search processes (default: 1)')
+    parser.add_argument('--bench-threads', metavar='N,N,...',
+                        help='time-to-depth on the benchmark positions for each thread count, e.g. 1,2,4,8,16')
+    args = parser.parse_args(argv)
+
+    if args.bench_threads:
+        bench_threads([int(n) for n in args.bench_threads.split(',')], args.depth or 4, args.hash)
+        return
+
+    board = Board.from_fen(args.fen)
+    ai = AIPlayer(board.next_player, depth=args.depth, nodes=args.nodes, time_limit=args.time, hash_mb=args.hash,
+                  threads=args.threads, book=args.book,
+                  tablebase=args.tablebase)
+    ai.ordering = not args.no_ordering
+    try:
+        result = ai.search(board, on_info=lambda info: print(f'info {info}'))
+    finally:
+        ai.close()
+    print(f'bestmove {result.move.uci() if result.move else "(none)"} '
+          f'depth {result.depth} nodes {result.nodes} nps {result.nps} '
+          f'cutoffs {ai.cutoffs} first-move {ai.first_cutoff_rate():.1%}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Arena: AIPlayer against AIPlayer over many games, to check that a speed
+change keeps (or gains) strength before it ships.
+
+    python -m arena --games 1000 --jobs 4 --a depth=3 --b depth=3,ordering=0
+    python -m arena --a nodes=20000 --b time=0.05,hash=64 --openings openings.epd --output arena.pgn
+
+Each side is a comma-separated list of settings: depth, nodes, time
+(seconds a move), hash (MB), book, tablebase and ordering (0 turns move
+ordering off). Every opening (FEN or EPD lines, or by default positions
+a few random plies from the start, since the searches are deterministic
+and would replay the same game) is played twice with the colors swapped. Games run on a process
+pool and each one is appended to the PGN file as soon as it ends; the
+run prints games/sec, nodes/sec per side and the Elo difference of A
+over B with its 95% error margin.
+"""
+import argparse
+import math
+import multiprocessing
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from const import *
+
+SETTINGS = {'depth': int, 'nodes': int, 'time': float, 'hash': int, 'book': str, 'tablebase': str, 'ordering': int}
+
+# games longer than this are adjudicated a draw
+MAX_PLIES = 300
+# random plies from the start position to each opening when no file is given
+RANDOM_PLIES = 4
+
+def parse_settings(text):
+    """
+    {'depth': 3, ...} from 'depth=3,...'.
+    """
+    settings = {}
+    for item in filter(None, text.split(',')):
+        name, _, value = item.partition('=')
+        name = name.strip()
+        if name not in SETTINGS:
+            raise ValueError(f'unknown setting {name} (expected one of {", ".join(SETTINGS)})')
+        settings[name] = SETTINGS[name](value)
+    if not any(name in settings for name in ('depth', 'nodes', 'time')):
+        raise ValueError(f'{text!r} needs a depth, nodes or time budget')
+    return settings
+
+def read_openings(path):
+    """
+    FENs of an opening file: one FEN or EPD position a line, # for comments.
+    """
+    openings = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            # a FEN ends with its two clocks, an EPD has operations after the fourth field instead
+            clocks = fields[4:6]
+            openings.append(' '.join(fields[:6] if len(clocks) == 2 and all(c.isdigit() for c in clocks) else fields[:4]))
+    return openings
+
+def random_openings(count, plies=RANDOM_PLIES, seed=0):
+    """
+    FENs of count different positions plies random moves from the start
+    (fewer if there aren't that many).
+    """
+    from board import Board
+
+    rng = random.Random(seed)
+    openings = {}
+    for attempt in range(count * 20):
+        if len(openings) == count:
+            break
+        board = Board()
+        for ply in range(plies):
+            moves = board.turn_moves()
+            if not moves:
+                break
+            board.make_move(rng.choice(moves))
+        # only positions with a game left to play (fool's mate takes four plies)
+        if board.turn_moves():
+            openings.setdefault(board.to_fen(), None)
+    return list(openings)
+
+# one AIPlayer per side and settings in each worker process
+_players = {}
+
+def _player(side, settings):
+    from ai import AIPlayer
+
+    key = side, tuple(sorted(settings.items()))
+    player = _players.get(key)
+    if player is None:
+        player = _players[key] = AIPlayer('white', depth=settings.get('depth'), nodes=settings.get('nodes'),
+                                          time_limit=settings.get('time'), hash_mb=settings.get('hash', 16),
+                                          book=settings.get('book'), tablebase=settings.get('tablebase'))
+        player.ordering = bool(settings.get('ordering', 1))
+    return player
+
+def play_game(index, fen, sides, max_plies=MAX_PLIES):
+    """
+    Play one game from fen; sides maps 'white' and 'black' to (name,
+    settings). Returns the game as PGN text, its result and the nodes and
+    search seconds of each color.
+    """
+    from board import Board, START_FEN
+    from pgn import format_game, to_san
+
+    board = Board.from_fen(fen)
+    players = {}
+    for color, (name, settings) in sides.items():
+        players[color] = _player(name, settings)
+        players[color].table.clear()
+    nodes = {'white': 0, 'black': 0}
+    seconds = {'white': 0.0, 'black': 0.0}
+
+    sans = []
+    result, termination = '1/2-1/2', 'adjudication'
+    black_first = board.next_player == 'black'
+    while len(sans) < max_plies:
+        color = board.next_player
+        # mate, stalemate and the draws, from the board's key history and clocks
+        outcome = board.outcome()
+        if outcome is not None:
+            if outcome == 'checkmate':
+                result = '0-1' if color == 'white' else '1-0'
+            termination = outcome
+            break
+
+        search = players[color].search(board)
+        nodes[color] += search.nodes
+        seconds[color] += search.seconds
+        move = next(m for m in board.turn_moves() if m == search.move)
+
+        sans.append(to_san(board, move))
+        board.make_move(move)
+
+    tags = {'Event': 'Arena', 'Site': '?', 'Date': time.strftime('%Y.%m.%d'), 'Round': str(index + 1),
+            'White': sides['white'][0], 'Black': sides['black'][0], 'Result': result,
+            'Termination': termination, 'PlyCount': str(len(sans))}
+    if fen != START_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = fen
+    return {'pgn': format_game(tags, sans, black_first), 'result': result, 'white': sides['white'][0],
+            'nodes': nodes, 'seconds': seconds}
+
+def elo(wins, draws, losses):
+    """
+    Elo difference for this score, and the 95% error margin around it.
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    deviation = math.sqrt((wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games)
+    margin = 1.96 * deviation / math.sqrt(games)
+    return _elo(score), (_elo(score + margin) - _elo(score - margin)) / 2
+
+def _elo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+class Tally:
+    """
+    Running results from A's point of view, and the search speed of each side.
+    """
+
+    def __init__(self):
+        self.wins = self.draws = self.losses = 0
+        self.nodes = {'A': 0, 'B': 0}
+        self.seconds = {'A': 0.0, 'B': 0.0}
+        self.start = time.perf_counter()
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add(self, game):
+        a_white = game['white'] == 'A'
+        for color, side in (('white', 'A' if a_white else 'B'), ('black', 'B' if a_white else 'A')):
+            self.nodes[side] += game['nodes'][color]
+            self.seconds[side] += game['seconds'][color]
+        if game['result'] == '1/2-1/2':
+            self.draws += 1
+        elif (game['result'] == '1-0') == a_white:
+            self.wins += 1
+        else:
+            self.losses += 1
+
+    def nps(self, side):
+        return round(self.nodes[side] / self.seconds[side]) if self.seconds[side] else 0
+
+    def __str__(self):
+        diff, margin = elo(self.wins, self.draws, self.losses)
+        rate = self.games / (time.perf_counter() - self.start)
+        return f'games {self.games}  +{self.wins} ={self.draws} -{self.losses}  elo {diff:+.1f} +/- {margin:.1f}  ' \
+               f'{rate:.2f} games/s  nps A {self.nps("A")} B {self.nps("B")}'
+
+def run(games, a, b, openings, output, jobs=1, max_plies=MAX_PLIES, report=10):
+    """
+    Play games A (settings a) against B (settings b), appending each to
+    output as it ends. Returns the final Tally.
+    """
+    tally = Tally()
+    sides = {'A': ('A', a), 'B': ('B', b)}
+    schedule = ((index, openings[index // 2 % len(openings)],
+                 {'white': sides['A' if index % 2 == 0 else 'B'], 'black': sides['B' if index % 2 == 0 else 'A']})
+                for index in range(games))
+
+    with open(output, 'a') as f, \
+            ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context('spawn')) as pool:
+        # a few games queued per worker; the rest are submitted as these finish
+        pending = set()
+        for index, fen, colors in schedule:
+            pending.add(pool.submit(play_game, index, fen, colors, max_plies))
+            if len(pending) < jobs * 2:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                _record(future.result(), tally, f, report)
+        for future in pending:
+            _record(future.result(), tally, f, report)
+    return tally
+
+def _record(game, tally, f, report):
+    f.write(game['pgn'])
+    f.flush()
+    tally.add(game)
+    if report and tally.games % report == 0:
+        print(tally, flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='arena', description='Play AIPlayer against AIPlayer.')
+    parser.add_argument('--a', default='depth=2', help='settings of side A, e.g. depth=3,hash=16 (default: depth=2)')
+    parser.add_argument('--b', default='depth=2', help='settings of side B (default: depth=2)')
+    parser.add_argument('--games', type=int, default=100, help='games to play (default: 100)')
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(),
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--openings', help='file of opening positions, one FEN or EPD a line')
+    parser.add_argument('--random-plies', type=int, default=RANDOM_PLIES,
+                        help=f'without --openings, random plies from the start to each opening (default: {RANDOM_PLIES})')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random openings (default: 0)')
+    parser.add_argument('--output', default='arena.pgn', help='PGN file the games are appended to')
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES, help='plies before a game is adjudicated a draw')
+    parser.add_argument('--report', type=int, default=10, help='print the standings every N games')
+    args = parser.parse_args(argv)
+
+    try:
+        a, b = parse_settings(args.a), parse_settings(args.b)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.openings:
+        openings = read_openings(args.openings)
+    elif args.random_plies > 0:
+        # a new opening for every pair of games
+        openings = random_openings((args.games + 1) // 2, args.random_plies, args.seed)
+    else:
+        parser.error('--random-plies must be at least 1 without --openings: every game from the start would be the same')
+
+    tally = run(args.games, a, b, openings, args.output, args.jobs, args.max_plies, args.report)
+    print(f'final  {tally}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
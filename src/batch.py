@@ -0,0 +1,294 @@
+"""
+Batch evaluation: score many positions at once with NumPy.
+
+Positions are int8 arrays, either (N, 64) piece codes or (N, 12, 64)
+planes, and are stored as (N, 33) uint8 packed rows (see Board.pack) that
+pack/unpack convert in bulk and save_packed/load_packed keep in flat
+files. A code is KINDS[name] + 1 for a white piece (pawn 1 ... king 6),
+its negative for a black one and 0 for an empty square; square indices are
+row * 8 + col as everywhere else. Planes hold one 0/1 plane per (color,
+kind), white pawn ... white king then black pawn ... black king.
+
+    python -m batch --positions 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError('batch evaluation needs NumPy: pip install numpy (or pip install -r requirements.txt)') from error
+
+from const import *
+from bitboard import KINDS, NAMES, KNIGHT_ATTACKS, KING_ATTACKS, BISHOP_RAYS, ROOK_RAYS, squares_of
+from evaluation import PST_MG, PST_EG, PHASE_WEIGHTS, MAX_PHASE, totals
+from board import PACKED_SIZE, PACKED_CODES, EP_PAWN
+from piece import Pawn, Knight, Bishop, Rook, Queen
+
+# centipawns per square the pieces attack on an empty board and could move to
+MOBILITY_WEIGHT = 2
+
+_COLORS = ('white', 'black')
+_VALUES = {piece('white').name: piece('white').value for piece in (Pawn, Knight, Bishop, Rook, Queen)}
+
+def _code(color, name):
+    return (KINDS[name] + 1) * (1 if color == 'white' else -1)
+
+CODES = {(color, name): _code(color, name) for color in _COLORS for name in NAMES}
+
+# lookup tables indexed by code + 6
+MATERIAL = np.zeros(13, dtype=np.float64)
+PHASE = np.zeros(13, dtype=np.int32)
+MG = np.zeros((13, 64), dtype=np.int32)
+EG = np.zeros((13, 64), dtype=np.int32)
+for _color in _COLORS:
+    for _name in NAMES:
+        _index = _code(_color, _name) + 6
+        MATERIAL[_index] = _VALUES.get(_name, 0.0) * (1 if _color == 'white' else -1)
+        PHASE[_index] = PHASE_WEIGHTS[_name]
+        MG[_index] = PST_MG[_color][_name]
+        EG[_index] = PST_EG[_color][_name]
+
+# code of each plane, for turning planes into codes
+PLANE_CODES = np.array([_code(color, name) for color in _COLORS for name in NAMES], dtype=np.int8)
+
+# packed square nibbles (see board.PACKED_CODES) to codes, and codes + 6 to nibbles
+NIBBLE_CODES = np.zeros(16, dtype=np.int8)
+CODE_NIBBLES = np.zeros(13, dtype=np.uint8)
+for (_color, _name), _nibble in PACKED_CODES.items():
+    NIBBLE_CODES[_nibble] = _code(_color, _name)
+    CODE_NIBBLES[_code(_color, _name) + 6] = _nibble
+# code of an en passant pawn by square: white on the fourth rank, black on the fifth
+EP_PAWN_CODES = np.zeros(64, dtype=np.int8)
+EP_PAWN_CODES[32:40] = 1
+EP_PAWN_CODES[24:32] = -1
+
+def _matrix(table):
+    matrix = np.zeros((64, 64), dtype=np.float32)
+    for sq in range(64):
+        for target in squares_of(table[sq]):
+            matrix[sq, target] = 1
+    return matrix
+
+# empty-board attack matrices of knight, bishop, rook, queen and king,
+# stacked so one matrix product gives every piece's reach at once
+_REACH = [_matrix(KNIGHT_ATTACKS), _matrix(BISHOP_RAYS), _matrix(ROOK_RAYS),
+          _matrix([BISHOP_RAYS[sq] | ROOK_RAYS[sq] for sq in range(64)]), _matrix(KING_ATTACKS)]
+REACH = np.concatenate(_REACH)
+_REACH_CODES = np.arange(2, 7, dtype=np.int8)
+
+def encode(board):
+    """
+    (64,) int8 piece codes of a Board.
+    """
+    return np.array(_codes(board), dtype=np.int8)
+
+def _codes(board):
+    return [0 if square.piece is None else CODES[square.piece.color, square.piece.name]
+            for row in board.squares for square in row]
+
+def encode_many(boards):
+    """
+    (N, 64) int8 piece codes of a sequence of Boards.
+    """
+    return np.array([_codes(board) for board in boards], dtype=np.int8).reshape(-1, 64)
+
+def encode_bitboard(bitboard):
+    """
+    (64,) int8 piece codes of a BitBoard, read straight from its bitboards.
+    """
+    codes = np.zeros(64, dtype=np.int8)
+    for index, bb in enumerate(bitboard.bbs):
+        code = PLANE_CODES[index]
+        for sq in squares_of(bb):
+            codes[sq] = code
+    return codes
+
+def to_planes(codes):
+    """
+    (N, 12, 64) planes from (N, 64) codes.
+    """
+    return (codes[:, None, :] == PLANE_CODES[None, :, None]).astype(np.int8)
+
+def to_codes(planes):
+    """
+    (N, 64) codes from (N, 12, 64) planes.
+    """
+    return np.einsum('nps,p->ns', planes.astype(np.int16), PLANE_CODES.astype(np.int16)).astype(np.int8)
+
+def evaluate(positions, side=None, mobility=True):
+    """
+    Scores in centipawns for (N, 64) codes or (N, 12, 64) planes: material,
+    tapered piece-square terms and, with mobility, a mobility proxy (empty
+    squares each piece reaches on an empty board). From white's point of
+    view, or the side to move's when side is an (N,) array of +1 / -1.
+    Without mobility and with side, the scores equal evaluation.evaluate.
+    """
+    positions = np.asarray(positions)
+    codes = to_codes(positions) if positions.ndim == 3 else positions
+    index = codes.astype(np.intp) + 6
+
+    material = np.rint(MATERIAL[index].sum(axis=1) * 100).astype(np.int64)
+    squares = np.arange(64)
+    mg = MG[index, squares].sum(axis=1, dtype=np.int64)
+    eg = EG[index, squares].sum(axis=1, dtype=np.int64)
+    phase = np.minimum(PHASE[index].sum(axis=1), MAX_PHASE)
+    scores = material + (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+
+    if mobility:
+        # +1 / -1 where a white / black piece of each kind stands, (N, 5 * 64)
+        # (float so the product goes through BLAS)
+        signs = np.sign(codes).astype(np.float32)
+        pieces = (np.abs(codes)[:, None, :] == _REACH_CODES[None, :, None]) * signs[:, None, :]
+        reach = pieces.reshape(len(codes), -1) @ REACH
+        scores += MOBILITY_WEIGHT * np.rint((reach * (codes == 0)).sum(axis=1)).astype(np.int64)
+
+    if side is not None:
+        scores = scores * np.asarray(side)
+    return scores
+
+def pack_many(boards):
+    """
+    (N, 33) packed rows of a sequence of Boards.
+    """
+    return np.frombuffer(b''.join(board.pack() for board in boards), dtype=np.uint8).reshape(-1, PACKED_SIZE)
+
+def pack(codes, side, castling=None, en_passant=None):
+    """
+    (N, 33) packed rows from (N, 64) codes, the side to move (+1 / -1), the
+    castling rights bitmasks and the en passant files (-1 for none).
+    """
+    codes = np.asarray(codes)
+    side = np.asarray(side)
+    nibbles = CODE_NIBBLES[codes.astype(np.intp) + 6]
+    if en_passant is not None:
+        en_passant = np.asarray(en_passant)
+        rows = np.nonzero(en_passant >= 0)[0]
+        # the pawn that made the double step: fifth rank with white to move, fourth with black
+        nibbles[rows, np.where(side[rows] > 0, 3, 4) * 8 + en_passant[rows]] = EP_PAWN
+
+    packed = np.empty((len(codes), PACKED_SIZE), dtype=np.uint8)
+    packed[:, :32] = nibbles[:, 0::2] | nibbles[:, 1::2] << 4
+    packed[:, 32] = (side < 0).astype(np.uint8)
+    if castling is not None:
+        packed[:, 32] |= np.asarray(castling, dtype=np.uint8) << 1
+    return packed
+
+def unpack(packed):
+    """
+    (codes, side, castling, en_passant) of (N, 33) packed rows: (N, 64) int8
+    codes, +1 / -1 side to move, castling rights bitmasks and en passant
+    files (-1 for none).
+    """
+    packed = np.asarray(packed, dtype=np.uint8).reshape(-1, PACKED_SIZE)
+    nibbles = np.empty((len(packed), 64), dtype=np.uint8)
+    nibbles[:, 0::2] = packed[:, :32] & 15
+    nibbles[:, 1::2] = packed[:, :32] >> 4
+
+    en_passant_pawns = nibbles == EP_PAWN
+    codes = np.where(en_passant_pawns, EP_PAWN_CODES, NIBBLE_CODES[nibbles])
+    en_passant = np.where(en_passant_pawns.any(axis=1), en_passant_pawns.argmax(axis=1) % 8, -1).astype(np.int8)
+    state = packed[:, 32]
+    side = np.where(state & 1, -1, 1).astype(np.int8)
+    return codes, side, state >> 1 & 15, en_passant
+
+def save_packed(path, packed, append=False):
+    """
+    Write packed rows to a flat file, after what's there with append.
+    """
+    with open(path, 'ab' if append else 'wb') as f:
+        np.ascontiguousarray(packed, dtype=np.uint8).tofile(f)
+
+def load_packed(path):
+    """
+    (N, 33) packed rows of a flat file, memory-mapped rather than read.
+    """
+    return np.memmap(path, dtype=np.uint8, mode='r').reshape(-1, PACKED_SIZE)
+
+def random_positions(count, seed=0, max_plies=80):
+    """
+    Boards reached by random playouts from the start position.
+    """
+    from board import Board
+
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        board = Board()
+        for ply in range(rng.randrange(max_plies)):
+            moves = board.legal_moves()
+            if not moves:
+                break
+            board.make_move(rng.choice(moves))
+        boards.append(board)
+    return boards
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='batch', description='Batch evaluation throughput.')
+    parser.add_argument('--positions', type=int, default=10000, help='positions to score (default: 10000)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    boards = random_positions(args.positions, args.seed)
+
+    start = time.perf_counter()
+    codes = encode_many(boards)
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = evaluate(codes, mobility=False)
+    batch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    evaluate(codes)
+    mobility_seconds = time.perf_counter() - start
+
+    # the scalar evaluator, summing every board from scratch
+    start = time.perf_counter()
+    scalar = []
+    for board in boards:
+        material, mg, eg, phase = totals(board)
+        phase = min(phase, MAX_PHASE)
+        scalar.append(round(material * 100) + (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE)
+    scalar_seconds = time.perf_counter() - start
+
+    mismatches = int((scores != np.array(scalar)).sum())
+    count = len(boards)
+    for name, seconds in (('encode', encode_seconds), ('scalar', scalar_seconds),
+                          ('batch', batch_seconds), ('batch+mobility', mobility_seconds)):
+        print(f'{name:<15} {seconds:>8.3f}s  {round(count / seconds) if seconds else 0:>10} positions/s')
+    print(f'speedup {scalar_seconds / batch_seconds if batch_seconds else 0:.1f}x, mismatches {mismatches}')
+
+    # packed rows: from the boards, back to codes, and through a flat file
+    start = time.perf_counter()
+    packed = pack_many(boards)
+    pack_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    unpacked, side, castling, en_passant = unpack(packed)
+    unpack_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    repacked = pack(unpacked, side, castling, en_passant)
+    repack_seconds = time.perf_counter() - start
+
+    path = os.path.join(tempfile.mkdtemp(), 'positions.bin')
+    start = time.perf_counter()
+    save_packed(path, packed)
+    loaded = np.array(load_packed(path))
+    file_seconds = time.perf_counter() - start
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+    for name, seconds in (('pack boards', pack_seconds), ('unpack', unpack_seconds), ('pack codes', repack_seconds),
+                          ('save+load', file_seconds)):
+        print(f'{name:<15} {seconds:>8.3f}s  {round(count / seconds) if seconds else 0:>10} positions/s')
+    mismatches = (unpacked != codes).any(axis=1).sum() + (repacked != packed).any(axis=1).sum() + \
+        (loaded != packed).any(axis=1).sum()
+    print(f'packed {packed.nbytes} bytes, round trip mismatches {int(mismatches)}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,509 @@
+from const import *
+from square import Square
+from piece import *
+from move import Move, CAPTURE, EN_PASSANT
+from board import Board
+
+# Bitboard core for search and batch jobs: one int per (color, kind),
+# bit index = row * 8 + col, so square indices line up with Board.squares.
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+COLORS = ('white', 'black')
+KINDS = {'pawn': PAWN, 'knight': KNIGHT, 'bishop': BISHOP, 'rook': ROOK, 'queen': QUEEN, 'king': KING}
+PIECES = (Pawn, Knight, Bishop, Rook, Queen, King)
+NAMES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+
+FULL = 0xFFFFFFFFFFFFFFFF
+
+# castling rights
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+def bit(row, col):
+    return 1 << (row * COLS + col)
+
+def squares_of(bb):
+    """
+    Yield the index of every set bit, lowest first.
+    """
+    while bb:
+        b = bb & -bb
+        yield b.bit_length() - 1
+        bb ^= b
+
+def bswap(bb):
+    return int.from_bytes(bb.to_bytes(8, 'little'), 'big')
+
+def _leaper_table(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, COLS)
+        bb = 0
+        for dr, dc in offsets:
+            r, c = row + dr, col + dc
+            if 0 <= r < ROWS and 0 <= c < COLS:
+                bb |= bit(r, c)
+        table.append(bb)
+    return table
+
+def _line_mask(sq, dr, dc):
+    row, col = divmod(sq, COLS)
+    bb = 0
+    for sign in (1, -1):
+        r, c = row + sign * dr, col + sign * dc
+        while 0 <= r < ROWS and 0 <= c < COLS:
+            bb |= bit(r, c)
+            r += sign * dr
+            c += sign * dc
+    return bb
+
+def _rank_table():
+    # attacks along a single rank, indexed by [col][occupancy byte]
+    table = []
+    for col in range(COLS):
+        row = []
+        for occ in range(256):
+            attacks = 0
+            for step in (1, -1):
+                c = col + step
+                while 0 <= c < COLS:
+                    attacks |= 1 << c
+                    if occ & (1 << c):
+                        break
+                    c += step
+            row.append(attacks)
+        table.append(row)
+    return table
+
+KNIGHT_ATTACKS = _leaper_table(((-2, 1), (-2, -1), (2, 1), (2, -1), (-1, 2), (-1, -2), (1, 2), (1, -2)))
+KING_ATTACKS = _leaper_table(((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)))
+# white pawns attack towards row 0, black pawns towards row 7
+PAWN_ATTACKS = (_leaper_table(((-1, -1), (-1, 1))), _leaper_table(((1, -1), (1, 1))))
+
+FILE_MASKS = [_line_mask(sq, 1, 0) for sq in range(64)]
+DIAGONAL_MASKS = [_line_mask(sq, 1, 1) for sq in range(64)]
+ANTIDIAGONAL_MASKS = [_line_mask(sq, 1, -1) for sq in range(64)]
+RANK_ATTACKS = _rank_table()
+SQUARE_BITS = [1 << sq for sq in range(64)]
+SWAPPED_BITS = [bswap(1 << sq) for sq in range(64)]
+
+def _between(a, b):
+    ar, ac = divmod(a, COLS)
+    br, bc = divmod(b, COLS)
+    dr, dc = br - ar, bc - ac
+    if a == b or not (dr == 0 or dc == 0 or abs(dr) == abs(dc)):
+        return 0
+    dr = (dr > 0) - (dr < 0)
+    dc = (dc > 0) - (dc < 0)
+    bb = 0
+    r, c = ar + dr, ac + dc
+    while (r, c) != (br, bc):
+        bb |= bit(r, c)
+        r += dr
+        c += dc
+    return bb
+
+# squares strictly between two aligned squares, 0 if they don't share a line
+BETWEEN = [[_between(a, b) for b in range(64)] for a in range(64)]
+ROOK_RAYS = [FILE_MASKS[sq] | ((0xFF << (sq & ~7)) & ~(1 << sq)) for sq in range(64)]
+BISHOP_RAYS = [DIAGONAL_MASKS[sq] | ANTIDIAGONAL_MASKS[sq] for sq in range(64)]
+
+PROMOTION_ROWS = (0x00000000000000FF, 0xFF00000000000000)
+# rows a single push has to land on for a double push to follow
+DOUBLE_PUSH_ROWS = (0x0000FF0000000000, 0x0000000000FF0000)
+
+# rights that survive a move touching each square
+CASTLE_MASKS = [0xF] * 64
+CASTLE_MASKS[60] = 0xF & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLE_MASKS[63] = 0xF & ~WHITE_KINGSIDE
+CASTLE_MASKS[56] = 0xF & ~WHITE_QUEENSIDE
+CASTLE_MASKS[4] = 0xF & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLE_MASKS[7] = 0xF & ~BLACK_KINGSIDE
+CASTLE_MASKS[0] = 0xF & ~BLACK_QUEENSIDE
+
+def _hyperbola(occ, sq, mask):
+    forward = occ & mask
+    reverse = bswap(forward)
+    forward -= SQUARE_BITS[sq]
+    reverse = (reverse - SWAPPED_BITS[sq]) & FULL
+    forward ^= bswap(reverse)
+    return forward & mask
+
+def rank_attacks(occ, sq):
+    shift = sq & ~7
+    return RANK_ATTACKS[sq & 7][(occ >> shift) & 0xFF] << shift
+
+# Slider lookups: attacks only depend on the blockers inside the square's
+# relevant mask (rays without the board edge), so each square gets a table
+# keyed by those blockers. Python's dict hash does the job a magic multiply
+# does in C, and entries are filled by hyperbola quintessence on first use.
+EDGES = 0xFF818181818181FF
+BISHOP_MASKS = [(DIAGONAL_MASKS[sq] | ANTIDIAGONAL_MASKS[sq]) & ~EDGES for sq in range(64)]
+ROOK_MASKS = [(FILE_MASKS[sq] & ~(0xFF | 0xFF << 56)) | ((0x7E << (sq & ~7)) & ~(1 << sq)) for sq in range(64)]
+_BISHOP_TABLES = [{} for sq in range(64)]
+_ROOK_TABLES = [{} for sq in range(64)]
+
+def bishop_attacks(occ, sq):
+    blockers = occ & BISHOP_MASKS[sq]
+    table = _BISHOP_TABLES[sq]
+    attacks = table.get(blockers)
+    if attacks is None:
+        attacks = table[blockers] = _hyperbola(occ, sq, DIAGONAL_MASKS[sq]) | _hyperbola(occ, sq, ANTIDIAGONAL_MASKS[sq])
+    return attacks
+
+def rook_attacks(occ, sq):
+    blockers = occ & ROOK_MASKS[sq]
+    table = _ROOK_TABLES[sq]
+    attacks = table.get(blockers)
+    if attacks is None:
+        attacks = table[blockers] = _hyperbola(occ, sq, FILE_MASKS[sq]) | rank_attacks(occ, sq)
+    return attacks
+
+def queen_attacks(occ, sq):
+    return bishop_attacks(occ, sq) | rook_attacks(occ, sq)
+
+def encode_move(initial, final, promotion=0):
+    """
+    Pack a move into an int: from square, to square and promotion kind.
+    """
+    return initial | final << 6 | promotion << 12
+
+def decode_move(code):
+    return code & 63, (code >> 6) & 63, code >> 12
+
+class BitBoard:
+
+    def __init__(self):
+        # bbs[color * 6 + kind]
+        self.bbs = [0] * 12
+        self.side = WHITE
+        self.castling = 0
+        self.en_passant = -1
+
+    # conversion
+
+    @classmethod
+    def from_board(cls, board):
+        bitboard = cls()
+        bbs = bitboard.bbs
+        for row in range(ROWS):
+            for col in range(COLS):
+                piece = board.squares[row][col].piece
+                if piece is not None:
+                    color = WHITE if piece.color == 'white' else BLACK
+                    bbs[color * 6 + KINDS[piece.name]] |= bit(row, col)
+
+        bitboard.side = WHITE if board.next_player == 'white' else BLACK
+
+        for color, row, rights in ((WHITE, 7, (WHITE_KINGSIDE, WHITE_QUEENSIDE)),
+                                   (BLACK, 0, (BLACK_KINGSIDE, BLACK_QUEENSIDE))):
+            king = board.squares[row][4].piece
+            if isinstance(king, King) and king.color == COLORS[color] and not king.moved:
+                for rook_col, right in zip((7, 0), rights):
+                    rook = board.squares[row][rook_col].piece
+                    if isinstance(rook, Rook) and rook.color == king.color and not rook.moved:
+                        bitboard.castling |= right
+
+        if board.en_passant is not None:
+            bitboard.en_passant = board.en_passant.row * COLS + board.en_passant.col
+
+        return bitboard
+
+    def to_board(self):
+        board = Board._empty()
+        for index, bb in enumerate(self.bbs):
+            color, kind = divmod(index, 6)
+            for sq in squares_of(bb):
+                row, col = divmod(sq, COLS)
+                piece = PIECES[kind](COLORS[color])
+                piece.moved = True
+                board.squares[row][col].piece = piece
+                if kind == KING:
+                    board.kings[piece.color] = (row, col)
+
+        board.next_player = COLORS[self.side]
+        # castling bits are zobrist.CASTLING_RIGHTS'
+        board._set_state(self.castling, self.en_passant % COLS if self.en_passant >= 0 else None)
+        return board
+
+    def to_move(self, code, board=None):
+        """
+        Facade Move for an encoded move. With a board, captures get the
+        CAPTURE (and EN_PASSANT) flags like the moves Board.calc_moves makes.
+        """
+        initial, final, promotion = decode_move(code)
+        flags = 0
+        if board is not None:
+            row, col = divmod(final, COLS)
+            if board.squares[row][col].piece is not None:
+                flags = CAPTURE
+            elif col != initial % COLS and isinstance(board.squares[initial // COLS][initial % COLS].piece, Pawn):
+                flags = CAPTURE | EN_PASSANT
+        return Move(Square.at(initial), Square.at(final), NAMES[promotion] if promotion else None, flags)
+
+    def from_move(self, move):
+        initial = move.initial.row * COLS + move.initial.col
+        final = move.final.row * COLS + move.final.col
+        promotion = 0
+        if self.bbs[self.side * 6 + PAWN] & SQUARE_BITS[initial] and (final < 8 or final >= 56):
+            promotion = KINDS[move.promotion or 'queen']
+        return encode_move(initial, final, promotion)
+
+    # queries
+
+    def occupancy(self, color):
+        base = color * 6
+        bbs = self.bbs
+        return bbs[base] | bbs[base + 1] | bbs[base + 2] | bbs[base + 3] | bbs[base + 4] | bbs[base + 5]
+
+    def piece_at(self, sq):
+        b = SQUARE_BITS[sq]
+        for index, bb in enumerate(self.bbs):
+            if bb & b:
+                return index
+        return -1
+
+    def attackers(self, sq, color, occ):
+        """
+        Bitboard of color's pieces attacking sq given occupancy occ.
+        """
+        bbs = self.bbs
+        base = color * 6
+        bishops = bbs[base + BISHOP] | bbs[base + QUEEN]
+        rooks = bbs[base + ROOK] | bbs[base + QUEEN]
+        return (PAWN_ATTACKS[color ^ 1][sq] & bbs[base + PAWN]) | \
+            (KNIGHT_ATTACKS[sq] & bbs[base + KNIGHT]) | \
+            (KING_ATTACKS[sq] & bbs[base + KING]) | \
+            (bishop_attacks(occ, sq) & bishops) | \
+            (rook_attacks(occ, sq) & rooks)
+
+    def is_attacked(self, sq, color, occ, removed=0):
+        """
+        True if color attacks sq, ignoring color's pieces on removed.
+        """
+        bbs = self.bbs
+        base = color * 6
+        keep = ~removed
+        if PAWN_ATTACKS[color ^ 1][sq] & bbs[base + PAWN] & keep:
+            return True
+        if KNIGHT_ATTACKS[sq] & bbs[base + KNIGHT] & keep:
+            return True
+        if KING_ATTACKS[sq] & bbs[base + KING]:
+            return True
+        queens = bbs[base + QUEEN]
+        bishops = (bbs[base + BISHOP] | queens) & keep
+        if bishops and bishop_attacks(occ, sq) & bishops:
+            return True
+        rooks = (bbs[base + ROOK] | queens) & keep
+        if rooks and rook_attacks(occ, sq) & rooks:
+            return True
+        return False
+
+    def pinned(self, king, color, own, occ):
+        """
+        Bitboard of color's pieces pinned to the king on square king.
+        """
+        bbs = self.bbs
+        base = (color ^ 1) * 6
+        queens = bbs[base + QUEEN]
+        snipers = (ROOK_RAYS[king] & (bbs[base + ROOK] | queens)) | \
+            (BISHOP_RAYS[king] & (bbs[base + BISHOP] | queens))
+        pinned = 0
+        between = BETWEEN[king]
+        for sniper in squares_of(snipers):
+            blockers = between[sniper] & occ
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+        return pinned
+
+    def in_check(self, color=None):
+        color = self.side if color is None else color
+        king = self.bbs[color * 6 + KING]
+        if not king:
+            return False
+        occ = self.occupancy(WHITE) | self.occupancy(BLACK)
+        return self.is_attacked(king.bit_length() - 1, color ^ 1, occ)
+
+    # move generation
+
+    def pseudo_moves(self):
+        """
+        Encoded pseudo-legal moves for the side to move (castling excluded).
+        """
+        bbs = self.bbs
+        us = self.side
+        them = us ^ 1
+        base = us * 6
+        own = self.occupancy(us)
+        enemy = self.occupancy(them)
+        occ = own | enemy
+        empty = ~occ & FULL
+        targets = ~own & FULL
+        moves = []
+        append = moves.append
+
+        # pawns
+        pawns = bbs[base + PAWN]
+        if us == WHITE:
+            single = (pawns >> 8) & empty
+            double = ((single & DOUBLE_PUSH_ROWS[WHITE]) >> 8) & empty
+            step = 8
+        else:
+            single = (pawns << 8) & empty
+            double = ((single & DOUBLE_PUSH_ROWS[BLACK]) << 8) & empty
+            step = -8
+        promotion_row = PROMOTION_ROWS[us]
+        for to in squares_of(single):
+            if SQUARE_BITS[to] & promotion_row:
+                for kind in (QUEEN, ROOK, BISHOP, KNIGHT):
+                    append((to + step) | to << 6 | kind << 12)
+            else:
+                append((to + step) | to << 6)
+        for to in squares_of(double):
+            append((to + 2 * step) | to << 6)
+        capturable = enemy
+        if self.en_passant >= 0:
+            capturable |= SQUARE_BITS[self.en_passant]
+        for frm in squares_of(pawns):
+            for to in squares_of(PAWN_ATTACKS[us][frm] & capturable):
+                if SQUARE_BITS[to] & promotion_row:
+                    for kind in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        append(frm | to << 6 | kind << 12)
+                else:
+                    append(frm | to << 6)
+
+        # pieces
+        for frm in squares_of(bbs[base + KNIGHT]):
+            for to in squares_of(KNIGHT_ATTACKS[frm] & targets):
+                append(frm | to << 6)
+        for frm in squares_of(bbs[base + BISHOP]):
+            for to in squares_of(bishop_attacks(occ, frm) & targets):
+                append(frm | to << 6)
+        for frm in squares_of(bbs[base + ROOK]):
+            for to in squares_of(rook_attacks(occ, frm) & targets):
+                append(frm | to << 6)
+        for frm in squares_of(bbs[base + QUEEN]):
+            for to in squares_of(queen_attacks(occ, frm) & targets):
+                append(frm | to << 6)
+        for frm in squares_of(bbs[base + KING]):
+            for to in squares_of(KING_ATTACKS[frm] & targets):
+                append(frm | to << 6)
+
+        return moves
+
+    def legal_moves(self):
+        """
+        Encoded legal moves for the side to move, the same set
+        Board.calc_moves(check_safety=True) produces for every piece.
+        """
+        bbs = self.bbs
+        us = self.side
+        them = us ^ 1
+        king_bb = bbs[us * 6 + KING]
+        if not king_bb:
+            return self.pseudo_moves()
+        king = king_bb.bit_length() - 1
+        own = self.occupancy(us)
+        enemy = self.occupancy(them)
+        occ = own | enemy
+        checked = self.is_attacked(king, them, occ)
+        pinned = self.pinned(king, us, own, occ)
+        ep_bit = SQUARE_BITS[self.en_passant] if self.en_passant >= 0 else 0
+        pawns = bbs[us * 6 + PAWN]
+
+        legal = []
+        for code in self.pseudo_moves():
+            frm = code & 63
+            to = (code >> 6) & 63
+            frm_bit = SQUARE_BITS[frm]
+            to_bit = SQUARE_BITS[to]
+            if frm == king:
+                if not self.is_attacked(to, them, (occ ^ frm_bit) | to_bit, to_bit):
+                    legal.append(code)
+            elif to_bit == ep_bit and frm_bit & pawns:
+                captured = SQUARE_BITS[to + (8 if us == WHITE else -8)]
+                after = (occ ^ frm_bit ^ captured) | to_bit
+                if not self.is_attacked(king, them, after, captured):
+                    legal.append(code)
+            elif checked or frm_bit & pinned:
+                if not self.is_attacked(king, them, (occ ^ frm_bit) | to_bit, to_bit):
+                    legal.append(code)
+            else:
+                legal.append(code)
+
+        # castling: empty path, king never crosses an attacked square
+        if self.castling and not checked:
+            if us == WHITE:
+                sides = ((WHITE_KINGSIDE, 0x6000000000000000, (61, 62), 62),
+                         (WHITE_QUEENSIDE, 0x0E00000000000000, (59, 58), 58))
+            else:
+                sides = ((BLACK_KINGSIDE, 0x60, (5, 6), 6),
+                         (BLACK_QUEENSIDE, 0x0E, (3, 2), 2))
+            for right, path, crossed, to in sides:
+                if self.castling & right and not occ & path and \
+                        not any(self.is_attacked(sq, them, occ) for sq in crossed):
+                    legal.append(king | to << 6)
+
+        return legal
+
+    def moves(self, board=None):
+        """
+        Legal moves as Move objects, ready for Board.make_move.
+        """
+        return [self.to_move(code, board) for code in self.legal_moves()]
+
+    # make / unmake
+
+    def make_move(self, code):
+        """
+        Play an encoded move and return the state unmake_move restores.
+        """
+        bbs = self.bbs
+        undo = (list(bbs), self.side, self.castling, self.en_passant)
+        frm = code & 63
+        to = (code >> 6) & 63
+        promotion = code >> 12
+        frm_bit = SQUARE_BITS[frm]
+        to_bit = SQUARE_BITS[to]
+        us = self.side
+        them = us ^ 1
+        base = us * 6
+        enemy_base = them * 6
+
+        kind = 0
+        while not bbs[base + kind] & frm_bit:
+            kind += 1
+
+        # captures
+        for index in range(enemy_base, enemy_base + 6):
+            if bbs[index] & to_bit:
+                bbs[index] ^= to_bit
+                break
+
+        bbs[base + kind] ^= frm_bit | to_bit
+        en_passant = -1
+
+        if kind == PAWN:
+            if to == self.en_passant:
+                bbs[enemy_base + PAWN] ^= SQUARE_BITS[to + (8 if us == WHITE else -8)]
+            elif abs(to - frm) == 16:
+                skipped = (frm + to) // 2
+                if PAWN_ATTACKS[us][skipped] & bbs[enemy_base + PAWN]:
+                    en_passant = skipped
+            elif promotion:
+                bbs[base + PAWN] ^= to_bit
+                bbs[base + promotion] |= to_bit
+        elif kind == KING and abs(to - frm) == 2:
+            rook_from, rook_to = (frm + 3, frm + 1) if to > frm else (frm - 4, frm - 1)
+            bbs[base + ROOK] ^= SQUARE_BITS[rook_from] | SQUARE_BITS[rook_to]
+
+        self.castling &= CASTLE_MASKS[frm] & CASTLE_MASKS[to]
+        self.en_passant = en_passant
+        self.side = them
+
+        return undo
+
+    def unmake_move(self, undo):
+        bbs, self.side, self.castling, self.en_passant = undo
+        self.bbs[:] = bbs
@@ -1,114 +1,807 @@
 from const import *
 from square import Square
 from piece import *
-from move import Move
-from sound import Sound
-import copy
-import os
+from move import Move, PROMOTION_CODES, CAPTURE, EN_PASSANT
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS, CASTLING_RIGHTS, castling_rights, hash_board
+from evaluation import PST_MG, PST_EG, PHASE_WEIGHTS, totals
+
+PROMOTIONS = {'queen': Queen, 'rook': Rook, 'bishop': Bishop, 'knight': Knight}
+FEN_PIECES = {'p': Pawn, 'n': Knight, 'b': Bishop, 'r': Rook, 'q': Queen, 'k': King}
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# castling rights bits (see zobrist.CASTLING_RIGHTS) as FEN writes them
+FEN_CASTLING = ((1, 'K'), (2, 'Q'), (4, 'k'), (8, 'q'))
+
+# packed positions: 32 bytes of 4-bit square codes (square 2i in the low
+# nibble of byte i, 2i + 1 in the high one) and a state byte holding the
+# side to move (bit 0, set for black) and the castling rights (bits 1-4).
+# Codes are 1-6 for a white pawn ... king, 9-14 for black ones and 0 for
+# an empty square; EP_PAWN marks a pawn that can be taken en passant.
+# The move clocks are not kept.
+PACKED_SIZE = 33
+PACKED_PIECES = (Pawn, Knight, Bishop, Rook, Queen, King)
+PACKED_CODES = {(color, kind(color).name): code + (1 if color == 'white' else 9)
+                for code, kind in enumerate(PACKED_PIECES) for color in ('white', 'black')}
+EP_PAWN = 7
+
+KNIGHT_OFFSETS = ((-2, 1), (-2, -1), (2, 1), (2, -1), (-1, 2), (-1, -2), (1, 2), (1, -2))
+KING_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+DIAGONALS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+STRAIGHTS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+PROMOTION_VALUES = {name: abs(kind('white').value) for name, kind in PROMOTIONS.items()}
+
+class UndoInfo:
+    """
+    Everything make_move changes that can't be recomputed from the move.
+    """
+    __slots__ = ('move', 'piece', 'captured', 'captured_row', 'captured_col',
+                 'moved', 'rook', 'rook_moved', 'promoted', 'en_passant',
+                 'last_move', 'zobrist', 'scores', 'clocks')
+
+    def __init__(self, move, piece, moved, en_passant, last_move, zobrist, scores, clocks):
+        self.move = move
+        self.piece = piece
+        self.captured = None
+        self.captured_row = move.final.row
+        self.captured_col = move.final.col
+        self.moved = moved
+        self.rook = None
+        self.rook_moved = False
+        self.promoted = None
+        self.en_passant = en_passant
+        self.last_move = last_move
+        self.zobrist = zobrist
+        self.scores = scores
+        self.clocks = clocks
+
+class AttackInfo:
+    """
+    Checkers, pinned pieces and king danger squares for one side,
+    computed once per position. Squares are row * COLS + col.
+    """
+
+    def __init__(self, board, color):
+        squares = board.squares
+        king_row, king_col = board.kings[color]
+        king = king_row * COLS + king_col
+        self.checkers = []
+        # squares a non-king move has to land on while in check
+        self.evasions = None
+        # pinned square -> squares it may still move to (ray up to the pinner)
+        self.pins = {}
+        # squares the enemy attacks, looking through the king
+        self.danger = set()
+
+        danger = self.danger
+        for row in range(ROWS):
+            for col in range(COLS):
+                p = squares[row][col].piece
+                if p is None or p.color == color:
+                    continue
+
+                if isinstance(p, Pawn):
+                    r = row + p.dir
+                    for c in (col - 1, col + 1):
+                        if 0 <= r < ROWS and 0 <= c < COLS:
+                            danger.add(r * COLS + c)
+                            if r == king_row and c == king_col:
+                                self._add_checker(row * COLS + col, [])
+
+                elif isinstance(p, (Knight, King)):
+                    for dr, dc in KNIGHT_OFFSETS if isinstance(p, Knight) else KING_OFFSETS:
+                        r, c = row + dr, col + dc
+                        if 0 <= r < ROWS and 0 <= c < COLS:
+                            danger.add(r * COLS + c)
+                            if r == king_row and c == king_col:
+                                self._add_checker(row * COLS + col, [])
+
+                else:
+                    if isinstance(p, Bishop):
+                        directions = DIAGONALS
+                    elif isinstance(p, Rook):
+                        directions = STRAIGHTS
+                    else:
+                        directions = DIAGONALS + STRAIGHTS
+                    for dr, dc in directions:
+                        ray = []
+                        checking = False
+                        r, c = row + dr, col + dc
+                        while 0 <= r < ROWS and 0 <= c < COLS:
+                            sq = r * COLS + c
+                            danger.add(sq)
+                            if sq == king:
+                                checking = True
+                            elif squares[r][c].piece is not None:
+                                break
+                            elif not checking:
+                                ray.append(sq)
+                            r += dr
+                            c += dc
+                        if checking:
+                            self._add_checker(row * COLS + col, ray)
+
+        # pins: own piece between the king and an enemy slider on the same line
+        for directions, kinds in ((DIAGONALS, (Bishop, Queen)), (STRAIGHTS, (Rook, Queen))):
+            for dr, dc in directions:
+                ray = []
+                candidate = None
+                r, c = king_row + dr, king_col + dc
+                while 0 <= r < ROWS and 0 <= c < COLS:
+                    ray.append(r * COLS + c)
+                    p = squares[r][c].piece
+                    if p is not None:
+                        if p.color == color:
+                            if candidate is not None:
+                                break
+                            candidate = r * COLS + c
+                        else:
+                            if candidate is not None and isinstance(p, kinds):
+                                self.pins[candidate] = set(ray)
+                            break
+                    r += dr
+                    c += dc
+
+    def _add_checker(self, sq, ray):
+        self.checkers.append(sq)
+        if self.evasions is None:
+            self.evasions = set(ray)
+            self.evasions.add(sq)
+        else:
+            # double check: only the king can move
+            self.evasions = set()
+
+    def allows(self, origin, target):
+        """
+        True if moving the (non-king) piece on origin to target keeps the king safe.
+        """
+        ray = self.pins.get(origin)
+        if ray is not None and target not in ray:
+            return False
+        return self.evasions is None or target in self.evasions
 
 class Board:
 
     def __init__(self):
+        self._setup()
+        self._add_pieces('white')
+        self._add_pieces('black')
+        # 64-bit position key, kept up to date by make_move
+        self.zobrist = hash_board(self)
+        # evaluation sums (see evaluation.py), kept up to date by make_move
+        self.material, self.mg, self.eg, self.phase = totals(self)
+        # pawns of both colors, kept up to date by make_move for insufficient_material()
+        self.pawns = self.count_pawns()
+
+    @classmethod
+    def _empty(cls):
+        """
+        Board without pieces, key or evaluation sums, for from_fen, unpack
+        and BitBoard.to_board to fill in and finish with _set_state.
+        """
+        board = cls.__new__(cls)
+        board._setup()
+        return board
+
+    def _setup(self):
+        # everything but the pieces and what's computed from them
         self.squares = [[0, 0, 0, 0, 0, 0, 0, 0] for col in range(COLS)]
         self.last_move = None
+        self.next_player = 'white'
+        # square skipped by a double pawn push that can be taken en passant
+        self.en_passant = None
+        # en passant square the board was set up with (FEN or unpack), takeable or not, for to_fen
+        self.en_passant_target = None
+        # plies since the last capture or pawn move, and the move number (FEN's clocks)
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        # zobrist keys of the positions before each move, pushed by make_move and popped by unmake_move
+        self.history = []
+        self.kings = {}
+        # AttackInfo per color for the current position
+        self._attack_info = {}
         self._create()
-        self._add_pieces('white')
-        self._add_pieces('black')
+        # called as listener(board, move, captured) after every move(), e.g. the gui's sounds
+        self.listeners = []
+        # legal moves of the side to move, keyed by the zobrist key they were generated for
+        self._turn_key = None
+        self._turn_moves = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __getstate__(self):
+        # listeners belong to whoever holds this board, not to copies sent to the engine
+        state = self.__dict__.copy()
+        state['listeners'] = []
+        return state
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        Board set up from a FEN string (placement, side, castling, en
+        passant and the move clocks, which may be left out).
+        """
+        fields = fen.split()
+        board = cls._empty()
+
+        for row, rank in enumerate(fields[0].split('/')):
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                color = 'white' if char.isupper() else 'black'
+                piece = FEN_PIECES[char.lower()](color)
+                piece.moved = True
+                board.squares[row][col].piece = piece
+                if isinstance(piece, King):
+                    board.kings[color] = (row, col)
+                col += 1
+
+        board.next_player = 'white' if len(fields) < 2 or fields[1] == 'w' else 'black'
+        castling = fields[2] if len(fields) > 2 else '-'
+        rights = sum(bit for bit, char in FEN_CASTLING if char in castling)
+        en_passant = Square.ALPHACOLS_INV[fields[3][0]] if len(fields) > 3 and fields[3] != '-' else None
+        board.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        board.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        board._set_state(rights, en_passant)
+        return board
+
+    def to_fen(self, normalize=False):
+        """
+        FEN string of the position, move clocks included. The en passant
+        square follows any double pawn push, as from_fen was given it, or
+        with normalize only when a pawn can take (as the key and pack do).
+        """
+        ranks = []
+        for row in self.squares:
+            rank = ''
+            empty = 0
+            for square in row:
+                piece = square.piece
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                letter = 'n' if piece.name == 'knight' else piece.name[0]
+                rank += letter.upper() if piece.color == 'white' else letter
+            ranks.append(rank + str(empty) if empty else rank)
+
+        rights = castling_rights(self)
+        castling = ''.join(char for bit, char in FEN_CASTLING if rights & bit) or '-'
+        if normalize:
+            skipped = self.en_passant
+        elif self.last_move is None:
+            skipped = self.en_passant_target
+        else:
+            skipped = self._skipped()
+        en_passant = f'{skipped.alphacol}{ROWS - skipped.row}' if skipped else '-'
+        return f'{"/".join(ranks)} {self.next_player[0]} {castling} {en_passant} ' \
+               f'{self.halfmove_clock} {self.fullmove_number}'
+
+    def _skipped(self):
+        # square the last move skipped if it was a double pawn push
+        initial, final = self.last_move.initial, self.last_move.final
+        if abs(final.row - initial.row) == 2 and isinstance(self.squares[final.row][final.col].piece, Pawn):
+            return self.squares[(initial.row + final.row) // 2][final.col]
+        return None
+
+    def pack(self):
+        """
+        The position in PACKED_SIZE bytes (see PACKED_CODES), without the clocks.
+        """
+        codes = [0 if square.piece is None else PACKED_CODES[square.piece.color, square.piece.name]
+                 for row in self.squares for square in row]
+        if self.en_passant is not None:
+            # the pawn that made the double step stands just past the skipped square
+            row = self.en_passant.row + (1 if self.next_player == 'white' else -1)
+            codes[row * COLS + self.en_passant.col] = EP_PAWN
+        state = (self.next_player == 'black') | castling_rights(self) << 1
+        return bytes([codes[i] | codes[i + 1] << 4 for i in range(0, 64, 2)] + [state])
+
+    @classmethod
+    def unpack(cls, data):
+        """
+        Board from the bytes pack made (clocks start over at 0 and 1).
+        """
+        board = cls._empty()
+        en_passant = None
+        for sq in range(64):
+            code = data[sq // 2] >> 4 * (sq & 1) & 15
+            if not code:
+                continue
+            row, col = divmod(sq, COLS)
+            if code == EP_PAWN:
+                # a white pawn on the fourth rank, a black one on the fifth
+                color = 'white' if row == 4 else 'black'
+                piece = Pawn(color)
+                en_passant = col
+            else:
+                color = 'white' if code < 8 else 'black'
+                piece = PACKED_PIECES[(code & 7) - 1](color)
+            piece.moved = True
+            board.squares[row][col].piece = piece
+            if isinstance(piece, King):
+                board.kings[color] = (row, col)
+
+        state = data[32]
+        board.next_player = 'black' if state & 1 else 'white'
+        board._set_state(state >> 1 & 15, en_passant)
+        return board
+
+    def _set_state(self, rights, en_passant):
+        """
+        Finish a board whose pieces were just placed: castling rights (a
+        bitmask of zobrist.CASTLING_RIGHTS), the en passant file or None,
+        then the position key and evaluation sums.
+        """
+        # castling rights live in the moved flags of the king and rook
+        for bit, color, row, rook_col in CASTLING_RIGHTS:
+            king = self.squares[row][4].piece
+            rook = self.squares[row][rook_col].piece
+            if rights & bit and isinstance(king, King) and isinstance(rook, Rook):
+                king.moved = False
+                rook.moved = False
+
+        # only kept when a pawn can actually take, like make_move does (to_fen still writes it)
+        if en_passant is not None:
+            row = 2 if self.next_player == 'white' else 5
+            self.en_passant_target = self.squares[row][en_passant]
+            pawn_row = row + (1 if self.next_player == 'white' else -1)
+            for c in (en_passant - 1, en_passant + 1):
+                p = self.squares[pawn_row][c].piece if 0 <= c < COLS else None
+                if isinstance(p, Pawn) and p.color == self.next_player:
+                    self.en_passant = self.squares[row][en_passant]
+
+        self.zobrist = hash_board(self)
+        self.material, self.mg, self.eg, self.phase = totals(self)
+        self.pawns = self.count_pawns()
+
+    def move(self, piece, move):
+        """
+        Play move for the gui and tell the listeners; True if it captured
+        (en passant included).
+        """
+        # console board move update
+        undo = self.make_move(move)
+        self._turn_key = None
+
+        captured = undo.captured is not None
+        for listener in self.listeners:
+            listener(self, move, captured)
+        return captured
 
-    def move(self, piece, move, testing=False):
+    def make_move(self, move):
+        """
+        Play a move on the board and return the UndoInfo that
+        unmake_move needs to take it back.
+        """
+        squares = self.squares
         initial = move.initial
         final = move.final
+        piece = squares[initial.row][initial.col].piece
+        undo = UndoInfo(move, piece, piece.moved, self.en_passant, self.last_move, self.zobrist,
+                        (self.material, self.mg, self.eg, self.phase), (self.halfmove_clock, self.fullmove_number))
+        self.history.append(self.zobrist)
 
-        en_passant_empty = self.squares[final.row][final.col].isempty()
-
-        # console board move update
-        self.squares[initial.row][initial.col].piece = None
-        self.squares[final.row][final.col].piece = piece
+        key = self.zobrist ^ SIDE_KEY
+        if self.en_passant is not None:
+            key ^= EN_PASSANT_KEYS[self.en_passant.col]
+        self.en_passant = None
+        self._attack_info = {}
 
         if isinstance(piece, Pawn):
             # en passant capture
-            diff = final.col - initial.col
-            if diff != 0 and en_passant_empty:
-                # console board move update
-                self.squares[initial.row][initial.col + diff].piece = None
-                self.squares[final.row][final.col].piece = piece
-                if not testing:
-                    sound = Sound(
-                        os.path.join('assets/sounds/capture.wav'))
-                    sound.play()
-            
-            # pawn promotion
-            else:
-                self.check_promotion(piece, final)
+            if final.col != initial.col and squares[final.row][final.col].isempty():
+                undo.captured_row = initial.row
+
+            # double push: remember the skipped square if it can be taken
+            elif abs(final.row - initial.row) == 2:
+                for dc in (-1, 1):
+                    c = initial.col + dc
+                    if 0 <= c < COLS and isinstance(squares[final.row][c].piece, Pawn) \
+                            and squares[final.row][c].piece.color != piece.color:
+                        self.en_passant = squares[initial.row + piece.dir][initial.col]
+                        break
+
+        captured_square = squares[undo.captured_row][undo.captured_col]
+        captured = undo.captured = captured_square.piece
+
+        # castling rights only change when an unmoved king or rook moves or is taken
+        rights = None
+        if (not piece.moved and isinstance(piece, (King, Rook))) or \
+                (isinstance(captured, Rook) and not captured.moved):
+            rights = castling_rights(self)
+
+        from_sq = initial.row * COLS + initial.col
+        to_sq = final.row * COLS + final.col
+        mg_table = PST_MG[piece.color]
+        eg_table = PST_EG[piece.color]
+        mg = self.mg - mg_table[piece.name][from_sq]
+        eg = self.eg - eg_table[piece.name][from_sq]
+
+        if captured is not None:
+            captured_square.piece = None
+            captured_sq = undo.captured_row * COLS + undo.captured_col
+            key ^= PIECE_KEYS[captured.color][captured.name][captured_sq]
+            self.material -= captured.value
+            mg -= PST_MG[captured.color][captured.name][captured_sq]
+            eg -= PST_EG[captured.color][captured.name][captured_sq]
+            self.phase -= PHASE_WEIGHTS[captured.name]
+            if isinstance(captured, Pawn):
+                self.pawns -= 1
+
+        squares[initial.row][initial.col].piece = None
+        squares[final.row][final.col].piece = piece
+        key ^= PIECE_KEYS[piece.color][piece.name][from_sq]
+
+        # pawn promotion
+        if isinstance(piece, Pawn) and (final.row == 0 or final.row == 7):
+            promoted = PROMOTIONS[move.promotion or 'queen'](piece.color)
+            promoted.moved = True
+            squares[final.row][final.col].piece = promoted
+            undo.promoted = promoted
+            key ^= PIECE_KEYS[piece.color][promoted.name][to_sq]
+            self.material += promoted.value - piece.value
+            mg += mg_table[promoted.name][to_sq]
+            eg += eg_table[promoted.name][to_sq]
+            self.phase += PHASE_WEIGHTS[promoted.name]
+            self.pawns -= 1
+        else:
+            key ^= PIECE_KEYS[piece.color][piece.name][to_sq]
+            mg += mg_table[piece.name][to_sq]
+            eg += eg_table[piece.name][to_sq]
 
         # king castling
         if isinstance(piece, King):
-            if self.castling(initial, final) and not testing:
-                diff = final.col - initial.col
-                rook = piece.left_rook if (diff < 0) else piece.right_rook
-                self.move(rook, rook.moves[-1])
+            self.kings[piece.color] = (final.row, final.col)
+            if self.castling(initial, final):
+                rook_col, rook_final = (0, 3) if final.col < initial.col else (7, 5)
+                rook = squares[initial.row][rook_col].piece
+                squares[initial.row][rook_col].piece = None
+                squares[initial.row][rook_final].piece = rook
+                undo.rook = rook
+                undo.rook_moved = rook.moved
+                rook.moved = True
+                rook_from = initial.row * COLS + rook_col
+                rook_to = initial.row * COLS + rook_final
+                rook_keys = PIECE_KEYS[piece.color]['rook']
+                key ^= rook_keys[rook_from] ^ rook_keys[rook_to]
+                mg += mg_table['rook'][rook_to] - mg_table['rook'][rook_from]
+                eg += eg_table['rook'][rook_to] - eg_table['rook'][rook_from]
 
         # move
         piece.moved = True
 
-        # clear valid moves
-        piece.clear_moves()
+        if rights is not None:
+            key ^= CASTLING_KEYS[rights] ^ CASTLING_KEYS[castling_rights(self)]
+        if self.en_passant is not None:
+            key ^= EN_PASSANT_KEYS[self.en_passant.col]
+        self.zobrist = key
+        self.mg = mg
+        self.eg = eg
+
+        # clocks: captures and pawn moves reset the fifty-move count, black's moves end a move
+        self.halfmove_clock = 0 if captured is not None or isinstance(piece, Pawn) else self.halfmove_clock + 1
+        if piece.color == 'black':
+            self.fullmove_number += 1
 
         # set last move
         self.last_move = move
+        self.next_player = 'black' if piece.color == 'white' else 'white'
 
-    def valid_move(self, piece, move):
-        return move in piece.moves
+        return undo
 
-    def check_promotion(self, piece, final):
-        if final.row == 0 or final.row == 7:
-            self.squares[final.row][final.col].piece = Queen(piece.color)
+    def unmake_move(self, undo):
+        """
+        Take back the move recorded in undo, restoring the position
+        exactly as it was before make_move.
+        """
+        squares = self.squares
+        initial = undo.move.initial
+        final = undo.move.final
+        piece = undo.piece
 
-    def castling(self, initial, final):
-        return abs(initial.col - final.col) == 2
+        squares[final.row][final.col].piece = None
+        squares[initial.row][initial.col].piece = piece
+        squares[undo.captured_row][undo.captured_col].piece = undo.captured
 
-    def set_true_en_passant(self, piece):
-        
-        if not isinstance(piece, Pawn):
-            return
+        if undo.rook is not None:
+            rook_col, rook_final = (0, 3) if final.col < initial.col else (7, 5)
+            squares[initial.row][rook_final].piece = None
+            squares[initial.row][rook_col].piece = undo.rook
+            undo.rook.moved = undo.rook_moved
 
+        if isinstance(piece, King):
+            self.kings[piece.color] = (initial.row, initial.col)
+
+        piece.moved = undo.moved
+        self.en_passant = undo.en_passant
+        self.zobrist = undo.zobrist
+        self.material, self.mg, self.eg, self.phase = undo.scores
+        self.halfmove_clock, self.fullmove_number = undo.clocks
+        self.history.pop()
+        if isinstance(undo.captured, Pawn):
+            self.pawns += 1
+        if undo.promoted is not None:
+            self.pawns += 1
+        self._attack_info = {}
+        self.last_move = undo.last_move
+        self.next_player = piece.color
+
+    def legal_moves(self, color=None):
+        """
+        Every legal move for color, the side to move by default.
+        """
+        color = color or self.next_player
+        moves = []
         for row in range(ROWS):
             for col in range(COLS):
-                if isinstance(self.squares[row][col].piece, Pawn):
-                    self.squares[row][col].piece.en_passant = False
-        
-        piece.en_passant = True
+                piece = self.squares[row][col].piece
+                if piece is not None and piece.color == color:
+                    moves.extend(self.calc_moves(piece, row, col, check_safety=True))
+        return moves
 
-    def in_check(self, piece, move):
-        temp_piece = copy.deepcopy(piece)
-        temp_board = copy.deepcopy(self)
-        temp_board.move(temp_piece, move, testing=True)
-        
-        for row in range(ROWS):
-            for col in range(COLS):
-                if temp_board.squares[row][col].has_enemy_piece(piece.color):
-                    p = temp_board.squares[row][col].piece
-                    temp_board.calc_moves(p, row, col, check_safety=False)
-                    for m in p.moves:
-                        if isinstance(m.final.piece, King):
+    def turn_moves(self):
+        """
+        Legal moves of the side to move, generated once a position and
+        shared by the gui, the ai and game end detection. Don't modify the
+        list.
+        """
+        if self._turn_key == self.zobrist:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            self._turn_moves = self.legal_moves()
+            self._turn_key = self.zobrist
+        return self._turn_moves
+
+    def piece_moves(self, row, col):
+        """
+        Legal moves of the piece on (row, col) from turn_moves(). Empty if
+        it isn't that side's turn.
+        """
+        origin = row * COLS + col
+        return [move for move in self.turn_moves() if move.code & 63 == origin]
+
+    def cache_stats(self):
+        """
+        Hits, misses and hit rate of the turn_moves() cache.
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return {'hits': self.cache_hits, 'misses': self.cache_misses,
+                'hit_rate': self.cache_hits / lookups if lookups else 0.0}
+
+    def is_check(self, color=None):
+        """
+        True if the king of color, the side to move by default, is attacked.
+        """
+        color = color or self.next_player
+        row, col = self.kings[color]
+        return self.is_attacked(row, col, color)
+
+    def count_pawns(self):
+        return sum(isinstance(square.piece, Pawn) for row in self.squares for square in row)
+
+    def is_repetition(self, count=3):
+        """
+        True if the current position has occurred count times. Only the
+        keys in history since the last capture or pawn move can match, and
+        only every other one (the same side to move).
+        """
+        key = self.zobrist
+        history = self.history
+        seen = 1
+        for back in range(2, min(self.halfmove_clock, len(history)) + 1, 2):
+            if history[-back] == key:
+                seen += 1
+                if seen >= count:
+                    return True
+        return False
+
+    def insufficient_material(self):
+        """
+        True if neither side can mate: no pawns and at most one knight or
+        bishop on the board (its phase weight is 1, a rook's is 2).
+        """
+        return self.pawns == 0 and self.phase <= 1
+
+    def outcome(self):
+        """
+        How the game ended for the side to move: 'checkmate', 'stalemate',
+        'repetition', 'fifty moves' or 'insufficient material'. None while
+        the game goes on.
+        """
+        if not self.turn_moves():
+            return 'checkmate' if self.is_check() else 'stalemate'
+        if self.is_repetition():
+            return 'repetition'
+        if self.halfmove_clock >= 100:
+            return 'fifty moves'
+        if self.insufficient_material():
+            return 'insufficient material'
+        return None
+
+    def castling(self, initial, final):
+        return abs(initial.col - final.col) == 2
+
+    def is_attacked(self, row, col, color):
+        """
+        True if the square (row, col) is attacked by the enemies of color.
+        """
+        squares = self.squares
+
+        # pawns attack towards the side they move to
+        pawn_row = row - 1 if color == 'white' else row + 1
+        if 0 <= pawn_row < ROWS:
+            for c in (col - 1, col + 1):
+                if 0 <= c < COLS:
+                    p = squares[pawn_row][c].piece
+                    if isinstance(p, Pawn) and p.color != color:
+                        return True
+
+        for offsets, kind in ((KNIGHT_OFFSETS, Knight), (KING_OFFSETS, King)):
+            for dr, dc in offsets:
+                r, c = row + dr, col + dc
+                if 0 <= r < ROWS and 0 <= c < COLS:
+                    p = squares[r][c].piece
+                    if isinstance(p, kind) and p.color != color:
+                        return True
+
+        for directions, kinds in ((DIAGONALS, (Bishop, Queen)), (STRAIGHTS, (Rook, Queen))):
+            for dr, dc in directions:
+                r, c = row + dr, col + dc
+                while 0 <= r < ROWS and 0 <= c < COLS:
+                    p = squares[r][c].piece
+                    if p is not None:
+                        if isinstance(p, kinds) and p.color != color:
                             return True
-        
+                        break
+                    r += dr
+                    c += dc
+
         return False
 
+    def least_attacker(self, row, col, color, removed=()):
+        """
+        (row, col, piece) of color's least valuable piece attacking the
+        square (row, col), or None. Pieces on the removed squares are
+        treated as gone, so sliders behind them (x-rays) count.
+        """
+        squares = self.squares
+        best = None
+
+        pawn_row = row + 1 if color == 'white' else row - 1
+        if 0 <= pawn_row < ROWS:
+            for c in (col - 1, col + 1):
+                if 0 <= c < COLS and (pawn_row, c) not in removed:
+                    p = squares[pawn_row][c].piece
+                    if isinstance(p, Pawn) and p.color == color:
+                        return pawn_row, c, p
+
+        for r, c, p in self._attackers_from(row, col, color, removed):
+            if best is None or abs(p.value) < abs(best[2].value):
+                best = r, c, p
+        return best
+
+    def _attackers_from(self, row, col, color, removed):
+        # knights, kings and sliders of color attacking (row, col)
+        squares = self.squares
+        for offsets, kind in ((KNIGHT_OFFSETS, Knight), (KING_OFFSETS, King)):
+            for dr, dc in offsets:
+                r, c = row + dr, col + dc
+                if 0 <= r < ROWS and 0 <= c < COLS and (r, c) not in removed:
+                    p = squares[r][c].piece
+                    if isinstance(p, kind) and p.color == color:
+                        yield r, c, p
+
+        for directions, kinds in ((DIAGONALS, (Bishop, Queen)), (STRAIGHTS, (Rook, Queen))):
+            for dr, dc in directions:
+                r, c = row + dr, col + dc
+                while 0 <= r < ROWS and 0 <= c < COLS:
+                    p = squares[r][c].piece
+                    if p is not None and (r, c) not in removed:
+                        if isinstance(p, kinds) and p.color == color:
+                            yield r, c, p
+                        break
+                    r += dr
+                    c += dc
+
+    def see(self, move):
+        """
+        Static exchange evaluation: the material move wins, in Piece.value
+        units (pawns), once every capture on its target square has been
+        traded off. Each side recaptures with its least valuable attacker
+        and may stop when going on would lose. Pins are not considered.
+        move is a generated one: en passant is read from its flags.
+        """
+        squares = self.squares
+        initial, final = move.initial, move.final
+        piece = squares[initial.row][initial.col].piece
+        target = squares[final.row][final.col].piece
+        removed = {(initial.row, initial.col)}
+        if move.code & EN_PASSANT:
+            target = squares[initial.row][final.col].piece
+            removed.add((initial.row, final.col))
+
+        gains = [abs(target.value) if target is not None else 0]
+        # value of the piece standing on the target square
+        value = abs(piece.value)
+        if move.promotion:
+            value = PROMOTION_VALUES[move.promotion]
+            gains[0] += value - abs(piece.value)
+
+        side = 'black' if piece.color == 'white' else 'white'
+        while True:
+            attacker = self.least_attacker(final.row, final.col, side, removed)
+            if attacker is None:
+                break
+            r, c, p = attacker
+            other = 'black' if side == 'white' else 'white'
+            # the king can only take last
+            if isinstance(p, King) and self.least_attacker(final.row, final.col, other, removed | {(r, c)}):
+                break
+            gains.append(value - gains[-1])
+            value = abs(p.value)
+            removed.add((r, c))
+            side = other
+
+        # each side picks the better of capturing and standing pat
+        while len(gains) > 1:
+            last = gains.pop()
+            gains[-1] = -max(-gains[-1], last)
+        return gains[0]
+
+    def attack_info(self, color):
+        info = self._attack_info.get(color)
+        if info is None:
+            info = self._attack_info[color] = AttackInfo(self, color)
+        return info
+
+    def in_check(self, piece, move):
+        """
+        True if playing move would leave the king of piece's color attacked.
+        """
+        undo = self.make_move(move)
+        row, col = self.kings[piece.color]
+        check = self.is_attacked(row, col, piece.color)
+        self.unmake_move(undo)
+
+        return check
+
     def calc_moves(self, piece, row, col, check_safety=True):
         """
-        Optimized move calculation for all pieces.
+        Optimized move calculation for all pieces: the list of moves.
         """
+        moves = []
+        origin = row * COLS + col
+
         def is_within_bounds(r, c):
             return 0 <= r < ROWS and 0 <= c < COLS
 
-        def add_move_if_valid(r, c):
+        def is_legal(r, c, move):
+            if isinstance(piece, King):
+                return r * COLS + c not in info.danger
+            # en passant removes two pieces from a line, test it in full
+            if move.code & EN_PASSANT:
+                return not self.in_check(piece, move)
+            return info.allows(row * COLS + col, r * COLS + c)
+
+        def add_move_if_valid(r, c, flags=0):
             if is_within_bounds(r, c):
                 target_square = self.squares[r][c]
                 if target_square.isempty_or_enemy(piece.color):
-                    move = Move(Square(row, col), Square(r, c, target_square.piece))
-                    if not check_safety or not self.in_check(piece, move):
-                        piece.add_move(move)
+                    # packed: from, to and flags (see move.py)
+                    code = origin | (r * COLS + c) << 6 | flags
+                    if target_square.piece is not None:
+                        code |= CAPTURE
+                    move = Move.from_code(code)
+                    if check_safety and not is_legal(r, c, move):
+                        return
+                    if isinstance(piece, Pawn) and (r == 0 or r == 7):
+                        moves.extend(Move.from_code(code | PROMOTION_CODES[name] << 12) for name in PROMOTIONS)
+                    else:
+                        moves.append(move)
 
         def generate_straightline_moves(directions):
             for dr, dc in directions:
@@ -127,45 +820,51 @@ class Board:
                     else:
                         break
 
-        piece.clear_moves()
+        info = self.attack_info(piece.color) if check_safety else None
 
         if isinstance(piece, Pawn):
             direction = piece.dir
+            start_row = 6 if piece.color == 'white' else 1
             if is_within_bounds(row + direction, col) and self.squares[row + direction][col].isempty():
                 add_move_if_valid(row + direction, col)
-                if not piece.moved and is_within_bounds(row + 2 * direction, col) and self.squares[row + 2 * direction][col].isempty():
+                if row == start_row and self.squares[row + 2 * direction][col].isempty():
                     add_move_if_valid(row + 2 * direction, col)
             for dc in [-1, 1]:
-                if is_within_bounds(row + direction, col + dc) and self.squares[row + direction][col + dc].has_enemy_piece(piece.color):
-                    add_move_if_valid(row + direction, col + dc)
+                if is_within_bounds(row + direction, col + dc):
+                    if self.squares[row + direction][col + dc].has_enemy_piece(piece.color):
+                        add_move_if_valid(row + direction, col + dc)
+                    # en passant capture onto the square the enemy pawn skipped
+                    elif self.squares[row + direction][col + dc] is self.en_passant and \
+                            self.en_passant.row == (2 if piece.color == 'white' else 5):
+                        add_move_if_valid(row + direction, col + dc, CAPTURE | EN_PASSANT)
 
         elif isinstance(piece, Knight):
-            knight_moves = [
-                (row - 2, col + 1), (row - 2, col - 1), (row + 2, col + 1), (row + 2, col - 1),
-                (row - 1, col + 2), (row - 1, col - 2), (row + 1, col + 2), (row + 1, col - 2)
-            ]
-            for r, c in knight_moves:
-                add_move_if_valid(r, c)
+            for dr, dc in KNIGHT_OFFSETS:
+                add_move_if_valid(row + dr, col + dc)
 
         elif isinstance(piece, Bishop):
-            generate_straightline_moves([(-1, -1), (-1, 1), (1, -1), (1, 1)])
+            generate_straightline_moves(DIAGONALS)
 
         elif isinstance(piece, Rook):
-            generate_straightline_moves([(-1, 0), (1, 0), (0, -1), (0, 1)])
+            generate_straightline_moves(STRAIGHTS)
 
         elif isinstance(piece, Queen):
-            generate_straightline_moves([
-                (-1, -1), (-1, 1), (1, -1), (1, 1),
-                (-1, 0), (1, 0), (0, -1), (0, 1)
-            ])
+            generate_straightline_moves(DIAGONALS + STRAIGHTS)
 
         elif isinstance(piece, King):
-            king_moves = [
-                (row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1),
-                (row - 1, col - 1), (row - 1, col + 1), (row + 1, col - 1), (row + 1, col + 1)
-            ]
-            for r, c in king_moves:
-                add_move_if_valid(r, c)
+            for dr, dc in KING_OFFSETS:
+                add_move_if_valid(row + dr, col + dc)
+
+            # castling: king and rook unmoved, path empty, king never crosses an attacked square
+            if check_safety and not piece.moved and not info.checkers:
+                for rook_col, path, crossed in ((0, (1, 2, 3), 3), (7, (5, 6), 5)):
+                    rook = self.squares[row][rook_col].piece
+                    if isinstance(rook, Rook) and rook.color == piece.color and not rook.moved \
+                            and all(self.squares[row][c].isempty() for c in path) \
+                            and row * COLS + crossed not in info.danger:
+                        add_move_if_valid(row, col + (2 if rook_col == 7 else -2))
+
+        return moves
 
     def _create(self):
         for row in range(ROWS):
@@ -196,3 +895,4 @@ class Board:
 
         # king
         self.squares[row_other][4] = Square(row_other, 4, King(color))
+        self.kings[color] = (row_other, 4)
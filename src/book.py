@@ -0,0 +1,192 @@
+"""
+Opening book: a sorted file of 16-byte Polyglot-layout records
+
+    key (8 bytes) | move (2) | weight (2) | learn (4), big-endian
+
+read through mmap and binary-searched, so opening even a large book costs
+no load time or memory. Keys are Board.zobrist rather than the Polyglot
+random table, so books are built with this module (from PGN) rather than
+downloaded.
+
+    python -m book build games.pgn --output book.bin --plies 20
+    python -m book probe --book book.bin --fen "<fen>"
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from collections import defaultdict
+
+from const import *
+from square import Square
+from move import Move, PROMOTION_CODES, PROMOTION_NAMES
+from piece import King
+
+ENTRY = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+
+def encode_move(board, move):
+    """
+    Polyglot move bits: to file 0-2, to rank 3-5, from file 6-8, from rank
+    9-11, promotion 12-14. Castling is written as the king taking its rook.
+    """
+    to_col = move.final.col
+    piece = board.squares[move.initial.row][move.initial.col].piece
+    if isinstance(piece, King) and abs(to_col - move.initial.col) == 2:
+        to_col = 7 if to_col == 6 else 0
+    code = to_col | (ROWS - 1 - move.final.row) << 3 | move.initial.col << 6 | (ROWS - 1 - move.initial.row) << 9
+    if move.promotion:
+        code |= PROMOTION_CODES[move.promotion] << 12
+    return code
+
+def decode_move(board, code):
+    """
+    Move on board for a Polyglot move code (castling back to the king's two-square step).
+    """
+    to_col, to_row = code & 7, ROWS - 1 - ((code >> 3) & 7)
+    from_col, from_row = (code >> 6) & 7, ROWS - 1 - ((code >> 9) & 7)
+    piece = board.squares[from_row][from_col].piece
+    if isinstance(piece, King) and from_col == 4 and to_col in (0, 7) and to_row == from_row:
+        to_col = 6 if to_col == 7 else 2
+    return Move(Square(from_row, from_col), Square(to_row, to_col), PROMOTION_NAMES.get((code >> 12) & 7))
+
+class Book:
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.entries = size // ENTRY.size
+        # an empty file can't be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.entries else None
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def probe(self, key):
+        """
+        (move code, weight) of every record for key, best first.
+        """
+        if self.map is None:
+            return []
+        # lower bound: first record whose key is >= key
+        lo, hi = 0, self.entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if KEY.unpack_from(self.map, mid * ENTRY.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        found = []
+        while lo < self.entries:
+            entry_key, move, weight, learn = ENTRY.unpack_from(self.map, lo * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((move, weight))
+            lo += 1
+        return found
+
+    def moves(self, board):
+        """
+        (Move, weight) of the book moves that are legal on board.
+        """
+        legal = board.legal_moves()
+        found = []
+        for code, weight in self.probe(board.zobrist):
+            move = decode_move(board, code)
+            for candidate in legal:
+                if candidate.initial == move.initial and candidate.final == move.final and \
+                        candidate.promotion == move.promotion:
+                    found.append((candidate, weight))
+                    break
+        return found
+
+    def choose(self, board, rng=random):
+        """
+        A book move picked at random in proportion to its weight, or None.
+        """
+        found = [(move, weight) for move, weight in self.moves(board) if weight > 0]
+        if not found:
+            return None
+        return rng.choices([move for move, weight in found], [weight for move, weight in found])[0]
+
+def build(pgn_paths, output, plies=20, min_games=1):
+    """
+    Write a book from PGN files: every move played in the first plies of a
+    game, weighted 2 for a win and 1 for a draw of the side that played it
+    (losses count only towards min_games, the games a move needs to be kept).
+    Returns the number of records written.
+    """
+    from board import Board, START_FEN
+    from pgn import read_games, parse_san, PGNError
+
+    weights = defaultdict(int)
+    games = defaultdict(int)
+    for path in pgn_paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for tags, sans in read_games(f):
+                result = tags.get('Result', '*')
+                board = Board.from_fen(tags.get('FEN', START_FEN))
+                for san in sans[:plies]:
+                    try:
+                        move = parse_san(board, san)
+                    except PGNError:
+                        break
+                    entry = board.zobrist, encode_move(board, move)
+                    won = '1-0' if board.next_player == 'white' else '0-1'
+                    weights[entry] += 2 if result == won else 1 if result == '1/2-1/2' else 0
+                    games[entry] += 1
+                    board.make_move(move)
+
+    # by key, then heaviest move first
+    records = sorted(((key, move, weight) for (key, move), weight in weights.items()
+                      if weight and games[key, move] >= min_games), key=lambda record: (record[0], -record[2]))
+    # weights are 16-bit: scale down if the most played move overflows
+    top = max((weight for key, move, weight in records), default=0)
+    scale = max(1, -(-top // 0xFFFF))
+    with open(output, 'wb') as f:
+        for key, move, weight in records:
+            f.write(ENTRY.pack(key, move, max(1, weight // scale), 0))
+    return len(records)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='book', description='Build or probe an opening book.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help='build a book from PGN files')
+    build_parser.add_argument('pgn', nargs='+')
+    build_parser.add_argument('--output', default='book.bin')
+    build_parser.add_argument('--plies', type=int, default=20, help='plies of each game to keep (default: 20)')
+    build_parser.add_argument('--min-games', type=int, default=1, help='games a move needs to be kept (default: 1)')
+    probe_parser = commands.add_parser('probe', help='list the book moves of a position')
+    probe_parser.add_argument('--book', default='book.bin')
+    probe_parser.add_argument('--fen')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        count = build(args.pgn, args.output, args.plies, args.min_games)
+        print(f'{count} records written to {args.output}')
+        return 0
+
+    from board import Board, START_FEN
+    board = Board.from_fen(args.fen or START_FEN)
+    with Book(args.book) as book:
+        found = book.moves(board)
+        total = sum(weight for move, weight in found) or 1
+        for move, weight in sorted(found, key=lambda entry: -entry[1]):
+            print(f'{move.uci():<6} {weight:>6}  {weight / total:6.1%}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
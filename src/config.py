@@ -1,7 +1,8 @@
 import pygame
-import os
 
-from sound import Sound
+from const import *
+from square import Square
+from resources import resources
 from theme import Theme
 
 class Config:
@@ -12,15 +13,48 @@ class Config:
         self.idx = 0
         self.theme = self.themes[self.idx]
         self.font = pygame.font.SysFont('monospace', 18, bold=True)
-        self.move_sound = Sound(
-            os.path.join('assets/sounds/move.wav'))
-        self.capture_sound = Sound(
-            os.path.join('assets/sounds/capture.wav'))
+        # board squares and coordinates, rendered once per theme
+        self.backgrounds = {}
+        self.background = self._render_background()
+        self.move_sound = resources.sound('move')
+        self.capture_sound = resources.sound('capture')
 
     def change_theme(self):
         self.idx += 1
         self.idx %= len(self.themes)
         self.theme = self.themes[self.idx]
+        self.background = self._render_background()
+
+    def _render_background(self):
+        background = self.backgrounds.get(self.idx)
+        if background is not None:
+            return background
+
+        theme = self.theme
+        background = pygame.Surface((WIDTH, HEIGHT))
+        for row in range(ROWS):
+            for col in range(COLS):
+                # color
+                color = theme.bg.light if (row + col) % 2 == 0 else theme.bg.dark
+                # rect
+                rect = (col * SQSIZE, row * SQSIZE, SQSIZE, SQSIZE)
+                # blit
+                pygame.draw.rect(background, color, rect)
+
+                # row coordinates
+                if col == 0:
+                    color = theme.bg.dark if row % 2 == 0 else theme.bg.light
+                    lbl = self.font.render(str(ROWS-row), 1, color)
+                    background.blit(lbl, (5, 5 + row * SQSIZE))
+
+                # col coordinates
+                if row == 7:
+                    color = theme.bg.dark if (row + col) % 2 == 0 else theme.bg.light
+                    lbl = self.font.render(Square.get_alphacol(col), 1, color)
+                    background.blit(lbl, (col * SQSIZE + SQSIZE - 20, HEIGHT - 20))
+
+        self.backgrounds[self.idx] = background
+        return background
 
     def _add_themes(self):
         green = Theme((234, 235, 200), (119, 154, 88), (244, 247, 116), (172, 195, 51), '#C86464', '#C84646')
@@ -5,4 +5,13 @@ HEIGHT = 800
 # Board dimensions
 ROWS = 8
 COLS = 8
-SQSIZE = WIDTH // COLS
\ No newline at end of file
+SQSIZE = WIDTH // COLS
+
+# Opening book used by the AI when the file exists (build it with python -m book build)
+BOOK_PATH = 'assets/book.bin'
+
+# Endgame tablebases used by the AI when the folder exists (python -m tablebase generate)
+TABLEBASE_PATH = 'assets/tablebases'
+
+# Frame cap of the game loops (they sleep on the event queue when nothing moves on its own)
+FPS = 60
@@ -1,11 +1,14 @@
 import pygame
 
 from const import *
+from resources import resources
 
 class Dragger:
 
     def __init__(self):
         self.piece = None
+        # legal moves of the dragged piece, highlighted and checked on release
+        self.moves = []
         self.dragging = False
         self.mouseX = 0
         self.mouseY = 0
@@ -15,16 +18,13 @@ class Dragger:
     # blit method
 
     def update_blit(self, surface):
-        # texture
-        self.piece.set_texture(size=128)
-        texture = self.piece.texture
         # img
-        img = pygame.image.load(texture)
+        img = resources.piece_image(self.piece, size=128)
         # rect
         img_center = (self.mouseX, self.mouseY)
-        self.piece.texture_rect = img.get_rect(center=img_center)
+        rect = img.get_rect(center=img_center)
         # blit
-        surface.blit(img, self.piece.texture_rect)
+        surface.blit(img, rect)
 
     # other methods
 
@@ -35,10 +35,15 @@ class Dragger:
         self.initial_row = pos[1] // SQSIZE
         self.initial_col = pos[0] // SQSIZE
 
-    def drag_piece(self, piece):
+    def drag_piece(self, piece, moves):
         self.piece = piece
+        self.moves = moves
         self.dragging = True
 
     def undrag_piece(self):
         self.piece = None
-        self.dragging = False
\ No newline at end of file
+        self.moves = []
+        self.dragging = False
+
+    def valid_move(self, move):
+        return move in self.moves
\ No newline at end of file
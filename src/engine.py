@@ -0,0 +1,110 @@
+import multiprocessing
+import pickle
+import queue
+import time
+
+from ai import AIPlayer
+
+# extra time past the search budget before the worker is told to stop
+GRACE = 0.5
+
+class _Cancelled:
+    """
+    Stop flag for one job: set once the UI no longer wants that job id.
+    """
+
+    def __init__(self, wanted, job_id):
+        self.wanted = wanted
+        self.job_id = job_id
+
+    def is_set(self):
+        return self.wanted.value != self.job_id
+
+def _run(color, hash_mb, book, tablebase, requests, results, wanted):
+    """
+    Worker process: search every snapshot it's sent until told to quit.
+    """
+    ai = AIPlayer(color, hash_mb=hash_mb, book=book, tablebase=tablebase)
+    while True:
+        job = requests.get()
+        if job is None:
+            break
+        job_id, snapshot, time_limit = job
+        board = pickle.loads(snapshot)
+        result = ai.search(board, time_limit=time_limit, stop=_Cancelled(wanted, job_id))
+        move = result.move.encode() if result.move else None
+        results.put((job_id, move, result.depth, result.score, result.nodes, result.nps))
+
+class EngineWorker:
+    """
+    Runs AIPlayer.search in a separate process so the frame loop never
+    waits on it. start() hands over a snapshot of the board, poll() is
+    called once per frame and returns the encoded best move when it's
+    ready, abort() cancels the running search.
+    """
+
+    def __init__(self, color, time_limit=2.0, hash_mb=16, book=None, tablebase=None):
+        self.color = color
+        self.time_limit = time_limit
+        # spawn, not fork: the parent has SDL state a forked child must not inherit
+        context = multiprocessing.get_context('spawn')
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        # id of the job the UI is waiting for; anything else should stop
+        self.wanted = context.RawValue('i', 0)
+        self.process = context.Process(target=_run, daemon=True,
+                                       args=(color, hash_mb, book, tablebase, self.requests, self.results, self.wanted))
+        self.process.start()
+        self.job_id = 0
+        self.started = None
+        self.last_info = None
+
+    @property
+    def thinking(self):
+        return self.started is not None
+
+    def start(self, board):
+        # pickled here, not by the queue's feeder thread, so later moves on board can't leak in
+        snapshot = pickle.dumps(board)
+        self.job_id += 1
+        self.wanted.value = self.job_id
+        self.requests.put((self.job_id, snapshot, self.time_limit))
+        self.started = time.perf_counter()
+
+    def poll(self):
+        """
+        Encoded best move of the current search if it finished, else None.
+        """
+        if self.started is None:
+            return None
+
+        # hard limit: the search checks its own clock, this covers a stalled one
+        if time.perf_counter() - self.started > self.time_limit + GRACE:
+            self.wanted.value = 0
+
+        try:
+            while True:
+                job_id, move, depth, score, nodes, nps = self.results.get_nowait()
+                if job_id == self.job_id:
+                    self.started = None
+                    self.last_info = {'depth': depth, 'score': score, 'nodes': nodes, 'nps': nps}
+                    return move
+                # result of an aborted job, drop it
+        except queue.Empty:
+            return None
+
+    def abort(self):
+        """
+        Stop the running search and ignore whatever it returns.
+        """
+        if self.started is not None:
+            self.job_id += 1
+            self.wanted.value = self.job_id
+            self.started = None
+
+    def close(self):
+        self.abort()
+        self.requests.put(None)
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,142 @@
+from const import *
+from piece import King
+
+# Static evaluation: material (from Piece.value) plus middlegame and endgame
+# piece-square scores, blended by how much material is left (the phase).
+# Board keeps the sums up to date in make_move, so evaluating a leaf is a
+# few arithmetic operations instead of a scan of the 64 squares.
+
+# piece-square bonuses in centipawns from white's side, row 0 = rank 8
+_PAWN_MG = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+]
+_PAWN_EG = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     20,  20,  20,  20,  20,  20,  20,  20,
+     10,  10,  10,  10,  10,  10,  10,  10,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0,
+]
+_KNIGHT = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+_BISHOP = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+_ROOK_MG = [
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+]
+_ROOK_EG = [0] * 64
+_QUEEN = [
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+]
+_KING_MG = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+]
+_KING_EG = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+]
+
+_TABLES = {
+    'pawn': (_PAWN_MG, _PAWN_EG),
+    'knight': (_KNIGHT, _KNIGHT),
+    'bishop': (_BISHOP, _BISHOP),
+    'rook': (_ROOK_MG, _ROOK_EG),
+    'queen': (_QUEEN, _QUEEN),
+    'king': (_KING_MG, _KING_EG),
+}
+
+def _signed(table, color):
+    # black reads white's table upside down, and scores count against white
+    if color == 'white':
+        return list(table)
+    return [-table[(ROWS - 1 - sq // COLS) * COLS + sq % COLS] for sq in range(64)]
+
+# PST_MG[color][name][sq], PST_EG[color][name][sq]: white-positive centipawns
+PST_MG = {color: {name: _signed(mg, color) for name, (mg, eg) in _TABLES.items()} for color in ('white', 'black')}
+PST_EG = {color: {name: _signed(eg, color) for name, (mg, eg) in _TABLES.items()} for color in ('white', 'black')}
+
+# game phase: 24 with all minor and major pieces on the board, 0 with none
+PHASE_WEIGHTS = {'pawn': 0, 'knight': 1, 'bishop': 1, 'rook': 2, 'queen': 4, 'king': 0}
+MAX_PHASE = 24
+
+def totals(board):
+    """
+    (material, mg, eg, phase) of a position, computed from scratch.
+    Material is the sum of Piece.value without the kings.
+    """
+    material = 0.0
+    mg = eg = phase = 0
+    for row in range(ROWS):
+        for col in range(COLS):
+            piece = board.squares[row][col].piece
+            if piece is None:
+                continue
+            sq = row * COLS + col
+            if not isinstance(piece, King):
+                material += piece.value
+            mg += PST_MG[piece.color][piece.name][sq]
+            eg += PST_EG[piece.color][piece.name][sq]
+            phase += PHASE_WEIGHTS[piece.name]
+    return material, mg, eg, phase
+
+def evaluate(board):
+    """
+    Tapered score in centipawns from the side to move's point of view,
+    read from the totals Board keeps.
+    """
+    phase = min(board.phase, MAX_PHASE)
+    score = round(board.material * 100) + (board.mg * phase + board.eg * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if board.next_player == 'white' else -score
@@ -0,0 +1,80 @@
+"""
+Import-time benchmark: cold-start cost of the rules core, the engine and
+the gui, each imported in a fresh interpreter so nothing is cached in
+sys.modules.
+
+The core (board, piece, square, move) and the engine must not pull in
+pygame; the run fails if they do.
+
+    python -m importbench
+    python -m importbench --runs 20 --group core
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# what each group imports; the gui is the whole game
+GROUPS = {
+    'core': ('board', 'piece', 'square', 'move'),
+    'engine': ('ai', 'engine'),
+    'gui': ('main',),
+}
+
+# groups that have to stay usable without pygame
+HEADLESS = ('core', 'engine')
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{'seconds': time.perf_counter() - start, 'modules': len(sys.modules),
+                   'pygame': 'pygame' in sys.modules}}))
+"""
+
+def measure(modules, runs=10):
+    """
+    Import times in ms of modules over runs fresh interpreters, plus what
+    got loaded. None if the import fails (e.g. pygame isn't installed).
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    probe = _PROBE.format(modules=modules)
+    times = []
+    result = None
+    for _ in range(runs):
+        done = subprocess.run([sys.executable, '-c', probe], cwd=here, env=env, capture_output=True, text=True)
+        if done.returncode != 0:
+            return {'error': done.stderr.strip().splitlines()[-1]}
+        result = json.loads(done.stdout.splitlines()[-1])
+        times.append(result['seconds'] * 1000)
+    return {'min_ms': min(times), 'median_ms': statistics.median(times),
+            'modules': result['modules'], 'pygame': result['pygame']}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='importbench', description='Cold-start import time of the core and the gui.')
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters per group (default: 10)')
+    parser.add_argument('--group', choices=tuple(GROUPS), action='append',
+                        help='group to time, repeatable (default: all)')
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f'{"group":<8} {"min ms":>8} {"median":>8} {"modules":>8}  pygame')
+    for group in args.group or GROUPS:
+        result = measure(GROUPS[group], args.runs)
+        if 'error' in result:
+            print(f'{group:<8} failed: {result["error"]}')
+            failed |= group in HEADLESS
+            continue
+        print(f'{group:<8} {result["min_ms"]:8.1f} {result["median_ms"]:8.1f} {result["modules"]:8}  '
+              f'{"yes" if result["pygame"] else "no"}')
+        if group in HEADLESS and result['pygame']:
+            print(f'{group} imports pygame')
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,27 @@
 import pygame
+import argparse
 import sys
+import os
+import time
 
 from const import *
 from game import Game
 from square import Square
 from move import Move
-from ai import AIPlayer  # Import the AI player class
-import logging
+from engine import EngineWorker
+from resources import resources
+from renderer import Renderer
+from overlay import Overlay
 
 class Main:
 
-    def __init__(self):
+    def __init__(self, fps=FPS):
+        self.fps = fps
         pygame.init()
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption('Chess')
+        # decode every piece image and sound once, now that there's a display to convert to
+        resources.preload()
         self.game = None  # Initialize later depending on the mode
 
     def draw_text(self, text, font, color, x, y, centered=False):
@@ -79,6 +87,33 @@ class Main:
             pygame.display.update()
             clock.tick(60)
 
+    def next_events(self, clock, idle, overlay):
+        """
+        Events for the next frame. Caps the frame rate, and when idle (nothing
+        moves on its own) sleeps until an event arrives instead of redrawing.
+        """
+        events = []
+        if idle:
+            # a shown overlay still refreshes its numbers twice a second
+            events.append(pygame.event.wait(500) if overlay.visible else pygame.event.wait())
+        clock.tick(self.fps)
+        return events + pygame.event.get()
+
+    def game_over(self, board):
+        """
+        Print the result once the game has ended (mate, stalemate or one of
+        the draws); True if it has.
+        """
+        outcome = board.outcome()
+        if outcome == 'checkmate':
+            winner = 'White' if board.next_player == 'black' else 'Black'
+            print(f"Checkmate! {winner} wins!")
+        elif outcome == 'stalemate':
+            print("Stalemate! It's a draw!")
+        elif outcome is not None:
+            print(f"Draw by {outcome}!")
+        return outcome is not None
+
     def mainloop(self):
         # Show the menu and get the selected mode
         mode = self.show_menu()
@@ -88,7 +123,6 @@ class Main:
             self.start_pvp_game()
         elif mode == "ai":
             self.game = Game()  # Initialize the game for AI mode
-            ai = AIPlayer('black')  # AI plays as black
             self.start_ai_game()
 
     def start_pvp_game(self):
@@ -96,19 +130,17 @@ class Main:
         game = self.game
         board = self.game.board
         dragger = self.game.dragger
+        renderer = Renderer(game)
+        overlay = Overlay()
+        clock = pygame.time.Clock()
+        events = []
+        # set once the game has ended; r starts a new one
+        over = False
 
         while True:
-            # Show methods
-            game.show_bg(screen)
-            game.show_last_move(screen)
-            game.show_moves(screen)
-            game.show_pieces(screen)
-            game.show_hover(screen)
+            overlay.start_frame()
 
-            if dragger.dragging:
-                dragger.update_blit(screen)
-
-            for event in pygame.event.get():
+            for event in events:
 
                 # Mouse click
                 if event.type == pygame.MOUSEBUTTONDOWN:
@@ -121,15 +153,9 @@ class Main:
                     if board.squares[clicked_row][clicked_col].has_piece():
                         piece = board.squares[clicked_row][clicked_col].piece
                         # Valid piece (color)?
-                        if piece.color == game.next_player:
-                            board.calc_moves(piece, clicked_row, clicked_col, check_safety=True)
+                        if piece.color == game.next_player and not over:
                             dragger.save_initial(event.pos)
-                            dragger.drag_piece(piece)
-                            # Show methods 
-                            game.show_bg(screen)
-                            game.show_last_move(screen)
-                            game.show_moves(screen)
-                            game.show_pieces(screen)
+                            dragger.drag_piece(piece, board.piece_moves(clicked_row, clicked_col))
 
                 # Mouse motion
                 elif event.type == pygame.MOUSEMOTION:
@@ -140,13 +166,6 @@ class Main:
 
                     if dragger.dragging:
                         dragger.update_mouse(event.pos)
-                        # Show methods
-                        game.show_bg(screen)
-                        game.show_last_move(screen)
-                        game.show_moves(screen)
-                        game.show_pieces(screen)
-                        game.show_hover(screen)
-                        dragger.update_blit(screen)
 
                 # Mouse release
                 elif event.type == pygame.MOUSEBUTTONUP:
@@ -162,21 +181,13 @@ class Main:
                         move = Move(initial, final)
 
                         # Valid move?
-                        if board.valid_move(dragger.piece, move):
-                            # Normal capture
-                            captured = board.squares[released_row][released_col].has_piece()
+                        if dragger.valid_move(move):
+                            # Normal capture (the game plays the sound)
                             board.move(dragger.piece, move)
 
-                            board.set_true_en_passant(dragger.piece)
-
-                            # Sounds
-                            game.play_sound(captured)
-                            # Show methods
-                            game.show_bg(screen)
-                            game.show_last_move(screen)
-                            game.show_pieces(screen)
                             # Next turn
                             game.next_turn()
+                            over = self.game_over(board)
 
                     dragger.undrag_piece()
 
@@ -186,46 +197,81 @@ class Main:
                     if event.key == pygame.K_t:
                         game.change_theme()
 
+                    # Frame-time overlay
+                    if event.key == pygame.K_F3:
+                        overlay.toggle()
+
                     # Resetting the game
                     if event.key == pygame.K_r:
                         game.reset()
                         game = self.game
                         board = self.game.board
                         dragger = self.game.dragger
+                        over = False
 
                 # Quit application
                 elif event.type == pygame.QUIT:
+                    print(f"assets {resources.stats()}")
+                    print(f"move cache {board.cache_stats()}")
                     pygame.quit()
                     sys.exit()
 
-            pygame.display.update()
+            # Show methods (only what changed since the last frame)
+            renderer.draw(screen, overlay)
+            overlay.end_frame()
+
+            # nothing changes between events unless a piece is being dragged
+            events = self.next_events(clock, not dragger.dragging, overlay)
 
     def start_ai_game(self):
         screen = self.screen
         game = self.game
         board = self.game.board
         dragger = self.game.dragger
-        ai = AIPlayer('black')  # Initialize the AI as black
+        engine = EngineWorker('black', time_limit=2.0,  # Searches in its own process, up to 2s a move
+                              book=BOOK_PATH if os.path.exists(BOOK_PATH) else None,
+                              tablebase=TABLEBASE_PATH if os.path.isdir(TABLEBASE_PATH) else None)
 
-        while True:
-            # Render the game elements
-            game.show_bg(screen)
-            game.show_last_move(screen)
-            game.show_moves(screen)
-            game.show_pieces(screen)
-            game.show_hover(screen)
+        renderer = Renderer(game)
+        overlay = Overlay()
+        clock = pygame.time.Clock()
+        events = []
+        # set once the game has ended; r starts a new one
+        over = False
 
-            if dragger.dragging:
-                dragger.update_blit(screen)
+        while True:
+            overlay.start_frame()
 
-            for event in pygame.event.get():
+            for event in events:
                 # Quit the game
                 if event.type == pygame.QUIT:
+                    engine.close()
+                    print(f"assets {resources.stats()}")
+                    print(f"move cache {board.cache_stats()}")
                     pygame.quit()
                     sys.exit()
 
+                # Key press
+                elif event.type == pygame.KEYDOWN:
+                    # Changing themes
+                    if event.key == pygame.K_t:
+                        game.change_theme()
+
+                    # Frame-time overlay
+                    if event.key == pygame.K_F3:
+                        overlay.toggle()
+
+                    # Resetting the game (drops the AI's search)
+                    if event.key == pygame.K_r:
+                        engine.abort()
+                        game.reset()
+                        game = self.game
+                        board = self.game.board
+                        dragger = self.game.dragger
+                        over = False
+
                 # Player's turn
-                if game.next_player == 'white':
+                elif game.next_player == 'white':
                     if event.type == pygame.MOUSEBUTTONDOWN:
                         dragger.update_mouse(event.pos)
                         clicked_row = dragger.mouseY // SQSIZE
@@ -234,10 +280,9 @@ class Main:
                         # Check if clicked square has a piece
                         if board.squares[clicked_row][clicked_col].has_piece():
                             piece = board.squares[clicked_row][clicked_col].piece
-                            if piece.color == 'white':  # Player can only move white pieces
-                                board.calc_moves(piece, clicked_row, clicked_col, check_safety=True)
+                            if piece.color == 'white' and not over:  # Player can only move white pieces
                                 dragger.save_initial(event.pos)
-                                dragger.drag_piece(piece)
+                                dragger.drag_piece(piece, board.piece_moves(clicked_row, clicked_col))
 
                     elif event.type == pygame.MOUSEMOTION:
                         motion_row = event.pos[1] // SQSIZE
@@ -257,51 +302,50 @@ class Main:
                             move = Move(initial, final)
 
                             # Validate and execute the move
-                            if board.valid_move(dragger.piece, move):
-                                captured = board.squares[released_row][released_col].has_piece()
+                            if dragger.valid_move(move):
                                 board.move(dragger.piece, move)
-                                board.set_true_en_passant(dragger.piece)
-                                game.play_sound(captured)
                                 game.next_turn()  # Switch to AI's turn
+                                over = self.game_over(board)
 
                         dragger.undrag_piece()
 
-            # AI's turn
-                elif game.next_player == 'black':
-                    # Get all possible moves for AI
-                    all_moves = ai.get_all_moves(board)
-
-                    # Check for checkmate or stalemate
-                    if not all_moves:
-                        if board.in_check(board.get_king('black'), None):  # Check if Black is in check
-                            print("Checkmate! White wins!")
-                        else:
-                            print("Stalemate! It's a draw!")
-                        pygame.quit()
-                        sys.exit()
-
-                    # Select the best move
-                    best_move = ai.get_best_move(all_moves)
-
-                    if best_move:
-                        initial = best_move.initial
-                        final = best_move.final
-                        piece = board.squares[initial.row][initial.col].piece
-
-                        # Execute the move
-                        board.move(piece, best_move)
-                        board.set_true_en_passant(piece)
-                        game.play_sound(captured=final.has_piece())
-                        game.next_turn()  # Switch to player's turn
-
-            pygame.display.update()
-
-
-
-
-
-
-
-
-main = Main()
-main.mainloop()
+            # AI's turn: start a search, then poll it once per frame
+            engine_start = time.perf_counter()
+            if game.next_player == 'black' and not over:
+                if not engine.thinking:
+                    # the search runs in the engine's process; only log how many moves it has
+                    print(f"AI (black) possible moves: {len(board.turn_moves())} moves")
+                    engine.start(board)
+
+                code = engine.poll()
+                if code is not None:
+                    # the search ran on a copy, play the same move on this board
+                    best_move = Move.decode(code)
+                    best_move = next(m for m in board.turn_moves() if m == best_move)
+                    print(f"AI (black) {engine.last_info}")
+
+                    initial = best_move.initial
+                    final = best_move.final
+                    piece = board.squares[initial.row][initial.col].piece
+
+                    # Execute the move
+                    board.move(piece, best_move)
+                    game.next_turn()  # Switch to player's turn
+                    over = self.game_over(board)
+            overlay.add('engine', time.perf_counter() - engine_start)
+
+            # Render the game elements (only what changed since the last frame)
+            renderer.draw(screen, overlay)
+            overlay.end_frame()
+
+            # idle while it's the player's move (or the game is over) and nothing is being dragged
+            idle = (over or game.next_player == 'white') and not dragger.dragging and not engine.thinking
+            events = self.next_events(clock, idle, overlay)
+
+# guarded: the engine's worker process re-imports this module when it spawns
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Chess')
+    parser.add_argument('--fps', type=int, default=FPS, help=f'frame cap (default: {FPS})')
+    args = parser.parse_args()
+    main = Main(fps=args.fps)
+    main.mainloop()
@@ -1,16 +1,88 @@
+from square import Square, SQUARES
+
+# promotion piece <-> the 3-bit code used in packed moves
+PROMOTION_CODES = {'knight': 1, 'bishop': 2, 'rook': 3, 'queen': 4}
+PROMOTION_NAMES = {code: name for name, code in PROMOTION_CODES.items()}
+
+# flags the move generator sets in bits 15-16 of a move's code, read by the search
+# (moves built by hand, e.g. from a gui drag, have none)
+CAPTURE = 1 << 15
+EN_PASSANT = 1 << 16
 
 class Move:
+    """
+    A move packed into one int: from square (bits 0-5), to square (6-11),
+    both row * 8 + col, promotion (12-14, PROMOTION_CODES) and flags.
+    initial and final are the shared Square of each end.
+    """
+
+    __slots__ = ('code',)
+
+    def __init__(self, initial, final, promotion=None, flags=0):
+        code = initial.row * 8 + initial.col | (final.row * 8 + final.col) << 6 | flags
+        if promotion:
+            code |= PROMOTION_CODES[promotion] << 12
+        self.code = code
+
+    @classmethod
+    def from_code(cls, code):
+        move = object.__new__(cls)
+        move.code = code
+        return move
+
+    @property
+    def initial(self):
+        return SQUARES[self.code & 63]
+
+    @property
+    def final(self):
+        return SQUARES[self.code >> 6 & 63]
 
-    def __init__(self, initial, final):
-        # initial and final are squares
-        self.initial = initial
-        self.final = final
+    @property
+    def promotion(self):
+        # name of the piece a pawn promotes to ('queen', 'rook', ...)
+        return PROMOTION_NAMES.get(self.code >> 12 & 7)
+
+    @property
+    def flags(self):
+        return self.code & (CAPTURE | EN_PASSANT)
 
     def __str__(self):
         s = ''
         s += f'({self.initial.col}, {self.initial.row})'
         s += f' -> ({self.final.col}, {self.final.row})'
+        if self.promotion:
+            s += f' = {self.promotion}'
+        return s
+
+    def uci(self):
+        """
+        Long algebraic notation as UCI writes it, e.g. 'e2e4' or 'e7e8q'.
+        """
+        s = f'{self.initial.alphacol}{8 - self.initial.row}{self.final.alphacol}{8 - self.final.row}'
+        if self.promotion:
+            s += 'n' if self.promotion == 'knight' else self.promotion[0]
         return s
 
+    def encode(self):
+        """
+        Pack into 16 bits: from square, to square (row * 8 + col) and promotion.
+        """
+        return self.code & 0x7FFF
+
+    @staticmethod
+    def decode(code):
+        return Move.from_code(code & 0x7FFF)
+
     def __eq__(self, other):
-        return self.initial == other.initial and self.final == other.final
\ No newline at end of file
+        # a move without a promotion choice (e.g. a drag in the gui)
+        # matches any of the generated promotions
+        a, b = self.code, other.code
+        if (a ^ b) & 0xFFF:
+            return False
+        a, b = a >> 12 & 7, b >> 12 & 7
+        return not a or not b or a == b
+
+    def __hash__(self):
+        # from and to only, so moves equal through a missing promotion hash alike
+        return self.code & 0xFFF
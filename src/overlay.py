@@ -0,0 +1,74 @@
+import time
+from collections import deque
+
+import pygame
+
+from const import *
+
+# parts of a frame the overlay splits the time into
+SECTIONS = ('bg', 'pieces', 'moves', 'engine')
+
+class Overlay:
+    """
+    Frame-time overlay toggled with F3: fps, frame time percentiles and the
+    time each frame spends per section. Frame time counts the work done in
+    a frame (events, engine poll, drawing), not the time spent waiting for
+    the next one.
+    """
+
+    def __init__(self, frames=240):
+        self.visible = False
+        self.rect = pygame.Rect(WIDTH - 250, 10, 240, 24 + 20 * (2 + len(SECTIONS)))
+        self.font = pygame.font.Font(None, 24)
+        # last frames: start time, busy time and the seconds of each section
+        self.starts = deque(maxlen=frames)
+        self.times = deque(maxlen=frames)
+        self.splits = deque(maxlen=frames)
+        self.start = None
+        self.split = dict.fromkeys(SECTIONS, 0.0)
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def start_frame(self):
+        self.start = time.perf_counter()
+        self.split = dict.fromkeys(SECTIONS, 0.0)
+
+    def end_frame(self):
+        self.starts.append(self.start)
+        self.times.append(time.perf_counter() - self.start)
+        self.splits.append(self.split)
+
+    def add(self, section, seconds):
+        self.split[section] += seconds
+
+    def fps(self):
+        if len(self.starts) < 2:
+            return 0.0
+        return (len(self.starts) - 1) / max(self.starts[-1] - self.starts[0], 1e-9)
+
+    def percentiles(self, points=(50, 95, 99)):
+        """
+        Frame time in ms at each percentile of the last frames.
+        """
+        times = sorted(self.times)
+        if not times:
+            return {point: 0.0 for point in points}
+        return {point: times[min(len(times) - 1, len(times) * point // 100)] * 1000 for point in points}
+
+    def lines(self):
+        p = self.percentiles()
+        lines = [f'{self.fps():5.1f} fps',
+                 f'p50 {p[50]:.1f}  p95 {p[95]:.1f}  p99 {p[99]:.1f} ms']
+        frames = len(self.splits) or 1
+        for section in SECTIONS:
+            total = sum(split[section] for split in self.splits)
+            lines.append(f'{section:<8} {total / frames * 1000:6.2f} ms')
+        return lines
+
+    def blit(self, surface):
+        panel = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        panel.fill((20, 20, 20, 200))
+        for i, line in enumerate(self.lines()):
+            panel.blit(self.font.render(line, True, (240, 240, 240)), (10, 10 + 20 * i))
+        surface.blit(panel, self.rect)
@@ -0,0 +1,214 @@
+"""
+Perft: count the leaf nodes of the legal move tree to a fixed depth.
+
+The counts are known for the reference positions below, so a mismatch
+means the move generator is wrong; the timings track its speed.
+
+    python -m perft --depth 4
+    python -m perft --fen "<fen>" --depth 5 --divide
+    python -m perft --engine bitboard --output perft_results.jsonl
+    python -m perft --depth 5 --hash 64
+    python -m perft --memory
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from board import Board, START_FEN
+from bitboard import BitBoard
+from transposition import TranspositionTable, EXACT
+
+# name, fen, expected node counts for depth 1, 2, 3, ...
+POSITIONS = [
+    ('startpos', START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603, 193690690]),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333, 15833292]),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487, 89941194]),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+def perft(board, depth, table=None):
+    """
+    Leaf nodes below board at depth, through Board.legal_moves and make/unmake.
+    With a TranspositionTable, subtrees already counted are looked up.
+    """
+    if table is not None and depth > 1:
+        entry = table.probe(board.zobrist)
+        if entry is not None and entry[2] == depth:
+            return entry[0]
+
+    moves = board.legal_moves()
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        undo = board.make_move(move)
+        nodes += perft(board, depth - 1, table)
+        board.unmake_move(undo)
+
+    if table is not None and nodes < 1 << 31:
+        table.store(board.zobrist, depth, nodes, EXACT)
+    return nodes
+
+def perft_bitboard(bitboard, depth):
+    moves = bitboard.legal_moves()
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for code in moves:
+        undo = bitboard.make_move(code)
+        nodes += perft_bitboard(bitboard, depth - 1)
+        bitboard.unmake_move(undo)
+    return nodes
+
+def divide(board, depth, table=None):
+    """
+    Node count below each root move, keyed by its UCI string.
+    """
+    counts = {}
+    for move in board.legal_moves():
+        undo = board.make_move(move)
+        counts[move.uci()] = perft(board, depth - 1, table) if depth > 1 else 1
+        board.unmake_move(undo)
+    return counts
+
+def divide_bitboard(bitboard, depth):
+    counts = {}
+    for code in bitboard.legal_moves():
+        uci = bitboard.to_move(code).uci()
+        undo = bitboard.make_move(code)
+        counts[uci] = perft_bitboard(bitboard, depth - 1) if depth > 1 else 1
+        bitboard.unmake_move(undo)
+    return counts
+
+def run(fen, depth, engine='board', split=False, hash_mb=0):
+    """
+    Time one perft run and return its result record.
+    """
+    board = Board.from_fen(fen)
+    table = TranspositionTable(hash_mb) if hash_mb and engine == 'board' else None
+    start = time.perf_counter()
+    if engine == 'bitboard':
+        bitboard = BitBoard.from_board(board)
+        counts = divide_bitboard(bitboard, depth) if split else None
+        nodes = sum(counts.values()) if split else perft_bitboard(bitboard, depth)
+    else:
+        counts = divide(board, depth, table) if split else None
+        nodes = sum(counts.values()) if split else perft(board, depth, table)
+    seconds = time.perf_counter() - start
+
+    return {
+        'fen': fen,
+        'depth': depth,
+        'engine': engine,
+        'nodes': nodes,
+        'seconds': round(seconds, 4),
+        'nps': round(nodes / seconds) if seconds > 0 else None,
+        'divide': counts,
+        'hash_mb': hash_mb if table is not None else 0,
+        'hash_hit_rate': round(table.hit_rate(), 4) if table is not None else None,
+    }
+
+def memory(fen, repeat=20):
+    """
+    Bytes per move generated by Board.legal_moves, measured with
+    tracemalloc: what the returned moves keep alive, and the peak while
+    generating them.
+    """
+    board = Board.from_fen(fen)
+    # the attack info is cached per position; count only the moves
+    board.legal_moves()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [board.legal_moves() for _ in range(repeat)]
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    moves = sum(len(generated) for generated in kept)
+    return {'moves': moves, 'retained': (after - before) / moves, 'peak': (peak - before) / moves}
+
+def board_version():
+    """
+    Short hash of board.py, so results can be compared across its revisions.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'board.py')
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='perft', description='Move generator node counts and speed.')
+    parser.add_argument('--fen', help='position to count (default: the reference suite)')
+    parser.add_argument('--depth', type=int, default=3, help='search depth (default: 3)')
+    parser.add_argument('--divide', action='store_true', help='print the count below each root move')
+    parser.add_argument('--engine', choices=('board', 'bitboard'), default='board')
+    parser.add_argument('--hash', type=int, default=0, metavar='MB',
+                        help='transposition table size for the board engine (default: off)')
+    parser.add_argument('--output', default='perft_results.jsonl',
+                        help='results file, one JSON record appended per run (default: perft_results.jsonl)')
+    parser.add_argument('--memory', action='store_true',
+                        help='print the bytes allocated per generated move instead of counting nodes')
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        for name, fen, expected in ([('custom', args.fen, [])] if args.fen else POSITIONS):
+            result = memory(fen)
+            print(f'{name:<10} {result["moves"]:>6} moves  {result["retained"]:>7.1f} bytes/move kept  '
+                  f'{result["peak"]:>7.1f} bytes/move peak')
+        return 0
+
+    if args.fen:
+        targets = [('custom', args.fen, [])]
+    else:
+        targets = POSITIONS
+
+    results = []
+    failed = False
+    for name, fen, expected in targets:
+        result = run(fen, args.depth, args.engine, args.divide, args.hash)
+        result['name'] = name
+        result['expected'] = expected[args.depth - 1] if args.depth <= len(expected) else None
+        result['ok'] = result['expected'] is None or result['expected'] == result['nodes']
+        failed |= not result['ok']
+        results.append(result)
+
+        if args.divide:
+            for uci, nodes in sorted(result['divide'].items()):
+                print(f'{uci}: {nodes}')
+            print()
+        status = '' if result['expected'] is None else ('ok' if result['ok'] else f'FAIL (expected {result["expected"]})')
+        print(f'{name:<10} depth {args.depth}  nodes {result["nodes"]:>10}  '
+              f'{result["seconds"]:>8.2f}s  {result["nps"] or 0:>9} nps  {status}')
+
+    record = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'board_version': board_version(),
+        'python': platform.python_version(),
+        'engine': args.engine,
+        'depth': args.depth,
+        'total_nodes': sum(r['nodes'] for r in results),
+        'total_seconds': round(sum(r['seconds'] for r in results), 4),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,310 @@
+import argparse
+import mmap
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from const import *
+from square import Square
+from piece import King, Pawn
+
+# PGN reading: games as (tags, SAN moves) and SAN -> Move on a Board
+#
+#     python -m pgn games.pgn --jobs 4 --output positions.bin
+#
+# replays every game through the rules and reports games/sec and the
+# moves that aren't legal; --output keeps every position (Board.pack).
+
+SAN_PIECES = {'N': 'knight', 'B': 'bishop', 'R': 'rook', 'Q': 'queen', 'K': 'king'}
+SAN_PROMOTIONS = {'N': 'knight', 'B': 'bishop', 'R': 'rook', 'Q': 'queen'}
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+# tags written first and in this order (the seven tag roster)
+ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+_COMMENT = re.compile(r'\{[^}]*\}|;[^\n]*')
+# NAGs, move numbers and results between the moves
+_NOISE = re.compile(r'\$\d+|\d+\.(?:\.\.)?|1-0|0-1|1/2-1/2|\*')
+
+class PGNError(Exception):
+    """
+    Raised for a SAN move that doesn't match a legal move.
+    """
+
+def read_games(f):
+    """
+    Yield (tags, sans) for every game in an open PGN file.
+    """
+    for offset, tags, sans in _read((0, line) for line in f):
+        yield tags, sans
+
+def stream_games(path, start=0, end=None):
+    """
+    Yield (offset, tags, sans) for every game of a PGN file that starts in
+    the byte range [start, end), reading a line at a time so the file's
+    size doesn't matter. offset is where the game's first line starts.
+    """
+    def lines(f):
+        offset = start
+        for raw in f:
+            yield offset, raw.decode('utf-8', errors='replace')
+            offset += len(raw)
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        yield from _read(lines(f), end)
+
+def _read(lines, end=None):
+    # lines are (byte offset, text); a game starts at its first tag line after movetext
+    offset = None
+    tags = {}
+    movetext = []
+    for line_offset, line in lines:
+        line = line.strip()
+        if line.startswith('['):
+            if movetext:
+                yield offset, tags, parse_movetext('\n'.join(movetext))
+                tags, movetext, offset = {}, [], None
+            if offset is None:
+                if end is not None and line_offset >= end:
+                    return
+                offset = line_offset
+            match = _TAG.match(line)
+            if match:
+                tags[match.group(1)] = match.group(2)
+        elif line and not line.startswith('%'):
+            if offset is None:
+                if end is not None and line_offset >= end:
+                    return
+                offset = line_offset
+            movetext.append(line)
+    if tags or movetext:
+        yield offset, tags, parse_movetext('\n'.join(movetext))
+
+def shards(path, count):
+    """
+    (start, end) byte ranges that split a PGN file into up to count parts,
+    each starting at a game's [Event tag, for stream_games to read apart.
+    """
+    size = os.path.getsize(path)
+    if not size:
+        return []
+    starts = [0]
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for i in range(1, count):
+            found = data.find(b'\n[Event ', max(size * i // count, starts[-1]))
+            if found < 0:
+                break
+            starts.append(found + 1)
+    return list(zip(starts, starts[1:] + [size]))
+
+def replay(board, sans):
+    """
+    Yield (board, move) for each SAN move, with board still before the
+    move, then play it. The board is updated in place, so copy anything
+    kept past the next step (e.g. board.pack()). Raises PGNError at the
+    first move that isn't legal.
+    """
+    for san in sans:
+        move = parse_san(board, san)
+        yield board, move
+        board.make_move(move)
+
+def parse_movetext(text):
+    """
+    SAN moves of the main line, without comments, variations and numbers.
+    """
+    text = _strip_variations(_COMMENT.sub(' ', text))
+    return _NOISE.sub(' ', text).split()
+
+def _strip_variations(text):
+    out = []
+    level = 0
+    for char in text:
+        if char == '(':
+            level += 1
+        elif char == ')':
+            level = max(0, level - 1)
+        elif not level:
+            out.append(char)
+    return ''.join(out)
+
+def parse_san(board, san):
+    """
+    The legal Move of board's side to move written as san (e.g. 'Nbd7', 'exd8=Q+', 'O-O').
+    """
+    san = san.rstrip('+#!?')
+    moves = board.legal_moves()
+
+    if san.replace('0', 'O') in ('O-O', 'O-O-O'):
+        col = 6 if san.replace('0', 'O') == 'O-O' else 2
+        for move in moves:
+            if isinstance(board.squares[move.initial.row][move.initial.col].piece, King) and \
+                    move.initial.col == 4 and move.final.col == col:
+                return move
+        raise PGNError(f'illegal castling {san}')
+
+    match = _SAN.match(san)
+    if match is None:
+        raise PGNError(f'unreadable move {san}')
+    piece, from_col, from_rank, target, promotion = match.groups()
+    name = SAN_PIECES[piece] if piece else 'pawn'
+    row = ROWS - int(target[1])
+    col = Square.ALPHACOLS_INV[target[0]]
+    promotion = SAN_PROMOTIONS[promotion] if promotion else None
+    if name == 'pawn' and promotion is None and row in (0, ROWS - 1):
+        promotion = 'queen'
+
+    found = None
+    for move in moves:
+        if move.final.row != row or move.final.col != col or move.promotion != promotion:
+            continue
+        if board.squares[move.initial.row][move.initial.col].piece.name != name:
+            continue
+        if from_col and move.initial.alphacol != from_col:
+            continue
+        if from_rank and ROWS - move.initial.row != int(from_rank):
+            continue
+        if found is not None:
+            raise PGNError(f'ambiguous move {san}')
+        found = move
+    if found is None:
+        raise PGNError(f'illegal move {san}')
+    return found
+
+def to_san(board, move):
+    """
+    SAN of a legal move on board, without check marks.
+    """
+    piece = board.squares[move.initial.row][move.initial.col].piece
+    if isinstance(piece, King) and abs(move.final.col - move.initial.col) == 2:
+        return 'O-O' if move.final.col == 6 else 'O-O-O'
+
+    target = f'{move.final.alphacol}{ROWS - move.final.row}'
+    capture = board.squares[move.final.row][move.final.col].has_piece() or \
+        (isinstance(piece, Pawn) and move.final.col != move.initial.col)
+    if isinstance(piece, Pawn):
+        san = f'{move.initial.alphacol}x{target}' if capture else target
+        if move.promotion:
+            san += '=' + ('N' if move.promotion == 'knight' else move.promotion[0].upper())
+        return san
+
+    letter = 'N' if piece.name == 'knight' else piece.name[0].upper()
+    # disambiguate against the other pieces of the kind that reach the target
+    others = [m for m in board.legal_moves() if m.final == move.final and m.initial != move.initial and
+              board.squares[m.initial.row][m.initial.col].piece.name == piece.name]
+    prefix = ''
+    if others:
+        if all(m.initial.col != move.initial.col for m in others):
+            prefix = move.initial.alphacol
+        elif all(m.initial.row != move.initial.row for m in others):
+            prefix = str(ROWS - move.initial.row)
+        else:
+            prefix = f'{move.initial.alphacol}{ROWS - move.initial.row}'
+    return f'{letter}{prefix}{"x" if capture else ""}{target}'
+
+def format_game(tags, sans, black_first=False):
+    """
+    PGN text of a game: the roster tags, then the others, then the moves
+    wrapped at 80 columns and the result (from the Result tag).
+    """
+    result = tags.get('Result', '*')
+    lines = [f'[{name} "{tags.get(name, "?")}"]' for name in ROSTER]
+    lines += [f'[{name} "{value}"]' for name, value in tags.items() if name not in ROSTER]
+    lines.append('')
+
+    words = []
+    for ply, san in enumerate(sans, 1 if black_first else 0):
+        if ply % 2 == 0:
+            words.append(f'{ply // 2 + 1}.')
+        elif not words:
+            words.append(f'{ply // 2 + 1}...')
+        words.append(san)
+    words.append(result)
+
+    line = ''
+    for word in words:
+        if line and len(line) + 1 + len(word) > 80:
+            lines.append(line)
+            line = word
+        else:
+            line = f'{line} {word}' if line else word
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+# errors each shard reports in full; the rest are only counted
+MAX_ERRORS = 20
+
+def replay_shard(path, start, end, output=None):
+    """
+    Replay the games of one byte range of a PGN file; with output, write
+    the position before every move there (Board.pack rows). Returns the
+    counts and the first errors as (offset, message).
+    """
+    from board import Board, START_FEN
+
+    games = plies = failed = 0
+    errors = []
+    out = open(output, 'wb') if output else None
+    try:
+        for offset, tags, sans in stream_games(path, start, end):
+            games += 1
+            try:
+                for board, move in replay(Board.from_fen(tags.get('FEN', START_FEN)), sans):
+                    if out is not None:
+                        out.write(board.pack())
+                    plies += 1
+            except (PGNError, ValueError, KeyError, IndexError) as error:
+                failed += 1
+                if len(errors) < MAX_ERRORS:
+                    errors.append((offset, f'{tags.get("White", "?")} - {tags.get("Black", "?")}: {error}'))
+    finally:
+        if out is not None:
+            out.close()
+    return {'games': games, 'plies': plies, 'failed': failed, 'errors': errors}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pgn', description='Replay PGN files through the rules.')
+    parser.add_argument('pgn')
+    parser.add_argument('--jobs', type=int, default=1, help='processes, each replaying a part of the file (default: 1)')
+    parser.add_argument('--output', help='file to write the position before every move to (33 bytes each)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    ranges = shards(args.pgn, args.jobs)
+    outputs = [f'{args.output}.{index}' if args.output else None for index in range(len(ranges))]
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(replay_shard, [args.pgn] * len(ranges), *zip(*ranges), outputs))
+    else:
+        results = [replay_shard(args.pgn, begin, end, output) for (begin, end), output in zip(ranges, outputs)]
+
+    if args.output:
+        # the parts in file order make one positions file
+        with open(args.output, 'wb') as out:
+            for part in outputs:
+                with open(part, 'rb') as f:
+                    while True:
+                        chunk = f.read(1 << 20)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                os.remove(part)
+    seconds = time.perf_counter() - start
+
+    games = sum(result['games'] for result in results)
+    plies = sum(result['plies'] for result in results)
+    failed = sum(result['failed'] for result in results)
+    for result in results:
+        for offset, message in result['errors']:
+            print(f'byte {offset}: {message}')
+    print(f'{games} games, {plies} moves, {failed} with illegal moves in {seconds:.2f}s '
+          f'({games / seconds if seconds else 0:.1f} games/s, {plies / seconds if seconds else 0:.0f} moves/s)')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import time
+
+import pygame
+
+from const import *
+from resources import resources
+
+def _area(rect):
+    return tuple(rect) if rect is not None else None
+
+def _under(rect):
+    """
+    Index of every square rect overlaps.
+    """
+    for row in range(max(0, rect.top // SQSIZE), min(ROWS, rect.bottom // SQSIZE + 1)):
+        for col in range(max(0, rect.left // SQSIZE), min(COLS, rect.right // SQSIZE + 1)):
+            yield row * COLS + col
+
+class Renderer:
+    """
+    Draws the game with dirty rectangles: each frame only the squares whose
+    look changed (piece, last move, hover, move highlights, the area under
+    the dragged piece) are redrawn, and only their rects are pushed to the
+    display. A theme change or a new game redraws everything once. The
+    frame-time overlay, when shown, is drawn on top of everything.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        # look of every square in the last frame, None to redraw everything
+        self.last = None
+        self.theme = None
+        self.drag_rect = None
+        self.overlay_rect = None
+        # seconds spent on each part of the last frame
+        self.times = {'bg': 0.0, 'pieces': 0.0, 'moves': 0.0}
+        self.frames = 0
+        self.squares_drawn = 0
+
+    def invalidate(self):
+        self.last = None
+
+    def _state(self):
+        game = self.game
+        board = game.board
+        dragger = game.dragger
+        last_move = board.last_move
+        traced = {(s.row, s.col) for s in (last_move.initial, last_move.final)} if last_move else ()
+        highlighted = {(m.final.row, m.final.col) for m in dragger.moves} if dragger.dragging else ()
+        hovered = (game.hovered_sqr.row, game.hovered_sqr.col) if game.hovered_sqr else None
+
+        state = []
+        for row in range(ROWS):
+            for col in range(COLS):
+                piece = board.squares[row][col].piece
+                if piece is not None and piece is dragger.piece:
+                    piece = None
+                square = (row, col)
+                state.append((piece, square in traced, square in highlighted, square == hovered))
+        return state
+
+    def _draw_square(self, surface, row, col, look):
+        piece, traced, highlighted, hovered = look
+        theme = self.game.config.theme
+        light = (row + col) % 2 == 0
+        rect = pygame.Rect(col * SQSIZE, row * SQSIZE, SQSIZE, SQSIZE)
+        times = self.times
+
+        start = time.perf_counter()
+        surface.blit(self.game.config.background, rect, rect)
+        now = time.perf_counter()
+        times['bg'] += now - start
+        start = now
+        if traced:
+            pygame.draw.rect(surface, theme.trace.light if light else theme.trace.dark, rect)
+        if highlighted:
+            pygame.draw.rect(surface, theme.moves.light if light else theme.moves.dark, rect)
+        now = time.perf_counter()
+        times['moves'] += now - start
+        start = now
+        if piece is not None:
+            img = resources.piece_image(piece, size=80)
+            surface.blit(img, img.get_rect(center=rect.center))
+        if hovered:
+            pygame.draw.rect(surface, (180, 180, 180), rect, width=3)
+        times['pieces'] += time.perf_counter() - start
+        return rect
+
+    def draw(self, surface, overlay=None):
+        """
+        Bring surface up to date with the game and update the changed parts
+        of the display. The section times go to overlay when one is given.
+        """
+        game = self.game
+        self.times = dict.fromkeys(self.times, 0.0)
+        dragger = game.dragger
+        if game.config.theme is not self.theme:
+            self.theme = game.config.theme
+            self.last = None
+
+        state = self._state()
+        full = self.last is None
+        dirty = {i for i in range(64) if full or state[i] != self.last[i]}
+
+        drag_rect = None
+        if dragger.dragging:
+            drag_rect = resources.piece_image(dragger.piece, size=128).get_rect(center=(dragger.mouseX, dragger.mouseY))
+        rects = []
+        if _area(drag_rect) != _area(self.drag_rect):
+            for rect in (self.drag_rect, drag_rect):
+                if rect is None:
+                    continue
+                rects.append(rect)
+                # squares under the dragged piece, where it was and where it is
+                dirty.update(_under(rect))
+
+        # the overlay changes every frame: repaint what's under it, or what it covered when hidden
+        overlay_rect = overlay.rect if overlay is not None and overlay.visible else None
+        for rect in {_area(self.overlay_rect), _area(overlay_rect)} - {None}:
+            dirty.update(_under(pygame.Rect(rect)))
+
+        for i in dirty:
+            rects.append(self._draw_square(surface, i // COLS, i % COLS, state[i]))
+        if drag_rect is not None and dirty:
+            start = time.perf_counter()
+            dragger.update_blit(surface)
+            self.times['pieces'] += time.perf_counter() - start
+        if overlay is not None:
+            for section, seconds in self.times.items():
+                overlay.add(section, seconds)
+        if overlay_rect is not None:
+            overlay.blit(surface)
+            rects.append(overlay_rect)
+
+        self.last = state
+        self.drag_rect = drag_rect
+        self.overlay_rect = overlay_rect
+        self.frames += 1
+        self.squares_drawn += len(dirty)
+
+        if full:
+            pygame.display.update()
+        elif rects:
+            pygame.display.update(rects)
@@ -0,0 +1,62 @@
+import pygame
+import os
+
+from sound import Sound
+
+class Resources:
+    """
+    Loads each piece image and sound once and hands out the shared copy.
+    Images are keyed by (color, name, size) and converted for fast blits.
+    """
+
+    def __init__(self, root='assets'):
+        self.root = root
+        self.images = {}
+        self.sounds = {}
+        self.hits = 0
+        self.misses = 0
+
+    def image(self, color, name, size=80):
+        key = (color, name, size)
+        image = self.images.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        image = pygame.image.load(os.path.join(self.root, f'images/imgs-{size}px/{color}_{name}.png'))
+        # convert_alpha needs a display; before one is set the plain image still blits
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+        self.images[key] = image
+        return image
+
+    def piece_image(self, piece, size=80):
+        return self.image(piece.color, piece.name, size)
+
+    def sound(self, name):
+        sound = self.sounds.get(name)
+        if sound is not None:
+            self.hits += 1
+            return sound
+
+        self.misses += 1
+        sound = self.sounds[name] = Sound(os.path.join(self.root, f'sounds/{name}.wav'))
+        return sound
+
+    def preload(self, sizes=(80, 128)):
+        """
+        Load every piece image and sound up front, e.g. behind the menu.
+        """
+        for color in ('white', 'black'):
+            for name in ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king'):
+                for size in sizes:
+                    self.image(color, name, size)
+        for name in ('move', 'capture'):
+            self.sound(name)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'images': len(self.images), 'sounds': len(self.sounds)}
+
+# shared by the whole gui
+resources = Resources()
@@ -1,13 +1,32 @@
 
+FILES = 'abcdefgh'
+
 class Square:
 
-    ALPHACOLS = {0: 'a', 1: 'b', 2: 'c', 3: 'd', 4: 'e', 5: 'f', 6: 'g', 7: 'h'}
+    __slots__ = ('row', 'col', 'piece')
+
+    ALPHACOLS = dict(enumerate(FILES))
+    ALPHACOLS_INV = {alpha: col for col, alpha in enumerate(FILES)}
 
     def __init__(self, row, col, piece=None):
         self.row = row
         self.col = col
         self.piece = piece
-        self.alphacol = self.ALPHACOLS[col]
+
+    @property
+    def alphacol(self):
+        return FILES[self.col]
+
+    @property
+    def index(self):
+        return self.row * 8 + self.col
+
+    @staticmethod
+    def at(index):
+        """
+        The shared, read-only Square of index (row * 8 + col), as moves hand out.
+        """
+        return SQUARES[index]
 
     def __eq__(self, other):
         return self.row == other.row and self.col == other.col
@@ -37,5 +56,26 @@ class Square:
 
     @staticmethod
     def get_alphacol(col):
-        ALPHACOLS = {0: 'a', 1: 'b', 2: 'c', 3: 'd', 4: 'e', 5: 'f', 6: 'g', 7: 'h'}
-        return ALPHACOLS[col]
\ No newline at end of file
+        return FILES[col]
+
+class _MoveSquare(Square):
+    """
+    A Square that never holds a piece and can't be changed: every Move
+    hands out the same ones.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, row, col):
+        object.__setattr__(self, 'row', row)
+        object.__setattr__(self, 'col', col)
+
+    @property
+    def piece(self):
+        return None
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{name} of a move square is read-only')
+
+# one Square per index, shared by every move instead of each building its own
+SQUARES = tuple(_MoveSquare(index // 8, index % 8) for index in range(64))
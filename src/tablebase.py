@@ -0,0 +1,588 @@
+"""
+Endgame tablebases for 3- and 4-man endings.
+
+Each table (e.g. KQvK, KBNvK, KRvKP) is one file holding a byte per
+position and side to move:
+
+    0          draw
+    1..127     side to move mates in that many plies
+    128 + n    side to move gets mated in n plies
+    255        not a position (illegal, or not the canonical form)
+
+Positions are indexed by the squares of their pieces (white king, black
+king, the other white pieces, the other black pieces, base 64). The white
+king is mapped into a1-d1-d4 by the board's symmetries, or onto files a-d
+when there are pawns. Tables are generated by retrograde analysis with the
+rules of Board (no castling, en passant or fifty-move rule), and probed
+through mmap.
+
+    python -m tablebase generate --dir ../assets/tablebases --jobs 4
+    python -m tablebase generate --dir ../assets/tablebases KBNvK KQvKR
+    python -m tablebase probe --dir ../assets/tablebases --fen "<fen>"
+"""
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from const import *
+from square import Square
+from move import Move
+from bitboard import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, bishop_attacks, rook_attacks, queen_attacks
+
+DRAW = 0
+LOSS = 128
+INVALID = 255
+# no capture or promotion out of the table (generation only)
+NONE = 255
+
+MAGIC = b'CTB1'
+HEADER = struct.Struct('<4sI')
+
+ORDER = 'KQRBNP'
+LETTERS = {'king': 'K', 'queen': 'Q', 'rook': 'R', 'bishop': 'B', 'knight': 'N', 'pawn': 'P'}
+NAMES = {letter: name for name, letter in LETTERS.items()}
+PROMOTIONS = 'QRBN'
+COLORS = ('white', 'black')
+# index of each king in Layout.pieces (and so in a placement): the white king first, then the black one
+KING_INDEX = {'white': 0, 'black': 1}
+
+THREE_MEN = ['KQvK', 'KRvK', 'KBvK', 'KNvK', 'KPvK']
+FOUR_MEN = ['KQQvK', 'KQRvK', 'KQBvK', 'KQNvK', 'KQPvK', 'KRRvK', 'KRBvK', 'KRNvK', 'KRPvK',
+            'KBBvK', 'KBNvK', 'KBPvK', 'KNNvK', 'KNPvK', 'KPPvK',
+            'KQvKQ', 'KQvKR', 'KQvKB', 'KQvKN', 'KQvKP', 'KRvKR', 'KRvKB', 'KRvKN', 'KRvKP',
+            'KBvKB', 'KBvKN', 'KBvKP', 'KNvKN', 'KNvKP', 'KPvKP']
+
+def _sorted(letters):
+    return ''.join(sorted(letters, key=ORDER.index))
+
+def signature(white, black):
+    """
+    Table name for the piece letters of each side, stronger side first,
+    and whether the colors had to be swapped to get it.
+    """
+    white, black = _sorted(white), _sorted(black)
+    strength = lambda side: (len(side), [-ORDER.index(letter) for letter in side])
+    if strength(black) > strength(white):
+        return f'{black}v{white}', True
+    return f'{white}v{black}', False
+
+# symmetries of the board as square maps
+def _transform(fn):
+    return [fn(sq // COLS, sq % COLS) for sq in range(64)]
+
+_SYMMETRIES = [_transform(lambda r, c: r * 8 + c), _transform(lambda r, c: r * 8 + 7 - c),
+               _transform(lambda r, c: (7 - r) * 8 + c), _transform(lambda r, c: (7 - r) * 8 + 7 - c),
+               _transform(lambda r, c: c * 8 + r), _transform(lambda r, c: c * 8 + 7 - r),
+               _transform(lambda r, c: (7 - c) * 8 + r), _transform(lambda r, c: (7 - c) * 8 + 7 - r)]
+
+class Layout:
+    """
+    Piece order, symmetries and index of one table.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        white, black = name.split('v')
+        self.pieces = [('white', 'K'), ('black', 'K')] + [('white', l) for l in white[1:]] + \
+                      [('black', l) for l in black[1:]]
+        self.men = len(self.pieces)
+        self.pawns = 'P' in name
+        if self.pawns:
+            # a-d files; mirroring the files is the only symmetry pawns allow
+            self.king_squares = [sq for sq in range(64) if sq % COLS <= 3]
+            symmetries = _SYMMETRIES[:2]
+        else:
+            # a1-d1-d4 triangle; rank index (7 - row) <= col <= 3
+            self.king_squares = [sq for sq in range(64) if 7 - sq // COLS <= sq % COLS <= 3]
+            symmetries = _SYMMETRIES
+        self.king_index = {sq: index for index, sq in enumerate(self.king_squares)}
+        # symmetries taking each white king square into king_squares
+        self.transforms = [[t for t in symmetries if t[sq] in self.king_index] for sq in range(64)]
+        self.size = len(self.king_squares) * 64 ** (self.men - 1)
+        # runs of identical pieces, kept sorted so they index once
+        self.groups = [(start, start + len(list(run))) for start, run in self._runs() if len(list(run)) > 1]
+
+    def _runs(self):
+        start = 2
+        for piece, run in itertools.groupby(self.pieces[2:]):
+            run = list(run)
+            yield start, run
+            start += len(run)
+
+    def index(self, sqs):
+        """
+        Canonical index of the position with the pieces on sqs.
+        """
+        best = None
+        kings = len(self.king_squares)
+        for t in self.transforms[sqs[0]]:
+            mapped = [t[sq] for sq in sqs]
+            for start, end in self.groups:
+                mapped[start:end] = sorted(mapped[start:end])
+            index = self.king_index[mapped[0]]
+            factor = kings
+            for sq in mapped[1:]:
+                index += sq * factor
+                factor *= 64
+            if best is None or index < best:
+                best = index
+        return best
+
+    def squares(self, index):
+        """
+        Squares of the pieces at a canonical index.
+        """
+        kings = len(self.king_squares)
+        sqs = [self.king_squares[index % kings]]
+        index //= kings
+        for i in range(self.men - 1):
+            sqs.append(index % 64)
+            index //= 64
+        return sqs
+
+def _attacks(letter, color, sq, occ):
+    if letter == 'N':
+        return KNIGHT_ATTACKS[sq]
+    if letter == 'K':
+        return KING_ATTACKS[sq]
+    if letter == 'B':
+        return bishop_attacks(occ, sq)
+    if letter == 'R':
+        return rook_attacks(occ, sq)
+    if letter == 'Q':
+        return queen_attacks(occ, sq)
+    return PAWN_ATTACKS[0 if color == 'white' else 1][sq]
+
+def attacked(pieces, sqs, target, by):
+    """
+    True if a piece of color by attacks target (captured pieces have square None).
+    """
+    occ = 0
+    for sq in sqs:
+        if sq is not None:
+            occ |= 1 << sq
+    bit = 1 << target
+    for (color, letter), sq in zip(pieces, sqs):
+        if color == by and sq is not None and _attacks(letter, color, sq, occ) & bit:
+            return True
+    return False
+
+def valid(layout, sqs, side):
+    """
+    True if sqs is a legal placement with side to move.
+    """
+    if len(set(sqs)) != len(sqs):
+        return False
+    for (color, letter), sq in zip(layout.pieces, sqs):
+        if letter == 'P' and sq // COLS in (0, ROWS - 1):
+            return False
+    other = 'black' if side == 'white' else 'white'
+    # the side that just moved can't be in check
+    return not attacked(layout.pieces, sqs, sqs[KING_INDEX[other]], side)
+
+def moves(layout, sqs, side):
+    """
+    Legal moves of side as (piece, to, promotion letter, captured piece index).
+    """
+    pieces = layout.pieces
+    occ = own = 0
+    for (color, letter), sq in zip(pieces, sqs):
+        occ |= 1 << sq
+        if color == side:
+            own |= 1 << sq
+    enemy = occ & ~own
+    at = {sq: i for i, sq in enumerate(sqs)}
+    other = 'black' if side == 'white' else 'white'
+
+    found = []
+    for i, (color, letter) in enumerate(pieces):
+        if color != side:
+            continue
+        frm = sqs[i]
+        if letter == 'P':
+            step = -8 if side == 'white' else 8
+            targets = []
+            if not occ >> (frm + step) & 1:
+                targets.append(frm + step)
+                start_row = 6 if side == 'white' else 1
+                if frm // COLS == start_row and not occ >> (frm + 2 * step) & 1:
+                    targets.append(frm + 2 * step)
+            attacks = _attacks('P', side, frm, occ) & enemy
+            while attacks:
+                b = attacks & -attacks
+                targets.append(b.bit_length() - 1)
+                attacks ^= b
+        else:
+            attacks = _attacks(letter, side, frm, occ) & ~own
+            targets = []
+            while attacks:
+                b = attacks & -attacks
+                targets.append(b.bit_length() - 1)
+                attacks ^= b
+
+        for to in targets:
+            captured = at.get(to)
+            after = list(sqs)
+            after[i] = to
+            if captured is not None:
+                after[captured] = None
+            king = after[KING_INDEX[side]]
+            if attacked(pieces, after, king, other):
+                continue
+            if letter == 'P' and to // COLS in (0, ROWS - 1):
+                for promotion in PROMOTIONS:
+                    found.append((i, to, promotion, captured))
+            else:
+                found.append((i, to, None, captured))
+    return found
+
+def predecessors(layout, sqs, side):
+    """
+    Canonical indices of the positions (other side to move) with a
+    non-capturing, non-promoting move into sqs.
+    """
+    pieces = layout.pieces
+    other = 'black' if side == 'white' else 'white'
+    occ = 0
+    for sq in sqs:
+        occ |= 1 << sq
+
+    found = set()
+    for i, (color, letter) in enumerate(pieces):
+        if color != other:
+            continue
+        to = sqs[i]
+        if letter == 'P':
+            back = 8 if other == 'white' else -8
+            origins = []
+            frm = to + back
+            if 0 <= frm < 64 and not occ >> frm & 1 and 0 < frm // COLS < ROWS - 1:
+                origins.append(frm)
+                double_row = 4 if other == 'white' else 3
+                if to // COLS == double_row and not occ >> (frm + back) & 1:
+                    origins.append(frm + back)
+        else:
+            attacks = _attacks(letter, other, to, occ) & ~occ
+            origins = []
+            while attacks:
+                b = attacks & -attacks
+                origins.append(b.bit_length() - 1)
+                attacks ^= b
+
+        for frm in origins:
+            before = list(sqs)
+            before[i] = frm
+            # side isn't to move there, so it can't be in check
+            if attacked(pieces, before, before[KING_INDEX[side]], other):
+                continue
+            found.add(layout.index(before))
+    return found
+
+def _better(a, b):
+    """
+    The better of two values for the side to move (NONE counts as missing).
+    """
+    if a == NONE:
+        return b
+    if b == NONE:
+        return a
+    def rank(value):
+        if value == DRAW:
+            return 0
+        if value < LOSS:
+            return 1000 - value  # shorter wins first
+        return -1000 + (value - LOSS)  # longer losses first
+    return a if rank(a) >= rank(b) else b
+
+def _negate(value):
+    # value for the side to move of the child -> value for the mover
+    if value == DRAW or value == INVALID:
+        return DRAW
+    if value < LOSS:
+        return LOSS + value + 1
+    return value - LOSS + 1
+
+class Tablebases:
+    """
+    Prober for the tables in a directory, each mapped on first use.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+        self.layouts = {}
+        self.max_men = 0
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                if filename.endswith('.tb'):
+                    name = filename[:-3]
+                    self.tables[name] = None
+                    self.max_men = max(self.max_men, len(name) - 1)
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table[1].close()
+                table[0].close()
+        self.tables = {name: None for name in self.tables}
+
+    def _table(self, name):
+        table = self.tables.get(name)
+        if table is None and name in self.tables:
+            f = open(os.path.join(self.directory, name + '.tb'), 'rb')
+            table = self.tables[name] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return table
+
+    def layout(self, name):
+        layout = self.layouts.get(name)
+        if layout is None:
+            layout = self.layouts[name] = Layout(name)
+        return layout
+
+    def probe_pieces(self, placed, side):
+        """
+        Value byte for side to move with placed = [(color, letter, sq), ...],
+        or None when there is no table for the material.
+        """
+        if len(placed) == 2:
+            return DRAW
+        name, flipped = signature([l for c, l, sq in placed if c == 'white'],
+                                  [l for c, l, sq in placed if c == 'black'])
+        table = self._table(name)
+        if table is None:
+            return None
+        if flipped:
+            # swap the colors and mirror the ranks
+            placed = [('black' if c == 'white' else 'white', l, sq ^ 56) for c, l, sq in placed]
+            side = 'black' if side == 'white' else 'white'
+        layout = self.layout(name)
+        remaining = list(placed)
+        sqs = []
+        for piece in layout.pieces:
+            for j, (c, l, sq) in enumerate(remaining):
+                if (c, l) == piece:
+                    sqs.append(sq)
+                    del remaining[j]
+                    break
+        offset = HEADER.size + (0 if side == 'white' else layout.size) + layout.index(sqs)
+        return table[1][offset]
+
+    def probe(self, board):
+        """
+        (result, plies) for board's side to move: result 1 win, 0 draw,
+        -1 loss, plies to mate; None without a table.
+        """
+        value = self.probe_pieces(_placed(board), board.next_player)
+        if value is None or value == INVALID:
+            return None
+        if value == DRAW:
+            return 0, 0
+        if value < LOSS:
+            return 1, value
+        return -1, value - LOSS
+
+    def best_move(self, board):
+        """
+        (Move, (result, plies)) of the fastest win, a draw or the slowest
+        loss, or None if some position isn't covered by the tables.
+        """
+        if len(_placed(board)) > self.max_men:
+            return None
+        best = best_value = None
+        for move in board.legal_moves():
+            undo = board.make_move(move)
+            try:
+                value = self.probe_pieces(_placed(board), board.next_player)
+            finally:
+                board.unmake_move(undo)
+            if value is None or value == INVALID:
+                return None
+            value = _negate(value)
+            if best_value is None or _better(value, best_value) == value and value != best_value:
+                best, best_value = move, value
+        if best is None:
+            return None
+        if best_value == DRAW:
+            return best, (0, 0)
+        if best_value < LOSS:
+            return best, (1, best_value)
+        return best, (-1, best_value - LOSS)
+
+def _placed(board):
+    placed = []
+    for row in range(ROWS):
+        for col in range(COLS):
+            piece = board.squares[row][col].piece
+            if piece is not None:
+                placed.append((piece.color, LETTERS[piece.name], row * COLS + col))
+    return placed
+
+def children(name):
+    """
+    Tables a position of table name can capture or promote into.
+    """
+    white, black = name.split('v')
+    found = set()
+    for side, own, other in (('white', white, black), ('black', black, white)):
+        for i, letter in enumerate(other):
+            if letter != 'K':
+                rest = other[:i] + other[i + 1:]
+                found.add(signature(own, rest)[0] if side == 'white' else signature(rest, own)[0])
+        for i, letter in enumerate(own):
+            if letter == 'P':
+                for promotion in PROMOTIONS:
+                    changed = own[:i] + promotion + own[i + 1:]
+                    found.add(signature(changed, other)[0] if side == 'white' else signature(other, changed)[0])
+    found.discard('KvK')
+    return found
+
+def generate(name, directory):
+    """
+    Write directory/name.tb by retrograde analysis; the tables it
+    converts into must already be there. Returns (name, seconds, wins, draws, losses).
+    """
+    start = time.perf_counter()
+    layout = Layout(name)
+    probe = Tablebases(directory)
+    pieces = layout.pieces
+    size = layout.size
+    sides = COLORS
+
+    values = [bytearray([INVALID]) * size, bytearray([INVALID]) * size]
+    counts = [bytearray(size), bytearray(size)]
+    converts = [bytearray([NONE]) * size, bytearray([NONE]) * size]
+    # buckets[plies]: positions to settle at that distance, as (side, index, value)
+    buckets = [[] for plies in range(LOSS)]
+
+    kings = len(layout.king_squares)
+    for king in layout.king_squares:
+        for rest in itertools.product(range(64), repeat=layout.men - 1):
+            sqs = [king, *rest]
+            index = layout.king_index[king]
+            factor = kings
+            for sq in rest:
+                index += sq * factor
+                factor *= 64
+            if layout.index(sqs) != index:
+                continue
+            for s, side in enumerate(sides):
+                if not valid(layout, sqs, side):
+                    continue
+                values[s][index] = DRAW
+                found = moves(layout, sqs, side)
+                if not found:
+                    if attacked(pieces, sqs, sqs[s], sides[1 - s]):
+                        buckets[0].append((s, index, LOSS))
+                    continue
+
+                inside = set()
+                best = NONE
+                for i, to, promotion, captured in found:
+                    if captured is None and promotion is None:
+                        after = list(sqs)
+                        after[i] = to
+                        inside.add(layout.index(after))
+                        continue
+                    placed = [(c, promotion if j == i and promotion else l, to if j == i else sq)
+                              for j, ((c, l), sq) in enumerate(zip(pieces, sqs)) if j != captured]
+                    value = probe.probe_pieces(placed, sides[1 - s])
+                    best = _better(best, _negate(DRAW if value is None else value))
+                counts[s][index] = len(inside)
+                converts[s][index] = best
+                if best != NONE and best != DRAW and best < LOSS:
+                    buckets[best].append((s, index, best))
+                elif not inside and best != NONE and best != DRAW:
+                    buckets[best - LOSS].append((s, index, best))
+
+    for plies in range(LOSS - 1):
+        for s, index, value in buckets[plies]:
+            if values[s][index] != DRAW:
+                continue
+            values[s][index] = value
+            o = 1 - s
+            for before in predecessors(layout, layout.squares(index), sides[s]):
+                if values[o][before] != DRAW:
+                    continue
+                if value >= LOSS:
+                    buckets[plies + 1].append((o, before, plies + 1))
+                    continue
+                counts[o][before] -= 1
+                if counts[o][before]:
+                    continue
+                best = converts[o][before]
+                if best == NONE or best >= LOSS:
+                    # every move inside the table loses, and so does every way out
+                    plies_lost = max(plies + 1, best - LOSS if best != NONE else 0)
+                    buckets[plies_lost].append((o, before, LOSS + plies_lost))
+    probe.close()
+
+    path = os.path.join(directory, name + '.tb')
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, size))
+        f.write(values[0])
+        f.write(values[1])
+    os.replace(path + '.tmp', path)
+
+    wins = sum(values[s].count(v) for s in range(2) for v in range(1, LOSS))
+    draws = values[0].count(DRAW) + values[1].count(DRAW)
+    losses = sum(values[s].count(v) for s in range(2) for v in range(LOSS, INVALID))
+    return name, time.perf_counter() - start, wins, draws, losses
+
+def plan(names):
+    """
+    Waves of tables to generate: each only needs tables of earlier waves.
+    """
+    needed = set()
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name not in needed:
+            needed.add(name)
+            stack.extend(children(name))
+    waves = []
+    done = set()
+    while needed - done:
+        wave = sorted(name for name in needed - done if children(name) <= done)
+        waves.append(wave)
+        done.update(wave)
+    return waves
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='tablebase', description='Generate or probe endgame tablebases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate_parser = commands.add_parser('generate', help='generate tables (and the tables they need)')
+    generate_parser.add_argument('tables', nargs='*', help='e.g. KQvK KBNvK (default: every 3-man table)')
+    generate_parser.add_argument('--four', action='store_true', help='also generate every 4-man table')
+    generate_parser.add_argument('--dir', default='tablebases')
+    generate_parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='processes (default: all cores)')
+    probe_parser = commands.add_parser('probe', help='look a position up')
+    probe_parser.add_argument('--dir', default='tablebases')
+    probe_parser.add_argument('--fen', required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == 'probe':
+        from board import Board
+        board = Board.from_fen(args.fen)
+        tablebases = Tablebases(args.dir)
+        print(f'result {tablebases.probe(board)}')
+        best = tablebases.best_move(board)
+        if best is not None:
+            print(f'bestmove {best[0].uci()} {best[1]}')
+        return 0
+
+    names = args.tables or THREE_MEN + (FOUR_MEN if args.four else [])
+    os.makedirs(args.dir, exist_ok=True)
+    with ProcessPoolExecutor(max(1, args.jobs)) as pool:
+        for wave in plan(names):
+            wave = [name for name in wave if not os.path.exists(os.path.join(args.dir, name + '.tb'))]
+            for name, seconds, wins, draws, losses in pool.map(generate, wave, [args.dir] * len(wave)):
+                print(f'{name:<7} {seconds:>9.1f}s  wins {wins:>9}  draws {draws:>9}  losses {losses:>9}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+from array import array
+from multiprocessing import shared_memory
+
+# bound types
+EXACT, LOWER, UPPER = 1, 2, 3
+
+# each entry is two 64-bit words: the full key and the packed data
+ENTRY_BYTES = 16
+
+SCORE_OFFSET = 1 << 31
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of search results keyed by Board.zobrist.
+
+    Every bucket holds two entries: a depth-preferred one that only deeper
+    (or stale) results replace, and an always-replace one that catches the
+    rest. The arrays are allocated once, so memory stays at size_mb no
+    matter how many positions go through it.
+
+    The key word is stored xored with the data word, so an entry torn by
+    two processes writing the same slot of a shared table reads as a miss.
+    """
+
+    def __init__(self, size_mb=16, buffer=None):
+        self.size_mb = size_mb
+        self.buckets = max(1, size_mb * 1024 * 1024 // (2 * ENTRY_BYTES))
+        self.shm = None
+        self.words = None
+        if buffer is None:
+            self.keys = array('Q', bytes(16 * self.buckets))
+            self.data = array('Q', bytes(16 * self.buckets))
+        else:
+            self.words = buffer.cast('Q')
+            self.keys = self.words[:2 * self.buckets]
+            self.data = self.words[2 * self.buckets:4 * self.buckets]
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    @classmethod
+    def shared(cls, size_mb=16, name=None):
+        """
+        Table living in shared memory: created when name is None,
+        attached to the existing block called name otherwise.
+        """
+        buckets = max(1, size_mb * 1024 * 1024 // (2 * ENTRY_BYTES))
+        if name is None:
+            shm = shared_memory.SharedMemory(create=True, size=buckets * 2 * ENTRY_BYTES)
+        else:
+            # attaching from a child process: it shares the creator's resource tracker,
+            # which forgets the block once the creator unlinks it
+            shm = shared_memory.SharedMemory(name=name)
+        table = cls(size_mb, shm.buf)
+        table.shm = shm
+        return table
+
+    def close(self, unlink=False):
+        """
+        Detach from shared memory (and free it when unlink is set).
+        """
+        if self.shm is None:
+            return
+        self.keys.release()
+        self.data.release()
+        self.words.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+        self.shm = None
+
+    @staticmethod
+    def pack(score, bound, depth, move, generation):
+        # bits 0-15 move, 16-23 depth, 24-25 bound, 26-31 generation, 32-63 score
+        return move | depth << 16 | bound << 24 | generation << 26 | (score + SCORE_OFFSET) << 32
+
+    @staticmethod
+    def unpack(data):
+        """
+        (score, bound, depth, move) from a packed data word.
+        """
+        return (data >> 32) - SCORE_OFFSET, (data >> 24) & 3, (data >> 16) & 0xFF, data & 0xFFFF
+
+    def probe(self, key):
+        """
+        (score, bound, depth, move) stored for key, or None.
+        """
+        self.probes += 1
+        index = (key % self.buckets) * 2
+        keys = self.keys
+        data = self.data
+        stored = data[index]
+        if keys[index] ^ stored == key:
+            self.hits += 1
+            return self.unpack(stored)
+        stored = data[index + 1]
+        if keys[index + 1] ^ stored == key:
+            self.hits += 1
+            return self.unpack(stored)
+        return None
+
+    def store(self, key, depth, score, bound, move=0):
+        """
+        Record a result; score must fit in 32 bits, move is a Move.encode() code.
+        """
+        index = (key % self.buckets) * 2
+        keys = self.keys
+        data = self.data
+        depth = min(depth, 0xFF)
+        packed = self.pack(score, bound, depth, move, self.generation)
+
+        stored = data[index]
+        same = keys[index] ^ stored == key
+        if same or depth >= (stored >> 16) & 0xFF or (stored >> 26) & 0x3F != self.generation:
+            # keep the move of a shallower result for the same position
+            if same and not move:
+                packed |= stored & 0xFFFF
+            keys[index] = key ^ packed
+            data[index] = packed
+        else:
+            keys[index + 1] = key ^ packed
+            data[index + 1] = packed
+
+    def new_search(self):
+        """
+        Age the table so results from older searches give way to new ones.
+        """
+        self.generation = (self.generation + 1) & 0x3F
+
+    def clear(self):
+        self.keys[:] = array('Q', bytes(16 * self.buckets))
+        self.data[:] = array('Q', bytes(16 * self.buckets))
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def hashfull(self):
+        """
+        Permille of the first 1000 entries in use, as UCI reports it.
+        """
+        sample = min(1000, len(self.data))
+        return sum(1 for i in range(sample) if self.data[i]) * 1000 // sample
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
@@ -0,0 +1,264 @@
+"""
+UCI front end: runs AIPlayer under any UCI tournament manager or GUI.
+
+    python -m uci
+
+stdin is read on the main thread and every search runs on its own
+thread, so stop, ponderhit and isready are answered while it thinks.
+Supported: uci, isready, ucinewgame, setoption (Hash, Threads, Ponder),
+position startpos/fen ... moves ..., go (wtime, btime, winc, binc,
+movestogo, movetime, depth, nodes, infinite, ponder; a go without
+limits searches like go infinite), stop, ponderhit and quit.
+"""
+import sys
+import threading
+import time
+
+from ai import AIPlayer, MATE, MATE_BOUND
+from board import Board, START_FEN
+
+NAME = 'Chess'
+AUTHOR = 'the Chess authors'
+
+# deepest iteration a search without a depth limit may reach
+MAX_DEPTH = 64
+# seconds kept back from every move for the GUI and the pipe
+MOVE_OVERHEAD = 0.05
+# moves the remaining time is spread over when the GUI doesn't say
+DEFAULT_MOVES_TO_GO = 30
+
+def move_budget(time_left, increment=0, moves_to_go=None):
+    """
+    Seconds to spend on a move with time_left ms on our clock and
+    increment ms added after it.
+    """
+    seconds = (time_left / (moves_to_go or DEFAULT_MOVES_TO_GO) + increment * 3 / 4) / 1000
+    # never more than half of what's left
+    return max(0.01, min(seconds, time_left / 2000) - MOVE_OVERHEAD)
+
+def format_score(score):
+    if score > MATE_BOUND:
+        return f'mate {(MATE - score + 1) // 2}'
+    if score < -MATE_BOUND:
+        return f'mate -{(MATE + score) // 2}'
+    return f'cp {score}'
+
+class _Go:
+    """
+    Stop flag (is_set) and clock of one go command. Pondering and infinite
+    searches run without a deadline and hold their bestmove back until
+    ponderhit or stop releases it.
+    """
+
+    def __init__(self, budget=None, infinite=False, ponder=False):
+        self.budget = budget
+        self.infinite = infinite
+        self.stopped = threading.Event()
+        self.released = threading.Event()
+        self.deadline = None
+        if not (infinite or ponder):
+            self._start_clock()
+            self.released.set()
+
+    def _start_clock(self):
+        if self.budget is not None:
+            self.deadline = time.perf_counter() + self.budget
+
+    def is_set(self):
+        return self.stopped.is_set() or (self.deadline is not None and time.perf_counter() >= self.deadline)
+
+    def ponderhit(self):
+        # the predicted move was played: the search goes on, now on our clock
+        self._start_clock()
+        if not self.infinite:
+            self.released.set()
+
+    def stop(self):
+        self.stopped.set()
+        self.released.set()
+
+class UCI:
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.lock = threading.Lock()
+        self.hash_mb = 16
+        self.threads = 1
+        self.ponder = False
+        self.board = Board()
+        self.ai = None
+        self.go = None
+        self.thread = None
+
+    def send(self, line):
+        # the search thread reports too
+        with self.lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def run(self, lines=sys.stdin):
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.quit()
+
+    def handle(self, line):
+        """
+        Carry out one command; False once told to quit.
+        """
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+
+        if command == 'uci':
+            self.send(f'id name {NAME}')
+            self.send(f'id author {AUTHOR}')
+            self.send('option name Hash type spin default 16 min 1 max 4096')
+            self.send('option name Threads type spin default 1 min 1 max 64')
+            self.send('option name Ponder type check default false')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'ucinewgame':
+            self.wait()
+            if self.ai is not None:
+                self.ai.table.clear()
+        elif command == 'setoption':
+            self.setoption(args)
+        elif command == 'position':
+            self.wait()
+            self.position(args)
+        elif command == 'go':
+            self.wait()
+            self.start(args)
+        elif command == 'stop':
+            self.wait()
+        elif command == 'ponderhit':
+            if self.go is not None:
+                self.go.ponderhit()
+        elif command == 'quit':
+            return False
+        return True
+
+    def setoption(self, args):
+        # setoption name <name...> [value <value...>]
+        if 'name' not in args:
+            return
+        split = args.index('value') if 'value' in args else len(args)
+        name = ' '.join(args[args.index('name') + 1:split]).lower()
+        value = ' '.join(args[split + 1:])
+
+        self.wait()
+        if name == 'hash':
+            self.hash_mb = max(1, int(value))
+        elif name == 'threads':
+            self.threads = max(1, int(value))
+        elif name == 'ponder':
+            self.ponder = value.lower() == 'true'
+            return
+        else:
+            self.send(f'info string unknown option {name}')
+            return
+        # the next go builds an AI with the new table and helpers
+        self.close_ai()
+
+    def position(self, args):
+        if not args:
+            return
+        moves = args.index('moves') if 'moves' in args else len(args)
+        if args[0] == 'fen':
+            board = Board.from_fen(' '.join(args[1:moves]))
+        else:
+            board = Board.from_fen(START_FEN)
+
+        for uci in args[moves + 1:]:
+            move = next((move for move in board.legal_moves() if move.uci() == uci), None)
+            if move is None:
+                self.send(f'info string illegal move {uci}')
+                break
+            board.make_move(move)
+        self.board = board
+
+    def start(self, args):
+        options = {}
+        flags = set()
+        i = 0
+        while i < len(args):
+            if args[i] in ('infinite', 'ponder'):
+                flags.add(args[i])
+                i += 1
+            elif args[i] == 'searchmoves':
+                # not supported: the whole move list is searched
+                break
+            else:
+                if i + 1 < len(args):
+                    options[args[i]] = int(args[i + 1])
+                i += 2
+
+        budget = None
+        if 'movetime' in options:
+            budget = max(0.01, options['movetime'] / 1000 - MOVE_OVERHEAD)
+        else:
+            side = 'w' if self.board.next_player == 'white' else 'b'
+            if f'{side}time' in options:
+                budget = move_budget(options[f'{side}time'], options.get(f'{side}inc', 0), options.get('movestogo'))
+
+        # a bare go has no limit at all: search until stop, like go infinite
+        if budget is None and 'depth' not in options and 'nodes' not in options and 'ponder' not in flags:
+            flags.add('infinite')
+
+        if self.ai is None:
+            self.ai = AIPlayer(self.board.next_player, hash_mb=self.hash_mb, threads=self.threads)
+        self.go = _Go(budget, 'infinite' in flags, 'ponder' in flags)
+        self.thread = threading.Thread(target=self._think, daemon=True,
+                                       args=(self.board, options.get('depth'), options.get('nodes'), self.go))
+        self.thread.start()
+
+    def _think(self, board, depth, nodes, go):
+        start = time.perf_counter()
+        result = None
+        try:
+            result = self.ai.search(board, depth=depth or MAX_DEPTH, nodes=nodes, stop=go,
+                                    on_info=lambda info: self.info(info, start))
+        finally:
+            # the GUI waits for a bestmove whatever happened to the search;
+            # infinite and pondering searches wait for stop or ponderhit before answering
+            go.released.wait()
+            if result is None or result.move is None:
+                self.send('bestmove 0000')
+            elif self.ponder and len(result.pv) > 1:
+                self.send(f'bestmove {result.move.uci()} ponder {result.pv[1].uci()}')
+            else:
+                self.send(f'bestmove {result.move.uci()}')
+
+    def info(self, result, start):
+        seconds = time.perf_counter() - start
+        pv = ' '.join(move.uci() for move in result.pv)
+        self.send(f'info depth {result.depth} score {format_score(result.score)} nodes {result.nodes} '
+                  f'nps {result.nps} time {round(seconds * 1000)} hashfull {self.ai.table.hashfull()} pv {pv}')
+
+    def wait(self):
+        """
+        Stop the running search, if any, and wait for its bestmove.
+        """
+        if self.thread is not None:
+            self.go.stop()
+            self.thread.join()
+            self.thread = None
+            self.go = None
+
+    def close_ai(self):
+        if self.ai is not None:
+            self.ai.close()
+            self.ai = None
+
+    def quit(self):
+        self.wait()
+        self.close_ai()
+
+def main():
+    UCI().run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import random
+
+from const import *
+from piece import King, Rook
+
+# Zobrist keys: one random 64-bit number per (piece, square), side to move,
+# castling rights and en passant file. A position's key is the xor of the
+# numbers for everything in it, so a move updates it with a few xors.
+# Seeded, so every process (and every saved book) agrees on the keys.
+
+_random = random.Random(0x5EED)
+
+def _key():
+    return _random.getrandbits(64)
+
+NAMES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+
+PIECE_KEYS = {color: {name: [_key() for sq in range(64)] for name in NAMES}
+              for color in ('white', 'black')}
+SIDE_KEY = _key()
+# castling rights bitmask (same bits as bitboard.WHITE_KINGSIDE, ...) -> key
+_RIGHT_KEYS = [_key() for right in range(4)]
+CASTLING_KEYS = [0] * 16
+for _rights in range(16):
+    for _right in range(4):
+        if _rights & (1 << _right):
+            CASTLING_KEYS[_rights] ^= _RIGHT_KEYS[_right]
+EN_PASSANT_KEYS = [_key() for col in range(COLS)]
+
+# (bit, color, king row, rook col) for each castling right
+CASTLING_RIGHTS = ((1, 'white', 7, 7), (2, 'white', 7, 0), (4, 'black', 0, 7), (8, 'black', 0, 0))
+
+def castling_rights(board):
+    """
+    Castling rights bitmask read from the moved flags of kings and rooks.
+    """
+    rights = 0
+    squares = board.squares
+    for right, color, row, col in CASTLING_RIGHTS:
+        king = squares[row][4].piece
+        rook = squares[row][col].piece
+        if isinstance(king, King) and not king.moved and king.color == color and \
+                isinstance(rook, Rook) and not rook.moved and rook.color == color:
+            rights |= right
+    return rights
+
+def hash_board(board):
+    """
+    Full key of a position, computed from scratch.
+    """
+    key = 0
+    for row in range(ROWS):
+        for col in range(COLS):
+            piece = board.squares[row][col].piece
+            if piece is not None:
+                key ^= PIECE_KEYS[piece.color][piece.name][row * COLS + col]
+    if board.next_player == 'black':
+        key ^= SIDE_KEY
+    key ^= CASTLING_KEYS[castling_rights(board)]
+    if board.en_passant is not None:
+        key ^= EN_PASSANT_KEYS[board.en_passant.col]
+    return key
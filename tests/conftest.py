@@ -0,0 +1,31 @@
+import os
+import random
+import sys
+
+import pytest
+
+# the modules live flat in src and import each other by bare name, as under python -m
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from board import Board
+from perft import POSITIONS
+
+@pytest.fixture
+def playouts():
+    """
+    playouts(games, plies, seed) yields (board, move) along seeded random
+    games from every perft reference position, board still before move.
+    """
+    def play(games=10, plies=60, seed=1):
+        rng = random.Random(seed)
+        for name, fen, counts in POSITIONS:
+            for _ in range(games):
+                board = Board.from_fen(fen)
+                for _ in range(plies):
+                    moves = board.legal_moves()
+                    if not moves:
+                        break
+                    move = rng.choice(moves)
+                    yield board, move
+                    board.make_move(move)
+    return play
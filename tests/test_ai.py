@@ -0,0 +1,61 @@
+from ai import AIPlayer, MATE, INFINITY
+from board import Board
+
+def player(depth=3):
+    return AIPlayer('white', depth=depth, hash_mb=1)
+
+def play(board, *ucis):
+    for uci in ucis:
+        board.make_move(next(move for move in board.turn_moves() if move.uci() == uci))
+
+def test_mate_in_one():
+    result = player().search(Board.from_fen('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1'), depth=3)
+    assert result.move.uci() == 'a1a8'
+    assert result.score == MATE - 1
+
+def test_iterations_reported_through_on_info():
+    board = Board.from_fen('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+    infos = []
+    move = player().get_best_move(board.turn_moves(), board, on_info=infos.append)
+    assert [info.depth for info in infos] == [1, 2, 3]
+    assert infos[-1].move == move
+
+def test_pv_survives_a_warm_table():
+    # the second search finds every pv node in the table and must still report the whole line
+    board = Board()
+    ai = player()
+    first = ai.search(board, depth=4)
+    second = ai.search(board, depth=4)
+    assert len(first.pv) == len(second.pv) == 4
+    assert second.pv == first.pv
+
+def test_search_leaves_board_unchanged():
+    board = Board.from_fen('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+    fen, key = board.to_fen(), board.zobrist
+    result = player().search(board, depth=2)
+    assert result.move in board.turn_moves()
+    assert result.pv[0] == result.move
+    assert (board.to_fen(), board.zobrist, board.history) == (fen, key, [])
+
+def test_quiescence_sees_the_recapture():
+    # at depth 1 only the quiescence search notices Qxd5 Rxd5
+    board = Board.from_fen('k2r4/8/8/3p4/8/8/3Q4/K7 w - - 0 1')
+    assert player().search(board, depth=1).move.uci() != 'd2d5'
+
+def test_fifty_move_rule_does_not_hide_mate():
+    ai = player()
+    # mated on the hundredth halfmove
+    board = Board.from_fen('R5k1/5ppp/8/8/8/8/8/6K1 b - - 100 80')
+    assert ai._negamax(board, 2, -INFINITY, INFINITY, 1, []) == -MATE + 1
+    # not mated: a draw
+    board = Board.from_fen('6k1/5ppp/8/8/8/8/8/R5K1 b - - 100 80')
+    assert ai._negamax(board, 2, -INFINITY, INFINITY, 1, []) == 0
+
+def test_repetition_scores_as_draw():
+    ai = player()
+    board = Board.from_fen('4k3/8/8/8/8/8/3Q4/4K1N1 w - - 0 1')
+    play(board, 'g1f3', 'e8f8', 'f3g1', 'f8e8')
+    # the position has been seen before: a draw for the search, whatever the material
+    assert ai._negamax(board, 3, -INFINITY, INFINITY, 1, []) == 0
+    # at the root the side that is ahead plays on instead
+    assert ai.search(board, depth=3).score > 500
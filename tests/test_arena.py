@@ -0,0 +1,45 @@
+import pytest
+
+from arena import elo, parse_settings, read_openings, random_openings, play_game
+from board import Board
+
+def test_elo():
+    assert elo(0, 0, 0) == (0.0, 0.0)
+    diff, margin = elo(10, 20, 10)
+    assert diff == pytest.approx(0.0) and margin > 0
+    # 75% is about +191, 25% the same below
+    assert elo(15, 0, 5)[0] == pytest.approx(190.85, abs=0.01)
+    assert elo(5, 0, 15)[0] == pytest.approx(-190.85, abs=0.01)
+    # four times the games, half the margin (about)
+    assert elo(40, 80, 40)[1] == pytest.approx(margin / 2, rel=0.05)
+
+def test_parse_settings():
+    assert parse_settings('depth=3,hash=16,ordering=0') == {'depth': 3, 'hash': 16, 'ordering': 0}
+    assert parse_settings('time=0.5') == {'time': 0.5}
+    with pytest.raises(ValueError):
+        parse_settings('depth=3,speed=2')
+    with pytest.raises(ValueError):
+        parse_settings('hash=16')
+
+def test_read_openings(tmp_path):
+    path = tmp_path / 'openings.epd'
+    path.write_text('# comment\n\n'
+                    'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1\n'
+                    'rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - id "d4";\n')
+    assert read_openings(path) == ['rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1',
+                                   'rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq -']
+
+def test_random_openings():
+    openings = random_openings(20, plies=4, seed=1)
+    assert len(set(openings)) == 20
+    assert openings == random_openings(20, plies=4, seed=1)
+    for fen in openings:
+        board = Board.from_fen(fen)
+        assert board.next_player == 'white' and board.fullmove_number == 3
+        assert board.turn_moves()
+
+def test_play_game():
+    sides = {'white': ('A', {'depth': 1}), 'black': ('B', {'depth': 1})}
+    game = play_game(0, random_openings(1)[0], sides, max_plies=6)
+    assert game['white'] == 'A' and game['result'] == '1/2-1/2'
+    assert '[SetUp "1"]' in game['pgn'] and '[PlyCount "6"]' in game['pgn']
@@ -0,0 +1,26 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import batch
+from board import Board
+from evaluation import evaluate
+
+def test_evaluate_matches_scalar_evaluator():
+    boards = batch.random_positions(200, seed=3)
+    side = [1 if board.next_player == 'white' else -1 for board in boards]
+    scores = batch.evaluate(batch.encode_many(boards), side=side, mobility=False)
+    assert scores.tolist() == [evaluate(board) for board in boards]
+
+def test_planes_score_like_codes():
+    codes = batch.encode_many(batch.random_positions(50, seed=4))
+    assert (batch.evaluate(batch.to_planes(codes)) == batch.evaluate(codes)).all()
+
+def test_pack_unpack_round_trip():
+    boards = batch.random_positions(200, seed=5)
+    packed = batch.pack_many(boards)
+    codes, side, castling, en_passant = batch.unpack(packed)
+    assert (codes == batch.encode_many(boards)).all()
+    assert (batch.pack(codes, side, castling, en_passant) == packed).all()
+    for board, row in zip(boards, packed):
+        assert Board.unpack(row.tobytes()).pack() == board.pack()
@@ -0,0 +1,23 @@
+import pytest
+
+from board import Board
+from bitboard import BitBoard
+from perft import POSITIONS, perft_bitboard
+
+@pytest.mark.parametrize('name, fen, counts', POSITIONS, ids=[name for name, fen, counts in POSITIONS])
+def test_bitboard_perft(name, fen, counts):
+    assert perft_bitboard(BitBoard.from_board(Board.from_fen(fen)), 3) == counts[2]
+
+def test_same_moves_as_board(playouts):
+    for board, move in playouts(games=3):
+        # flags included: the search reads them off either generator's moves
+        moves = BitBoard.from_board(board).moves(board)
+        assert sorted(m.code for m in moves) == sorted(m.code for m in board.legal_moves())
+
+def test_round_trip(playouts):
+    for board, move in playouts(games=3):
+        copy = BitBoard.from_board(board).to_board()
+        # clocks and an en passant square no pawn can take aren't part of a BitBoard
+        assert copy.to_fen(normalize=True).rsplit(' ', 2)[0] == board.to_fen(normalize=True).rsplit(' ', 2)[0]
+        assert copy.zobrist == board.zobrist
+        assert (copy.mg, copy.eg, copy.phase, copy.pawns) == (board.mg, board.eg, board.phase, board.pawns)
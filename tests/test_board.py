@@ -0,0 +1,185 @@
+import pytest
+
+from board import Board, PACKED_SIZE
+from perft import POSITIONS
+from zobrist import hash_board
+from move import Move
+from square import Square
+
+def state(board):
+    # everything make_move changes and unmake_move has to put back
+    return (board.to_fen(), board.zobrist, round(board.material, 6), board.mg, board.eg, board.phase,
+            board.pawns, list(board.history), dict(board.kings), board.last_move,
+            [[square.piece.moved for square in row if square.piece] for row in board.squares])
+
+def test_unmake_restores_everything(playouts):
+    for board, move in playouts():
+        before = state(board)
+        undo = board.make_move(move)
+        board.unmake_move(undo)
+        assert state(board) == before
+
+def test_in_check_leaves_board_unchanged():
+    board = Board.from_fen('4k3/8/8/8/8/8/4r3/4K3 w - - 0 1')
+    king = board.squares[7][4].piece
+    before = state(board)
+    # the rook covers its rank, but not the squares beside the king on the first one
+    assert board.in_check(king, Move(Square(7, 4), Square(6, 3)))
+    assert not board.in_check(king, Move(Square(7, 4), Square(7, 3)))
+    assert not board.in_check(king, Move(Square(7, 4), Square(6, 4)))
+    assert state(board) == before
+
+def test_legal_moves_match_brute_force(playouts):
+    # pseudo-legal moves kept only if they don't leave the king attacked
+    for board, move in playouts(games=3):
+        brute = []
+        for row in board.squares:
+            for square in row:
+                piece = square.piece
+                if piece is not None and piece.color == board.next_player:
+                    for candidate in board.calc_moves(piece, square.row, square.col, check_safety=False):
+                        if not board.in_check(piece, candidate):
+                            brute.append(candidate)
+        # castling is only generated with check_safety; compare everything else
+        legal = [m for m in board.legal_moves() if not (board.squares[m.initial.row][m.initial.col].piece.name == 'king'
+                                                        and abs(m.final.col - m.initial.col) == 2)]
+        assert sorted(m.code for m in brute) == sorted(m.code for m in legal)
+
+def test_incremental_key(playouts):
+    # every board the playouts reach was updated move by move
+    for board, move in playouts():
+        assert board.zobrist == hash_board(board)
+
+def test_key_covers_side_castling_and_en_passant():
+    keys = {Board.from_fen(fen).zobrist for fen in (
+        'r3k2r/8/8/8/4Pp2/8/8/R3K2R b KQkq e3 0 1',
+        'r3k2r/8/8/8/4Pp2/8/8/R3K2R b KQkq - 0 1',
+        'r3k2r/8/8/8/4Pp2/8/8/R3K2R w KQkq - 0 1',
+        'r3k2r/8/8/8/4Pp2/8/8/R3K2R b Kkq e3 0 1',
+        'r3k2r/8/8/8/4Pp2/8/8/R3K2R b - e3 0 1')}
+    assert len(keys) == 5
+
+@pytest.mark.parametrize('fen, uci, gain', [
+    ('k7/8/8/3n4/4P3/8/8/K7 w - - 0 1', 'e4d5', 3),                     # free knight
+    ('1k6/8/2p5/3p4/8/8/8/K2R4 w - - 0 1', 'd1d5', -4),                  # rook for a defended pawn
+    ('1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1', 'e1e5', 1),      # undefended pawn
+    ('1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1', 'd3e5', -2),  # x-rays on both sides
+    ('k2r4/8/8/3p4/8/8/3Q4/K2R4 w - - 0 1', 'd2d5', -3),                 # queen lost, rook won back
+    ('8/8/4k3/3p4/8/8/8/K2Q4 w - - 0 1', 'd1d5', -8),                    # the king takes the queen
+    ('8/8/4k3/3p4/8/8/3Q4/K2R4 w - - 0 1', 'd2d5', 1),                   # ...but not a defended one
+    ('k7/8/8/3pP3/8/8/8/K7 w - d6 0 1', 'e5d6', 1),                      # en passant
+    ('k7/4P3/8/8/8/8/8/K7 w - - 0 1', 'e7e8q', 8),                       # promotion
+])
+def test_see(fen, uci, gain):
+    board = Board.from_fen(fen)
+    move = next(move for move in board.legal_moves() if move.uci() == uci)
+    assert board.see(move) == pytest.approx(gain, abs=0.01)
+
+def test_fen_round_trip(playouts):
+    for name, fen, counts in POSITIONS:
+        assert Board.from_fen(fen).to_fen() == fen
+    for board, move in playouts(games=3):
+        fen = board.to_fen()
+        copy = Board.from_fen(fen)
+        assert copy.to_fen() == fen
+        assert copy.zobrist == board.zobrist
+
+def test_en_passant_square_kept_as_given():
+    # no black pawn can take on e3: the key and pack leave it out, the FEN keeps it
+    fen = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'
+    board = Board.from_fen(fen)
+    plain = Board.from_fen(fen.replace(' e3 ', ' - '))
+    assert board.to_fen() == fen
+    assert board.to_fen(normalize=True) == plain.to_fen()
+    assert (board.zobrist, board.pack(), board.en_passant) == (plain.zobrist, plain.pack(), None)
+
+    # the same after playing e4, and after taking it back
+    board = Board()
+    undo = board.make_move(next(move for move in board.turn_moves() if move.uci() == 'e2e4'))
+    assert (board.to_fen(), board.to_fen(normalize=True), board.zobrist) == (fen, plain.to_fen(), plain.zobrist)
+    board.unmake_move(undo)
+    assert ' - ' in board.to_fen()
+
+    # a pawn that can take keeps it either way
+    fen = 'rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1'
+    board = Board.from_fen(fen)
+    assert board.to_fen() == board.to_fen(normalize=True) == fen
+    assert board.en_passant is not None
+
+def test_pack_round_trip(playouts):
+    for board, move in playouts(games=3):
+        data = board.pack()
+        assert len(data) == PACKED_SIZE
+        copy = Board.unpack(data)
+        # pack leaves the clocks and an en passant square no pawn can take out
+        assert copy.to_fen().rsplit(' ', 2)[0] == board.to_fen(normalize=True).rsplit(' ', 2)[0]
+        assert copy.zobrist == board.zobrist
+
+def play(board, *ucis):
+    for uci in ucis:
+        board.make_move(next(move for move in board.turn_moves() if move.uci() == uci))
+
+def test_turn_moves_cache():
+    board = Board()
+    moves = board.turn_moves()
+    assert board.turn_moves() is moves
+    assert board.cache_stats()['hits'] == 1
+    assert [move.uci() for move in board.piece_moves(6, 4)] == ['e2e3', 'e2e4']
+    assert board.piece_moves(1, 4) == []
+    assert board.cache_stats() == {'hits': 3, 'misses': 1, 'hit_rate': 0.75}
+
+    # one position is cached: after a move and its undo the list is made again
+    undo = board.make_move(moves[0])
+    assert board.turn_moves() is not moves
+    board.unmake_move(undo)
+    assert [move.code for move in board.turn_moves()] == [move.code for move in moves]
+
+    board.move(board.squares[6][4].piece, moves[0])
+    assert board.turn_moves() is not moves
+
+def test_checkmate_and_stalemate():
+    board = Board()
+    play(board, 'f2f3', 'e7e5', 'g2g4', 'd8h4')
+    assert board.is_check() and not board.is_check('black')
+    assert board.outcome() == 'checkmate'
+    assert Board.from_fen('7k/5Q2/6K1/8/8/8/8/8 b - - 0 1').outcome() == 'stalemate'
+    assert Board().outcome() is None
+
+def test_threefold_repetition():
+    board = Board()
+    shuffle = ('g1f3', 'g8f6', 'f3g1', 'f6g8')
+    play(board, *shuffle)
+    assert board.is_repetition(2) and not board.is_repetition()
+    play(board, *shuffle)
+    assert board.outcome() == 'repetition'
+    # nothing before a pawn move can come back
+    play(board, 'e2e4')
+    assert not board.is_repetition(2)
+
+def test_fifty_moves():
+    board = Board.from_fen('8/8/8/4k3/8/8/4K3/4R3 w - - 99 80')
+    assert board.outcome() is None
+    play(board, 'e2d3')
+    assert board.outcome() == 'fifty moves'
+    # a mate on the hundredth halfmove is still a mate
+    board = Board.from_fen('6k1/5ppp/8/8/8/8/8/R5K1 w - - 99 80')
+    play(board, 'a1a8')
+    assert board.outcome() == 'checkmate'
+
+@pytest.mark.parametrize('fen, insufficient', [
+    ('8/8/8/3k4/8/8/4K3/8 w - - 0 1', True),
+    ('8/8/8/3k4/8/8/3NK3/8 w - - 0 1', True),
+    ('8/8/8/3k4/8/8/3BK3/8 w - - 0 1', True),
+    ('8/8/8/3k4/8/8/3RK3/8 w - - 0 1', False),
+    ('8/8/8/3k4/8/8/3PK3/8 w - - 0 1', False),
+    ('8/8/8/3k4/8/3n4/3NK3/8 w - - 0 1', False),
+])
+def test_insufficient_material(fen, insufficient):
+    assert Board.from_fen(fen).insufficient_material() == insufficient
+
+def test_pawn_count_through_promotion():
+    board = Board.from_fen('3r4/4P3/8/8/8/k7/8/K7 w - - 0 1')
+    undo = board.make_move(next(move for move in board.turn_moves() if move.uci() == 'e7d8q'))
+    assert board.pawns == 0 and board.halfmove_clock == 0
+    board.unmake_move(undo)
+    assert board.pawns == 1
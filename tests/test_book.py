@@ -0,0 +1,62 @@
+import random
+
+from board import Board
+from book import Book, build
+from pgn import replay
+
+GAMES = """[Event "a"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O Nf6 1-0
+
+[Event "b"]
+[Result "0-1"]
+
+1. e4 c5 2. Nf3 d6 0-1
+
+[Event "c"]
+[Result "1/2-1/2"]
+
+1. d4 d5 1/2-1/2
+"""
+
+def play(board, sans):
+    for board, move in replay(board, sans):
+        pass
+
+def names(found):
+    return {(move.initial.row, move.initial.col, move.final.row, move.final.col): weight for move, weight in found}
+
+def test_build_and_probe(tmp_path):
+    games = tmp_path / 'games.pgn'
+    games.write_text(GAMES)
+    path = tmp_path / 'book.bin'
+    assert build([games], path) == 8
+
+    with Book(path) as book:
+        board = Board()
+        # e4 won once and lost once, d4 drew; heaviest first
+        assert names(book.moves(board)) == {(6, 4, 4, 4): 2, (6, 3, 4, 3): 1}
+        assert [weight for code, weight in book.probe(board.zobrist)] == [2, 1]
+
+        # the side that lost keeps no weight: only c5 is left after e4
+        play(board, ['e4'])
+        assert names(book.moves(board)) == {(1, 2, 3, 2): 2}
+
+        # castling is stored as the king taking its rook and comes back as the two-square step
+        board = Board()
+        play(board, 'e4 e5 Nf3 Nc6 Bc4 Bc5'.split())
+        [(move, weight)] = book.moves(board)
+        assert (move.initial.col, move.final.col, weight) == (4, 6, 2)
+        assert book.choose(board, random.Random(0)) == move
+
+        # past the book
+        board.make_move(move)
+        board.make_move(board.legal_moves()[0])
+        assert book.moves(board) == [] and book.choose(board) is None
+
+def test_empty_book(tmp_path):
+    path = tmp_path / 'book.bin'
+    path.write_bytes(b'')
+    with Book(path) as book:
+        assert book.probe(Board().zobrist) == [] and book.choose(Board()) is None
@@ -0,0 +1,48 @@
+import time
+
+from board import Board
+from engine import EngineWorker
+from move import Move
+
+def wait_for(engine, seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        move = engine.poll()
+        if move is not None:
+            return move
+        time.sleep(0.01)
+    return None
+
+def test_search_runs_in_the_worker():
+    engine = EngineWorker('white', time_limit=0.3, hash_mb=1)
+    try:
+        board = Board()
+        start = time.perf_counter()
+        engine.start(board)
+        # start returns at once; the move arrives within the budget and the grace period
+        assert time.perf_counter() - start < 0.1
+        assert engine.thinking
+        move = wait_for(engine, 10)
+        assert move is not None
+        assert Move.decode(move) in board.turn_moves()
+        assert not engine.thinking
+        assert engine.last_info['depth'] >= 1
+    finally:
+        engine.close()
+
+def test_abort_drops_the_old_search():
+    engine = EngineWorker('white', time_limit=5.0, hash_mb=1)
+    try:
+        engine.start(Board())
+        time.sleep(0.2)
+        engine.abort()
+        assert not engine.thinking and engine.poll() is None
+        # the next search isn't held up by the aborted one, nor answered by it
+        board = Board.from_fen('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+        engine.start(board)
+        start = time.perf_counter()
+        move = wait_for(engine, 10)
+        assert Move.decode(move).uci() == 'a1a8'
+        assert time.perf_counter() - start < 5.0
+    finally:
+        engine.close()
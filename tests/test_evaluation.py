@@ -0,0 +1,32 @@
+import pytest
+
+from board import Board, START_FEN
+from evaluation import evaluate, totals
+
+def mirror(fen):
+    # colors swapped and the board turned over: the same position for the other side
+    placement, side, castling, en_passant = fen.split()[:4]
+    placement = '/'.join(reversed(placement.split('/'))).swapcase()
+    castling = ''.join(sorted(castling.swapcase(), key='KQkq'.index)) if castling != '-' else '-'
+    en_passant = en_passant[0] + str(9 - int(en_passant[1])) if en_passant != '-' else '-'
+    return f'{placement} {"b" if side == "w" else "w"} {castling} {en_passant} 0 1'
+
+def test_incremental_sums(playouts):
+    # every board the playouts reach was updated move by move
+    for board, move in playouts():
+        material, mg, eg, phase = totals(board)
+        assert (round(board.material, 6), board.mg, board.eg, board.phase) == (round(material, 6), mg, eg, phase)
+
+def test_start_position_is_level():
+    assert evaluate(Board.from_fen(START_FEN)) == 0
+
+def test_side_to_move_point_of_view():
+    board = Board.from_fen('4k3/8/8/8/8/8/8/3QK3 w - - 0 1')
+    assert evaluate(board) > 800
+    assert evaluate(Board.from_fen('4k3/8/8/8/8/8/8/3QK3 b - - 0 1')) == -evaluate(board)
+
+def test_mirrored_positions_score_alike(playouts):
+    for board, move in playouts(games=2):
+        fen = board.to_fen()
+        # floor division may round the two sides a centipawn apart
+        assert evaluate(Board.from_fen(mirror(fen))) == pytest.approx(evaluate(board), abs=1)
@@ -0,0 +1,20 @@
+import pytest
+
+from board import Board
+from perft import POSITIONS, perft, divide
+
+# deep enough to reach castling, en passant and promotions in every reference position
+DEPTH = 3
+
+@pytest.mark.parametrize('name, fen, counts', POSITIONS, ids=[name for name, fen, counts in POSITIONS])
+def test_board_perft(name, fen, counts):
+    board = Board.from_fen(fen)
+    assert perft(board, DEPTH) == counts[DEPTH - 1]
+    # make/unmake left the position as it was
+    assert board.to_fen() == Board.from_fen(fen).to_fen()
+
+def test_divide_adds_up():
+    name, fen, counts = POSITIONS[0]
+    split = divide(Board.from_fen(fen), 2)
+    assert len(split) == counts[0]
+    assert sum(split.values()) == counts[1]
@@ -0,0 +1,76 @@
+import pytest
+
+from board import Board, PACKED_SIZE
+from pgn import PGNError, format_game, parse_san, read_games, replay, replay_shard, shards, stream_games, to_san
+
+GAME = '''[Event "Test"]
+[Site "?"]
+[Date "2024.01.01"]
+[Round "1"]
+[White "A"]
+[Black "B"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bb5 {Ruy Lopez} a6 (3... Nf6 4. O-O) 4. Ba4 Nf6 5. O-O Be7
+6. Re1 b5 7. Bb3 d6 8. c3 O-O 1-0
+
+'''
+
+def test_read_game():
+    games = list(read_games(GAME.splitlines()))
+    assert len(games) == 1
+    tags, sans = games[0]
+    assert tags['White'] == 'A' and tags['Result'] == '1-0'
+    assert sans[:5] == ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5']
+    assert len(sans) == 16
+
+def test_replay():
+    tags, sans = next(read_games(GAME.splitlines()))
+    board = Board()
+    played = [move.uci() for board, move in replay(board, sans)]
+    assert played[8] == 'e1g1'
+    assert board.to_fen() == 'r1bq1rk1/2p1bppp/p1np1n2/1p2p3/4P3/1BP2N2/PP1P1PPP/RNBQR1K1 w - - 1 9'
+
+def test_illegal_move():
+    with pytest.raises(PGNError):
+        list(replay(Board(), ['e4', 'e5', 'Ke3']))
+
+def test_san_round_trip(playouts):
+    for board, move in playouts(games=1, plies=40):
+        for move in board.legal_moves():
+            assert parse_san(board, to_san(board, move)).code == move.code
+
+def test_format_game_reads_back():
+    sans = ['e4', 'e5', 'Nf3', 'Nc6']
+    text = format_game({'Event': 'Arena', 'Result': '1/2-1/2'}, sans)
+    tags, read = next(read_games(text.splitlines()))
+    assert read == sans
+    assert tags['Event'] == 'Arena' and tags['Site'] == '?'
+
+def test_shards_cover_every_game(tmp_path):
+    path = tmp_path / 'games.pgn'
+    games = [GAME.replace('"1"', f'"{i}"') for i in range(25)]
+    path.write_text(''.join(games))
+
+    whole = [(offset, tags['Round']) for offset, tags, sans in stream_games(path)]
+    assert len(whole) == 25
+    # each offset is where that game's first line starts
+    data = path.read_bytes()
+    assert all(data.startswith(b'[Event ', offset) for offset, round in whole)
+
+    for count in (1, 2, 4, 7):
+        split = [(offset, tags['Round'])
+                 for start, end in shards(path, count) for offset, tags, sans in stream_games(path, start, end)]
+        assert split == whole
+
+def test_replay_shard_writes_every_position(tmp_path):
+    path = tmp_path / 'games.pgn'
+    path.write_text(GAME + GAME.replace('8. c3', '8. Ke3'))
+    output = tmp_path / 'positions.bin'
+    counts = replay_shard(path, 0, path.stat().st_size, output)
+    # the second game stops at its illegal eighth move
+    assert (counts['games'], counts['failed'], counts['plies']) == (2, 1, 16 + 14)
+    assert counts['errors'][0][0] == len(GAME)
+    data = output.read_bytes()
+    assert len(data) == 30 * PACKED_SIZE
+    assert data[:PACKED_SIZE] == Board().pack()
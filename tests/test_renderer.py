@@ -0,0 +1,70 @@
+import os
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+pygame = pytest.importorskip('pygame')
+
+from const import *
+from move import Move
+from square import Square
+
+@pytest.fixture
+def screen(monkeypatch):
+    # assets are looked up from the top folder, as when the game runs
+    monkeypatch.chdir(Path(__file__).resolve().parents[1])
+    pygame.init()
+    yield pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.quit()
+
+def redrawn(game):
+    """
+    The whole frame drawn from scratch by a new renderer.
+    """
+    from renderer import Renderer
+
+    surface = pygame.Surface((WIDTH, HEIGHT))
+    Renderer(game).draw(surface)
+    return pygame.image.tostring(surface, 'RGB')
+
+def test_dirty_rects_match_a_full_redraw(screen):
+    from game import Game
+    from renderer import Renderer
+
+    game = Game()
+    board = game.board
+    dragger = game.dragger
+    renderer = Renderer(game)
+
+    def check():
+        renderer.draw(screen)
+        assert pygame.image.tostring(screen, 'RGB') == redrawn(game)
+
+    check()
+    game.set_hover(6, 4)
+    check()
+
+    # drag the e2 pawn to e4
+    piece = board.squares[6][4].piece
+    dragger.update_mouse((450, 650))
+    dragger.save_initial((450, 650))
+    dragger.drag_piece(piece, board.piece_moves(6, 4))
+    check()
+    for y in range(650, 440, -30):
+        dragger.update_mouse((450 + (650 - y) // 7, y))
+        game.set_hover(y // SQSIZE, 4)
+        check()
+    board.move(piece, Move(Square(6, 4), Square(4, 4)))
+    dragger.undrag_piece()
+    check()
+
+    game.change_theme()
+    check()
+    # a hover sweep redraws two squares a frame, not the board
+    frames, drawn = renderer.frames, renderer.squares_drawn
+    for i in range(16):
+        game.set_hover(i // 8, i % 8)
+        check()
+    assert renderer.squares_drawn - drawn <= 2 * (renderer.frames - frames)
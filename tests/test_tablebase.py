@@ -0,0 +1,44 @@
+import pytest
+
+from board import Board
+from tablebase import Tablebases, generate
+
+@pytest.fixture(scope='module')
+def tables(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('tablebases')
+    generate('KQvK', str(directory))
+    tables = Tablebases(str(directory))
+    yield tables
+    tables.close()
+
+def test_mate_in_one(tables):
+    board = Board.from_fen('7k/8/6K1/8/8/8/8/1Q6 w - - 0 1')
+    assert tables.probe(board) == (1, 1)
+    move, result = tables.best_move(board)
+    assert result == (1, 1)
+    board.make_move(move)
+    assert board.outcome() == 'checkmate'
+    assert tables.probe(board) == (-1, 0)
+
+def test_best_move_keeps_the_distance(tables):
+    board = Board.from_fen('8/8/8/3k4/8/8/8/Q3K3 w - - 0 1')
+    result, plies = tables.probe(board)
+    assert result == 1
+    while plies:
+        move, (result, left) = tables.best_move(board)
+        assert left == plies
+        board.make_move(move)
+        result, plies = tables.probe(board)
+        assert result == (-1 if board.next_player == 'black' else 1)
+        assert plies == left - 1
+    assert board.outcome() == 'checkmate'
+
+def test_colors_swapped(tables):
+    white = Board.from_fen('8/8/8/3k4/8/8/8/Q3K3 b - - 0 1')
+    black = Board.from_fen('q3k3/8/8/8/3K4/8/8/8 w - - 0 1')
+    assert tables.probe(white) == tables.probe(black)
+
+def test_without_a_table(tables):
+    assert tables.probe(Board.from_fen('8/8/8/3k4/8/8/8/R3K3 w - - 0 1')) is None
+    assert tables.best_move(Board.from_fen('8/8/8/3k4/8/8/8/R3K3 w - - 0 1')) is None
+    assert tables.probe(Board.from_fen('8/8/8/3k4/8/8/8/4K3 w - - 0 1')) == (0, 0)
@@ -0,0 +1,54 @@
+from board import Board
+from perft import POSITIONS, perft
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+def test_store_and_probe():
+    table = TranspositionTable(1)
+    assert table.probe(12345) is None
+    table.store(12345, 4, -250, LOWER, 0x1234)
+    assert table.probe(12345) == (-250, LOWER, 4, 0x1234)
+    assert table.hit_rate() == 0.5
+
+def test_pack_round_trip():
+    for score in (-100000, -1, 0, 99999):
+        for bound in (EXACT, LOWER, UPPER):
+            data = TranspositionTable.pack(score, bound, 17, 0x7FFF, 63)
+            assert TranspositionTable.unpack(data) == (score, bound, 17, 0x7FFF)
+
+def test_same_position_keeps_its_move():
+    table = TranspositionTable(1)
+    table.store(99, 5, 10, EXACT, 0x0ABC)
+    table.store(99, 6, 20, UPPER)
+    assert table.probe(99) == (20, UPPER, 6, 0x0ABC)
+
+def test_bucket_keeps_the_deeper_entry():
+    table = TranspositionTable(1)
+    deep, shallow, other = 7, 7 + table.buckets, 7 + 2 * table.buckets
+    table.store(deep, 8, 1, EXACT)
+    table.store(shallow, 2, 2, EXACT)
+    assert table.probe(deep) == (1, EXACT, 8, 0)
+    assert table.probe(shallow) == (2, EXACT, 2, 0)
+    # the always-replace slot takes the next shallow one
+    table.store(other, 1, 3, EXACT)
+    assert table.probe(deep) is not None
+    assert table.probe(shallow) is None
+    assert table.probe(other) == (3, EXACT, 1, 0)
+
+def test_new_search_lets_old_entries_go():
+    table = TranspositionTable(1)
+    table.store(7, 8, 1, EXACT)
+    table.new_search()
+    table.store(7 + table.buckets, 1, 2, EXACT)
+    assert table.probe(7) is None
+    assert table.probe(7 + table.buckets) == (2, EXACT, 1, 0)
+
+def test_clear():
+    table = TranspositionTable(1)
+    table.store(5, 3, 0, EXACT)
+    table.clear()
+    assert table.probe(5) is None
+    assert table.hashfull() == 0
+
+def test_hashed_perft():
+    name, fen, counts = POSITIONS[1]
+    assert perft(Board.from_fen(fen), 3, TranspositionTable(1)) == counts[2]
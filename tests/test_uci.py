@@ -0,0 +1,64 @@
+import io
+import threading
+import time
+
+from uci import UCI, move_budget, format_score
+from ai import MATE
+
+def lines(uci):
+    return uci.output.getvalue().splitlines()
+
+def test_scripted_game():
+    uci = UCI(output=io.StringIO())
+    for command in ['uci', 'isready', 'ucinewgame', 'position startpos moves e2e4', 'go depth 3']:
+        uci.handle(command)
+    uci.thread.join()
+    out = lines(uci)
+    assert out[out.index('uciok') + 1] == 'readyok'
+
+    infos = [line.split() for line in out if line.startswith('info depth')]
+    assert [int(info[2]) for info in infos] == [1, 2, 3]
+    pv = infos[-1][infos[-1].index('pv') + 1:]
+    assert len(pv) == 3
+    assert out[-1].split() == ['bestmove', pv[0]]
+    assert pv[0][1] in '78'  # black's move
+    uci.quit()
+
+def test_bare_go_searches_until_stop():
+    uci = UCI(output=io.StringIO())
+    uci.handle('position fen 8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1')
+    uci.handle('go')
+    time.sleep(0.3)
+    assert not any(line.startswith('bestmove') for line in lines(uci))
+    uci.handle('stop')
+    assert lines(uci)[-1].startswith('bestmove ')
+    assert lines(uci)[-1] != 'bestmove 0000'
+    uci.quit()
+
+def test_bestmove_even_when_the_search_fails(monkeypatch):
+    monkeypatch.setattr(threading, 'excepthook', lambda args: None)
+    uci = UCI(output=io.StringIO())
+    uci.handle('position startpos')
+    uci.handle('go depth 2')
+    uci.thread.join()
+    def fail(*args, **kwargs):
+        raise RuntimeError('search failed')
+    monkeypatch.setattr(uci.ai, 'search', fail)
+    uci.handle('go depth 2')
+    uci.thread.join()
+    assert lines(uci)[-1] == 'bestmove 0000'
+    uci.quit()
+
+def test_illegal_move_is_reported():
+    uci = UCI(output=io.StringIO())
+    uci.handle('position startpos moves e2e5')
+    assert lines(uci) == ['info string illegal move e2e5']
+
+def test_clock():
+    # a thirtieth of the time left plus most of the increment, less the overhead
+    assert abs(move_budget(60000, 1000) - (2 + 0.75 - 0.05)) < 1e-9
+    # never more than half of what's left
+    assert move_budget(1000, 5000) == 0.5 - 0.05
+    assert format_score(MATE - 3) == 'mate 2'
+    assert format_score(-MATE + 2) == 'mate -1'
+    assert format_score(35) == 'cp 35'